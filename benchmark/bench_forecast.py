@@ -0,0 +1,60 @@
+"""
+Micro-benchmarks for the forecast package
+
+Run with `make bench` or `python benchmark/bench_forecast.py`.
+"""
+import timeit
+
+import dateutil.parser as dp
+import yaml
+
+from funance.common.paths import FORECAST_DIST_FILE
+from funance.forecast.datespec import parse_date
+from funance.forecast.projector import Projector
+
+START_DATE = '2022-01-01'
+END_DATE = '2024-12-31'
+NUMBER = 1000
+
+
+def get_projector():
+    with open(FORECAST_DIST_FILE, "r") as stream:
+        spec = yaml.safe_load(stream)
+    return Projector.from_spec(spec, START_DATE, END_DATE)
+
+
+def legacy_get_balance(account, date):
+    """
+    Account.get_balance as it was before the ledger: parse both dates with dateutil, rebuild the grouped running
+    balance DataFrame, then filter it.
+    """
+    target_date = dp.parse(date)
+    dp.parse(START_DATE)
+    account.transactions_df = None
+    df = account.get_running_balance_grouped()
+    sub_df = df[df.index.to_pydatetime() <= target_date]
+    if len(sub_df.index) == 0:
+        return account.balance
+    return sub_df.iloc[-1:].iloc[0]['balance']
+
+
+def report(name, seconds, number):
+    print(f'{name:<40} {seconds / number * 1e6:>12.2f} us/call')
+
+
+def main():
+    account = get_projector().get_account('checking')
+    date_str = '2023-06-15'
+    date = parse_date(date_str)
+
+    report('dateutil.parser.parse', timeit.timeit(lambda: dp.parse(date_str), number=NUMBER), NUMBER)
+    report('parse_date (cached)', timeit.timeit(lambda: parse_date(date_str), number=NUMBER), NUMBER)
+    report('get_balance before (DataFrame rebuild)',
+           timeit.timeit(lambda: legacy_get_balance(account, date_str), number=NUMBER // 10), NUMBER // 10)
+    report('get_balance(str)', timeit.timeit(lambda: account.get_balance(date_str), number=NUMBER), NUMBER)
+    report('get_balance(datetime)', timeit.timeit(lambda: account.get_balance(date), number=NUMBER), NUMBER)
+    report('Projector.from_spec (incl. YAML load)', timeit.timeit(get_projector, number=10), 10)
+
+
+if __name__ == '__main__':
+    main()
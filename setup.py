@@ -21,7 +21,8 @@ setup(
         'requests',
         'attrs',
         'python-dateutil',
-        'PyYAML'
+        'PyYAML',
+        'cryptography'
     ],
     extras_require={
         'dev': [
@@ -4,33 +4,45 @@ https://codeburst.io/building-beautiful-command-line-interfaces-with-python-26c7
 
 import click
 
-from .init import commands as init_group
-from .chromedriver import commands as chromedriver_group
-from .format import commands as format_group
-from .scrape import commands as scrape_group
-from .dashboard import commands as dash_group
+from .lazy import LazyGroup
 
 
-@click.group()
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        'init':      'funance.cli.init.commands.init',
+        'scrape':    'funance.cli.scrape.commands.scrape',
+        'format':    'funance.cli.format.commands.format_exports',
+        'dashboard': 'funance.cli.dashboard.commands.dashboard',
+    })
 def cli():
     """Funance is a collection of tools for personal finance data exploration"""
     pass
 
 
 @cli.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        'update':  'funance.cli.chromedriver.commands.update',
+        'service': 'funance.cli.chromedriver.commands.service',
+    },
     short_help='Manages Chromedriver stuff')
 def chromedriver():
     """Manages Chromedriver stuff"""
     pass
 
 
-cli.add_command(init_group.init)
-cli.add_command(scrape_group.scrape)
-cli.add_command(format_group.format_exports)
-cli.add_command(dash_group.dashboard)
+@cli.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        'scenarios': 'funance.cli.forecast.commands.scenarios',
+        'simulate':  'funance.cli.forecast.commands.simulate',
+    },
+    short_help='Forecast tools')
+def forecast():
+    """Forecast tools"""
+    pass
 
-chromedriver.add_command(chromedriver_group.update)
-chromedriver.add_command(chromedriver_group.service)
 
 if __name__ == '__main__':
     cli()
@@ -2,10 +2,6 @@ import subprocess
 import time
 
 import click
-from selenium.common.exceptions import WebDriverException
-
-from funance.scrape.driver import create_driver
-from funance.scrape.driver.updater import do_update
 
 
 @click.command(
@@ -24,6 +20,9 @@ def service(command):
         click.echo(output)
 
     if command == 'start':
+        from selenium.common.exceptions import WebDriverException
+        from funance.scrape.driver import create_driver
+
         driver = create_driver(session=False, detached=True)
         click.echo(f"[INFO] You may now use the --session flag to re-use this session.")
         click.echo(f"[INFO] Switch to another tab to keep the service alive.")
@@ -46,5 +45,6 @@ def service(command):
 )
 def update():
     """Update Chromedriver version to match locally installed Chrome version"""
+    from funance.scrape.driver.updater import do_update
 
     do_update()
@@ -1,13 +1,5 @@
-import os
-from datetime import date
-
 import click
-import yaml
-from dateutil.relativedelta import relativedelta
 
-from funance.dashboard.dash_app import create_app
-from funance.forecast.datespec import DATE_FORMAT
-from funance.forecast.projector import Projector
 from funance.common.paths import FORECAST_DIST_FILE, FORECAST_FILE
 
 
@@ -15,29 +7,48 @@ def get_watch_files():
     return [FORECAST_DIST_FILE, FORECAST_FILE]
 
 
-def get_yaml():
-    spec_file = FORECAST_FILE if os.path.exists(FORECAST_FILE) else FORECAST_DIST_FILE
-    with open(spec_file, "r") as stream:
-        return yaml.safe_load(stream)
-
-
-def get_start_date():
-    return date.today() + relativedelta(days=1)
+def load_charts(start_date, end_date, no_cache=False):
+    from funance.common.spec import load_spec
+    from funance.forecast.cache import ProjectionCache
+    from funance.forecast.datespec import DATE_FORMAT
+    from funance.forecast.projector import Projector
 
-
-def get_end_date(start_date):
-    return start_date + relativedelta(years=1)
+    spec = load_spec()
+    if no_cache:
+        projector = Projector.from_spec(spec,
+                                        start_date.strftime(DATE_FORMAT),
+                                        end_date.strftime(DATE_FORMAT))
+    else:
+        projector = ProjectionCache().project(spec,
+                                              start_date.strftime(DATE_FORMAT),
+                                              end_date.strftime(DATE_FORMAT))
+    return projector.get_charts()
 
 
 @click.command(short_help='Run the dashboard')
-def dashboard():
+@click.option('--no-cache', is_flag=True, help='Project every account, ignoring cached projections.')
+@click.option('--webgl', is_flag=True, help='Plot balances with WebGL, downsampled to the zoom level. '
+                                            'Faster for long forecasts.')
+@click.option('--watch/--restart', default=True, show_default=True,
+              help='On forecast changes, update the charts in place, or restart the server.')
+def dashboard(no_cache, webgl, watch):
     """Open the dashboard"""
+    # imported here, dash and pandas are slow to import and only needed by this command
+    from funance.common.spec import get_start_date, get_end_date
+    from funance.dashboard.dash_app import create_app
+    from funance.dashboard.reload import ChartReloader
+    from funance.forecast.exceptions import SpecValidationError
+
     start_date = get_start_date()
     end_date = get_end_date(start_date)
-    spec = get_yaml()
-    projector = Projector.from_spec(spec,
-                                    start_date.strftime(DATE_FORMAT),
-                                    end_date.strftime(DATE_FORMAT))
-    charts = projector.get_charts()
-    app = create_app(*charts)
-    app.run_server(debug=True, extra_files=get_watch_files())
+    try:
+        charts = load_charts(start_date, end_date, no_cache)
+    except SpecValidationError as e:
+        raise click.ClickException(str(e))
+    if watch:
+        reloader = ChartReloader(get_watch_files(), lambda: load_charts(start_date, end_date, no_cache))
+        app = create_app(*charts, webgl=webgl, reloader=reloader)
+        app.run(debug=True, use_reloader=False)
+    else:
+        app = create_app(*charts, webgl=webgl)
+        app.run(debug=True, extra_files=get_watch_files())
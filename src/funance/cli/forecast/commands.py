@@ -0,0 +1,87 @@
+import click
+
+
+@click.command(
+    short_help='Project forecast scenarios'
+)
+@click.argument('scenario_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--start-date', help='YYYY-MM-DD start date. Defaults to tomorrow.')
+@click.option('--end-date', help='YYYY-MM-DD end date. Defaults to one year after the start date.')
+@click.option('--workers', type=int, default=None, help='Number of worker processes. Defaults to the CPU count.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True),
+              help='Write per-scenario balances by date to a CSV file.')
+def scenarios(scenario_file, start_date, end_date, workers, output):
+    """Project every scenario in SCENARIO_FILE against the forecast spec.
+
+    SCENARIO_FILE is a YAML file with a list of `scenarios` (name + patch merged into the forecast spec)
+    and/or a `grid` of dotted spec paths to lists of values.
+    """
+    from funance.common.spec import get_yaml, load_spec, get_start_date, get_end_date
+    from funance.forecast.datespec import DATE_FORMAT
+    from funance.forecast.exceptions import SpecValidationError
+    from funance.forecast.scenario import Scenarios
+
+    default_start = get_start_date()
+    start_date = start_date or default_start.strftime(DATE_FORMAT)
+    end_date = end_date or get_end_date(default_start).strftime(DATE_FORMAT)
+
+    scenario_list = Scenarios.from_spec(get_yaml(scenario_file))
+    try:
+        spec = load_spec()
+        df = scenario_list.run(spec, start_date, end_date, max_workers=workers)
+    except SpecValidationError as e:
+        raise click.ClickException(str(e))
+
+    if output:
+        df.to_csv(output, index=False)
+        click.echo(f"wrote {len(df.index)} rows to {output}")
+    else:
+        summary = df.groupby(['scenario', 'account_id'])['balance'].agg(['min', 'last'])
+        click.echo(summary.to_string())
+
+
+@click.command(
+    short_help='Monte Carlo simulation of the forecast'
+)
+@click.option('--paths', type=int, default=10000, show_default=True, help='Number of simulated paths.')
+@click.option('--seed', type=int, default=None, help='Random seed, for reproducible results.')
+@click.option('--start-date', help='YYYY-MM-DD start date. Defaults to tomorrow.')
+@click.option('--end-date', help='YYYY-MM-DD end date. Defaults to one year after the start date.')
+@click.option('--account', 'account_ids', multiple=True, help='Account id to report. Defaults to all accounts.')
+def simulate(paths, seed, start_date, end_date, account_ids):
+    """Simulate the forecast spec and report month-end percentile bands and the probability of an overdraft.
+
+    Scheduled transaction amounts may carry a distribution instead of a fixed amount:
+
+    \b
+    amount:
+      distribution:
+        type: normal      # normal|lognormal
+        mean: 750
+        std: 100
+        jitter_days: 2    # optional, move each date by up to +/- 2 days
+    """
+    from funance.common.spec import load_spec, get_start_date, get_end_date
+    from funance.forecast.datespec import DATE_FORMAT
+    from funance.forecast.exceptions import SpecValidationError
+    from funance.forecast.projector import Projector
+
+    default_start = get_start_date()
+    start_date = start_date or default_start.strftime(DATE_FORMAT)
+    end_date = end_date or get_end_date(default_start).strftime(DATE_FORMAT)
+
+    try:
+        spec = load_spec()
+    except SpecValidationError as e:
+        raise click.ClickException(str(e))
+    unknown = [account_id for account_id in account_ids if account_id not in spec['accounts']]
+    if unknown:
+        raise click.BadParameter(f"unknown account(s): {', '.join(unknown)}. Choose from: "
+                                 f"{', '.join(spec['accounts'])}.", param_hint='--account')
+    result = Projector.simulate(spec, start_date, end_date, paths=paths, seed=seed)
+    for account_id in account_ids or result.balances.keys():
+        bands = result.get_percentiles(account_id)
+        bands = bands.groupby(bands.index.to_period('M')).last()
+        click.echo(f"{account_id}: probability of overdraft {result.get_overdraft_probability(account_id):.1%}")
+        click.echo(bands.round(2).to_string())
+        click.echo()
@@ -1,7 +1,5 @@
 import click
 
-from funance.scrape.export import FormatterFactory
-
 
 @click.command(
     name='format',
@@ -11,5 +9,7 @@ from funance.scrape.export import FormatterFactory
 @click.argument('fmt_', type=click.Choice(['csv'], case_sensitive=True))
 def format_exports(type_, fmt_):
     """Format exported data into custom formats"""
+    from funance.scrape.export import FormatterFactory
+
     formatter = FormatterFactory().get_formatter(type_, fmt_)
     result = formatter.format()
@@ -2,8 +2,8 @@ from pathlib import Path
 import shutil
 import click
 
-from funance.common.paths import PROJECT_DIR, CHROMEDRIVER_DIR, EXPORT_DIR, FORECAST_DIST_FILE, FORECAST_FILE
-from funance.scrape.driver.updater import do_update
+from funance.common.paths import PROJECT_DIR, CHROMEDRIVER_DIR, EXPORT_DIR, CACHE_DIR, FORECAST_DIST_FILE, \
+    FORECAST_FILE
 
 
 @click.command(
@@ -11,6 +11,7 @@ from funance.scrape.driver.updater import do_update
 )
 def init():
     """Initialize the project"""
+    from funance.scrape.driver.updater import do_update
 
     # create project directory
     Path(PROJECT_DIR).mkdir(parents=True, exist_ok=True)
@@ -22,6 +23,9 @@ def init():
     Path(EXPORT_DIR).mkdir(parents=True, exist_ok=True)
     click.echo(f"created directory {EXPORT_DIR}")
 
+    Path(CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    click.echo(f"created directory {CACHE_DIR}")
+
     # copy forecast file, if it doesn't exist
     if not Path(FORECAST_FILE).is_file():
         shutil.copyfile(FORECAST_DIST_FILE, FORECAST_FILE)
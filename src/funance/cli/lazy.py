@@ -0,0 +1,37 @@
+import importlib
+
+import click
+
+
+class LazyGroup(click.Group):
+    """
+    Group that imports its subcommands when they are used, instead of when the CLI is imported
+
+    Subcommands are given as import paths, so `funance format` does not pay for importing dash or selenium.
+    Listing commands in --help still imports each command module, so command modules keep their heavy imports
+    inside the command functions.
+
+    https://click.palletsprojects.com/en/8.1.x/complex/#lazily-loading-subcommands
+    """
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        """
+        :param lazy_subcommands: dict of command name to import path, like 'funance.cli.init.commands.init'
+        """
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands:
+            return self._load(cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def _load(self, cmd_name):
+        module_name, attr_name = self.lazy_subcommands[cmd_name].rsplit('.', 1)
+        command = getattr(importlib.import_module(module_name), attr_name)
+        if not isinstance(command, click.Command):
+            raise ValueError(f"lazy command {cmd_name} is not a click command: {self.lazy_subcommands[cmd_name]}")
+        return command
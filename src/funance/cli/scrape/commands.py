@@ -1,21 +1,75 @@
 import click
 
-from selenium.common.exceptions import WebDriverException
-
+from funance.scrape.browser import BROWSER_MODES, DEFAULT_BROWSER_MODE
 from funance.scrape.provider import ProviderFactory
 
 
 @click.command(
     short_help='Scrape data from supported providers'
 )
-@click.argument('provider', type=click.Choice(ProviderFactory().get_supported_providers(), case_sensitive=True))
+@click.argument('providers', nargs=-1,
+                type=click.Choice(ProviderFactory().get_supported_providers(), case_sensitive=True))
+@click.option('--all', 'all_providers', is_flag=True, help='Scrape every supported provider.')
 @click.option('--session', is_flag=True, help='Re-use existing session. See `funance chromedriver service`')
-def scrape(provider, session):
-    """Scrape data from supported providers"""
+@click.option('--browser', 'browser_mode', type=click.Choice(list(BROWSER_MODES)), default=DEFAULT_BROWSER_MODE,
+              show_default=True,
+              help='full: a regular browser. lite: skip images, fonts, trackers and extensions. '
+                   'headless: lite without a window. Fails if the provider is not already logged in.')
+@click.option('--profile', is_flag=True,
+              help='Time each step, wait and WebDriver command. Prints the slowest, and writes a Chrome trace '
+                   'to ~/.funance/traces.')
+def scrape(providers, all_providers, session, browser_mode, profile):
+    """Scrape data from supported providers
+
+    Multiple providers are scraped concurrently, each in its own browser. Each provider keeps its own Chrome
+    profile under ~/.funance/profiles, so its cache and cookies survive between runs.
+    """
+    if all_providers:
+        providers = list(ProviderFactory().get_supported_providers())
+    # de-duplicate, keeping order
+    providers = list(dict.fromkeys(providers))
+    if not providers:
+        raise click.UsageError('Specify one or more providers, or --all.')
+
+    if session and len(providers) > 1:
+        raise click.UsageError('--session can only be used with a single provider.')
+
+    tracer = None
+    if profile:
+        from funance.scrape.trace import Tracer, set_tracer
+
+        tracer = Tracer()
+        set_tracer(tracer)
+    try:
+        run_scrape(providers, session, browser_mode)
+    finally:
+        if tracer is not None:
+            set_tracer(None)
+            print_profile(tracer)
 
+
+def run_scrape(providers, session, browser_mode, **options):
+    from selenium.common.exceptions import WebDriverException
+    from funance.scrape.wait import LoginRequiredError
+
+    mode = BROWSER_MODES[browser_mode]
+    if len(providers) > 1:
+        from funance.scrape.driver.pool import DriverPool
+        from funance.scrape.runner import scrape_providers
+
+        with DriverPool(mode=mode) as pool:
+            results = scrape_providers(providers, pool=pool, **options)
+        failed = [f'{name} ({error})' for name, error in results.items() if error is not None]
+        if failed:
+            raise click.ClickException(f"failed to scrape: {', '.join(failed)}")
+        return
+
+    # a single provider scrapes as before: a detached browser, saved as the session `--session` attaches to
     try:
-        p = ProviderFactory().get_provider(provider, session)
+        p = ProviderFactory().get_provider(providers[0], session, mode=mode, **options)
         p.scrape()
+    except LoginRequiredError as e:
+        raise click.ClickException(f'{providers[0]}: {e}')
     except (WebDriverException, KeyboardInterrupt) as e:
         # driver.close()
         # driver.quit()
@@ -23,3 +77,13 @@ def scrape(provider, session):
     finally:
         pass
         # driver.quit()
+
+
+def print_profile(tracer, limit=20):
+    from funance.scrape.trace import WEBDRIVER, format_summary
+
+    summary = tracer.get_summary()
+    round_trips = sum(row['count'] for row in summary if row['cat'] == WEBDRIVER)
+    click.echo(format_summary(summary[:limit]))
+    click.echo(f'WebDriver round trips: {round_trips}')
+    click.echo(f'Trace: {tracer.write()}')
@@ -0,0 +1,32 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'wb', permissions: int = 0o666):
+    """
+    Write a file through a temporary file next to it, which replaces the file when the block succeeds
+
+    os.replace() is atomic, so readers, including other funance processes, see the old file or the new one, never a
+    partial one. If the block raises, the file is left as it was.
+
+    :param path: str
+    :param mode: str 'wb' or 'w'
+    :param permissions: int mode the file is created with, e.g. 0o600 so only the user can read it
+    :return: file object
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, permissions)
+    try:
+        with os.fdopen(fd, mode) as fp:
+            yield fp
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -16,3 +16,11 @@ SESSION_FILE = os.path.join(PROJECT_DIR, 'session.json')
 
 CHROMEDRIVER_DIR = os.path.join(PROJECT_DIR, 'chromedriver')
 EXPORT_DIR = os.path.join(PROJECT_DIR, 'export')
+CACHE_DIR = os.path.join(PROJECT_DIR, 'cache')
+# Chrome user data dirs, one per scraper, so concurrent browsers do not share a profile
+PROFILES_DIR = os.path.join(PROJECT_DIR, 'profiles')
+# logged in sessions, encrypted with the session key
+SESSIONS_DIR = os.path.join(PROJECT_DIR, 'sessions')
+SESSION_KEY_FILE = os.path.join(PROJECT_DIR, 'session.key')
+# Chrome trace files from `funance scrape --profile`
+TRACES_DIR = os.path.join(PROJECT_DIR, 'traces')
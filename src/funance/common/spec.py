@@ -0,0 +1,109 @@
+import hashlib
+import os
+import pickle
+from datetime import date
+from pathlib import Path
+
+import yaml
+from dateutil.relativedelta import relativedelta
+
+from funance.common.files import atomic_write
+from funance.common.paths import CACHE_DIR, FORECAST_DIST_FILE, FORECAST_FILE
+
+try:
+    # libyaml bindings, about 8x faster than the pure python loader
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Bump when compile_spec() output changes, to invalidate compiled specs.
+SPEC_CACHE_VERSION = 2
+
+
+def get_spec_file():
+    return FORECAST_FILE if os.path.exists(FORECAST_FILE) else FORECAST_DIST_FILE
+
+
+def get_yaml(spec_file=None):
+    spec_file = get_spec_file() if spec_file is None else spec_file
+    with open(spec_file, "rb") as stream:
+        return yaml.load(stream, Loader=SafeLoader)
+
+
+def load_spec(spec_file=None, cache_dir=CACHE_DIR):
+    """
+    Load the forecast spec, from its compiled copy when the file has not changed
+
+    The compiled copy is the output of compile_spec(), pickled in the cache directory. It is used when the spec
+    file's modification time and size match, or failing that, when the hash of its contents does. Unpickling is
+    a couple of orders of magnitude faster than parsing the YAML for large specs.
+
+    :param spec_file: str defaults to get_spec_file()
+    :param cache_dir: str
+    :return: dict
+    :raises SpecValidationError: the spec is invalid, nothing is cached
+    """
+    spec_file = get_spec_file() if spec_file is None else spec_file
+    stat = os.stat(spec_file)
+    path_hash = hashlib.sha256(os.path.abspath(spec_file).encode('utf-8')).hexdigest()[:16]
+    compiled_file = os.path.join(cache_dir, 'spec', f'{Path(spec_file).stem}.{path_hash}.pickle')
+
+    compiled = _read_compiled(compiled_file)
+    if compiled is not None and (compiled['mtime_ns'], compiled['size']) == (stat.st_mtime_ns, stat.st_size):
+        return compiled['spec']
+
+    with open(spec_file, 'rb') as stream:
+        content = stream.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if compiled is not None and compiled['sha256'] == digest:
+        # touched, but not changed
+        spec = compiled['spec']
+    else:
+        spec = compile_spec(yaml.load(content, Loader=SafeLoader))
+
+    _write_compiled(compiled_file, dict(version=SPEC_CACHE_VERSION, mtime_ns=stat.st_mtime_ns, size=stat.st_size,
+                                        sha256=digest, spec=spec))
+    return spec
+
+
+def compile_spec(spec):
+    """
+    Validate and normalize a forecast spec, so it does not need to be done again when it is loaded
+
+    See funance.forecast.schema.validate_spec()
+
+    :param spec: dict
+    :return: dict
+    :raises SpecValidationError:
+    """
+    from funance.forecast.schema import validate_spec
+
+    return validate_spec(spec)
+
+
+def _read_compiled(compiled_file):
+    try:
+        with open(compiled_file, 'rb') as stream:
+            compiled = pickle.load(stream)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(compiled, dict) or compiled.get('version') != SPEC_CACHE_VERSION:
+        return None
+    return compiled
+
+
+def _write_compiled(compiled_file, compiled):
+    try:
+        with atomic_write(compiled_file) as stream:
+            pickle.dump(compiled, stream, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        # the compiled spec is only an optimization
+        pass
+
+
+def get_start_date():
+    return date.today() + relativedelta(days=1)
+
+
+def get_end_date(start_date):
+    return start_date + relativedelta(years=1)
@@ -1,87 +1,399 @@
+import gzip
+import hashlib
+import threading
+
+import flask
+import pandas as pd
 import plotly.graph_objects as go
-from dash import Dash, dcc, html, dash_table
+from dash import Dash, dcc, html, dash_table, Input, Output, State, MATCH, ctx
+from dash.exceptions import PreventUpdate
+
+from .downsample import downsample, get_relayout_range
+from .serialize import to_json
+from .table import get_table_df, query_table
 
 DATE_FORMAT = '%Y-%m-%d'
+PAGE_SIZE = 25
+# most points plotted per line in webgl mode, at any zoom level
+MAX_POINTS = 2000
+# pattern matching component id types, so callbacks keep working when charts are replaced
+TABLE_TYPE = 'funance-table'
+GRAPH_TYPE = 'funance-graph'
+# stands in for the charts in the serialized layout, see ChartStore.get_layout_json()
+CHARTS_PLACEHOLDER = '__funance_charts__'
 
 
-def create_app(*charts):
-    children = []
-    for chart in charts:
-        if chart.type == 'line':
-            fig = go.Figure()
-            fig.update_layout(title=chart.name)
-            for account in chart.accounts:
-                transactions_df = account['df']
-                fig.add_trace(
-                    go.Scatter(
-                        name=account['name'],
-                        x=transactions_df.index, y=transactions_df['balance'].round(0),
-                        mode='lines+markers',
-                        line_shape='spline',
-                        hovertext=transactions_df['amt_desc'],
-                        hovertemplate=
-                        '<b>$%{y:.2f}</b> (%{x})<br><br>' +
-                        '%{hovertext}'
-                    )
-                )
-            children.append(dcc.Graph(figure=fig))
-
-        if chart.type == 'datatable':
-            for account in chart.accounts:
-                transactions_df = account['df']
-                fig = dash_table.DataTable(
-                    columns=[
-                        dict(name='Date', id='Date', type='datetime'),
-                        # Unfortunately there is no formatting on datetime types.
-                        # https://community.plotly.com/t/is-it-any-way-to-set-format-of-date-time-in-datatable/29514
-                        # https://dash.plotly.com/datatable/typing
-                        dict(name='Description', id='Description'),
-                        dict(name='Amount', id='Amount', type='numeric', format=dash_table.FormatTemplate.money(2)),
-                        dict(name='Balance', id='Balance', type='numeric', format=dash_table.FormatTemplate.money(2))
-                    ],
-                    data=[
-                        {
-                            'Date':        row[0],
-                            'Description': row[1].replace('<br>', '\n'),
-                            # <br> works in tooltips, not datatable.
-                            # Using \n combined with style_cell={'whiteSpace': 'pre-line'} accomplishes the goal.
-                            # https://community.plotly.com/t/creating-new-line-within-datatable-cell/44145/3
-                            'Amount':      row[2],
-                            'Balance':     row[3]
-                        }
-                        for row in zip(transactions_df.index, transactions_df.amt_desc, transactions_df.amount,
-                                       transactions_df.balance)
-                    ],
-                    editable=False,
-                    filter_action='native',
-                    sort_action='native',
-                    sort_mode='single',
-                    page_action='native',
-                    page_current=0,
-                    page_size=25,
-                    style_cell={'minWidth': 95, 'maxWidth': 95, 'width': 95, 'whiteSpace': 'pre-line'},
-                    style_cell_conditional=[
-                        {
-                            'if':        {'column_id': c},
-                            'textAlign': 'left'
-                        } for c in ['Date', 'Description']
-                    ],
-                    style_data={'whitespace': 'normal', 'height': 'auto'}
-                )
-                children.append(html.Div([
-                    html.H1(account['name']),
-                    fig
-                ]))
-
-    app = Dash(__name__)
-    app.layout = html.Div(
-        children=[
+class ChartStore:
+    """
+    The rendered charts and the data behind them
+
+    Table and graph callbacks look their data up here by component id, so the charts can be replaced while the
+    server is running. Clients compare their version against the store's to know when to fetch new charts.
+
+    Each chart's components and their JSON are cached by a hash of the chart's data, so charts that did not change
+    are not rebuilt on reload, and the serialized layout is built once per version instead of once per page load.
+    """
+
+    def __init__(self, server_side=True, webgl=False, reload_interval=None):
+        self.server_side = server_side
+        self.webgl = webgl
+        self.reload_interval = reload_interval
+        self.version = 0
+        self.children = []
+        self.tables = dict()
+        self.graphs = dict()
+        self._charts = dict()
+        self._chart_json = []
+        self._layout_json = None
+        self._layout_gzip = None
+        self._lock = threading.Lock()
+
+    def set_charts(self, charts):
+        tables = dict()
+        graphs = dict()
+        cache = dict()
+        children = []
+        chart_json = []
+        for chart in charts:
+            data = get_chart_data(chart)
+            key = get_chart_key(chart, data, len(tables), len(graphs), self.server_side, self.webgl)
+            if key in self._charts:
+                components, components_json = self._charts[key]
+                add_chart_data(chart, data, tables, graphs, self.webgl)
+            else:
+                components = build_chart(chart, data, tables, graphs, self.server_side, self.webgl)
+                components_json = [to_json(component) for component in components]
+            cache[key] = (components, components_json)
+            children += components
+            chart_json += components_json
+        with self._lock:
+            self.children = children
+            self.tables = tables
+            self.graphs = graphs
+            # only charts still in use are kept
+            self._charts = cache
+            self._chart_json = chart_json
+            self._layout_json = None
+            self._layout_gzip = None
+            self.version += 1
+
+    def get_layout(self, children=None):
+        """
+        :param children: the charts, defaults to the current charts
+        :return: html.Div
+        """
+        layout = [
             html.H1(children="Funance", ),
             html.P(
                 children="Fun with personal finance data exploration.",
             ),
-            html.Div(children=children)
+            html.Div(id='charts', children=self.children if children is None else children)
         ]
-    )
+        if self.reload_interval is not None:
+            layout += [
+                dcc.Store(id='charts-version', data=self.version),
+                dcc.Interval(id='reload-interval', interval=self.reload_interval)
+            ]
+        return html.Div(children=layout)
+
+    def get_layout_json(self, compressed=False) -> bytes:
+        """
+        Get the serialized layout, built from the cached chart JSON once per version
+
+        :param compressed: bool gzip compressed
+        :return: bytes
+        """
+        with self._lock:
+            if self._layout_json is None:
+                layout_json = to_json(self.get_layout(children=CHARTS_PLACEHOLDER))
+                charts_json = '[' + ','.join(self._chart_json) + ']'
+                self._layout_json = layout_json.replace(f'"{CHARTS_PLACEHOLDER}"', charts_json, 1).encode('utf-8')
+            if not compressed:
+                return self._layout_json
+            if self._layout_gzip is None:
+                self._layout_gzip = gzip.compress(self._layout_json, compresslevel=6)
+            return self._layout_gzip
+
+
+class FunanceDash(Dash):
+    """
+    Dash app that serves its layout from the chart store's cached JSON, gzipped when the client accepts it
+
+    The cached JSON is the layout as Dash would build it, as long as nothing changes it on the way out. Layout hooks
+    and extra components do, so when any are registered the layout is served by Dash instead.
+    """
+
+    def __init__(self, *args, chart_store: ChartStore, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chart_store = chart_store
+        # a function, so reloading the page gets the current charts
+        self.layout = chart_store.get_layout
+
+    def serve_layout(self):
+        if self.has_layout_hooks():
+            return super().serve_layout()
+        compressed = 'gzip' in flask.request.headers.get('Accept-Encoding', '')
+        response = flask.Response(self.chart_store.get_layout_json(compressed), mimetype='application/json')
+        if compressed:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    def has_layout_hooks(self):
+        """
+        :return: bool True if Dash changes the layout before serving it, with layout hooks or extra components
+        """
+        # layout hooks are new in Dash 3
+        hooks = getattr(self, '_hooks', None)
+        return bool(getattr(self, '_extra_components', None) or (hooks is not None and hooks.get_hooks('layout')))
+
+
+def create_app(*charts, server_side=True, webgl=False, reloader=None):
+    """
+    Create the dashboard app
+
+    :param charts: Chart
+    :param server_side: bool page, filter and sort datatables on the server, instead of sending every row up front
+    :param webgl: bool plot line charts with WebGL, downsampled to the current zoom level
+    :param reloader: ChartReloader push new charts to connected clients when the forecast changes
+    :return: Dash
+    """
+    store = ChartStore(server_side=server_side, webgl=webgl,
+                       reload_interval=reloader.interval if reloader is not None else None)
+    store.set_charts(charts)
+
+    app = FunanceDash(__name__, chart_store=store, suppress_callback_exceptions=reloader is not None)
+
+    if server_side:
+        register_table_callback(app, store)
+    if webgl:
+        register_graph_callback(app, store)
+    if reloader is not None:
+        register_reload_callback(app, store, reloader)
 
     return app
+
+
+def get_chart_data(chart):
+    """
+    Get the data behind each account of a chart
+
+    :param chart: Chart
+    :return: list of tuples (account name, pd.DataFrame indexed by date with amount, balance and amt_desc columns)
+    """
+    return [
+        (account['name'], account['df'][['amount', 'balance']].assign(amt_desc=account['descriptions']()))
+        for account in chart.accounts
+    ]
+
+
+def get_chart_key(chart, data, table_index, graph_index, server_side, webgl) -> str:
+    """
+    Hash everything that goes into a chart's components
+
+    Component ids include the table and graph indexes, so they are part of the key.
+    """
+    h = hashlib.sha256(repr((chart.type, chart.name, table_index, graph_index, server_side, webgl)).encode('utf-8'))
+    for name, df in data:
+        h.update(name.encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(df).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def add_chart_data(chart, data, tables, graphs, webgl=False):
+    """
+    Add the data behind a chart's tables and webgl graphs, which callbacks look up by index
+
+    :param chart: Chart
+    :param data: list from get_chart_data()
+    :param tables: dict of table DataFrames, by index
+    :param graphs: dict of webgl graph series, by index
+    :param webgl: bool
+    :return:
+    """
+    if chart.type == 'line' and webgl:
+        graphs[len(graphs)] = (chart.name, data)
+    if chart.type == 'datatable':
+        for name, df in data:
+            tables[len(tables)] = get_table_df(df)
+
+
+def build_chart(chart, data, tables, graphs, server_side=True, webgl=False):
+    """
+    Build a chart's components
+
+    :param chart: Chart
+    :param data: list from get_chart_data()
+    :param tables: dict filled with the DataFrame behind each table, by index
+    :param graphs: dict filled with the series behind each webgl graph, by index
+    :param server_side: bool
+    :param webgl: bool
+    :return: list of components
+    """
+    children = []
+    table_index = len(tables)
+    graph_index = len(graphs)
+    add_chart_data(chart, data, tables, graphs, webgl)
+
+    if chart.type == 'line' and webgl:
+        children.append(dcc.Graph(id={'type': GRAPH_TYPE, 'index': graph_index},
+                                  figure=get_webgl_figure(chart.name, data)))
+
+    elif chart.type == 'line':
+        fig = go.Figure()
+        fig.update_layout(title=chart.name)
+        for name, transactions_df in data:
+            fig.add_trace(
+                go.Scatter(
+                    name=name,
+                    x=transactions_df.index, y=transactions_df['balance'].round(0),
+                    mode='lines+markers',
+                    line_shape='spline',
+                    hovertext=transactions_df['amt_desc'],
+                    hovertemplate=
+                    '<b>$%{y:.2f}</b> (%{x})<br><br>' +
+                    '%{hovertext}'
+                )
+            )
+        children.append(dcc.Graph(figure=fig))
+
+    if chart.type == 'datatable':
+        for index, (name, df) in enumerate(data, start=table_index):
+            table_df = tables[index]
+            if server_side:
+                # filtering, sorting and paging happen in register_table_callback(), rows are sent a page at a time
+                table_props = dict(data=[], filter_action='custom', sort_action='custom', page_action='custom',
+                                   page_count=max(-(-len(table_df) // PAGE_SIZE), 1))
+            else:
+                table_props = dict(data=table_df.to_dict('records'), filter_action='native',
+                                   sort_action='native', page_action='native')
+            fig = dash_table.DataTable(
+                id={'type': TABLE_TYPE, 'index': index},
+                columns=[
+                    dict(name='Date', id='Date', type='datetime'),
+                    # Unfortunately there is no formatting on datetime types.
+                    # https://community.plotly.com/t/is-it-any-way-to-set-format-of-date-time-in-datatable/29514
+                    # https://dash.plotly.com/datatable/typing
+                    dict(name='Description', id='Description'),
+                    dict(name='Amount', id='Amount', type='numeric', format=dash_table.FormatTemplate.money(2)),
+                    dict(name='Balance', id='Balance', type='numeric', format=dash_table.FormatTemplate.money(2))
+                ],
+                editable=False,
+                filter_query='',
+                sort_mode='single',
+                sort_by=[],
+                page_current=0,
+                page_size=PAGE_SIZE,
+                style_cell={'minWidth': 95, 'maxWidth': 95, 'width': 95, 'whiteSpace': 'pre-line'},
+                style_cell_conditional=[
+                    {
+                        'if':        {'column_id': c},
+                        'textAlign': 'left'
+                    } for c in ['Date', 'Description']
+                ],
+                style_data={'whitespace': 'normal', 'height': 'auto'},
+                **table_props
+            )
+            children.append(html.Div([
+                html.H1(name),
+                fig
+            ]))
+    return children
+
+
+def get_webgl_figure(name, series, x_range=None):
+    """
+    Build a line chart of balances, downsampled to MAX_POINTS per line
+
+    :param name: str chart name
+    :param series: list of tuples (account name, pd.DataFrame with balance and amt_desc columns)
+    :param x_range: tuple (start, end) zoomed in range, or None for everything
+    :return: go.Figure
+    """
+    fig = go.Figure()
+    # uirevision keeps the user's zoom when the figure is replaced at a finer resolution
+    fig.update_layout(title=name, uirevision=name)
+    for account_name, df in series:
+        df = downsample(df, 'balance', MAX_POINTS, x_range)
+        fig.add_trace(
+            go.Scattergl(
+                name=account_name,
+                x=df.index, y=df['balance'].round(0),
+                # spline is not supported by WebGL traces
+                mode='lines',
+                hovertext=df['amt_desc'],
+                hovertemplate=
+                '<b>$%{y:.2f}</b> (%{x})<br><br>' +
+                '%{hovertext}'
+            )
+        )
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
+    return fig
+
+
+def register_graph_callback(app, store):
+    """
+    Re-sample a webgl graph when it is zoomed or panned
+
+    :param app: Dash
+    :param store: ChartStore
+    :return:
+    """
+    @app.callback(
+        Output({'type': GRAPH_TYPE, 'index': MATCH}, 'figure'),
+        Input({'type': GRAPH_TYPE, 'index': MATCH}, 'relayoutData'),
+        prevent_initial_call=True)
+    def update_graph(relayout_data):
+        if not any(key.startswith('xaxis') for key in (relayout_data or {})):
+            # y axis only, or not a zoom at all
+            raise PreventUpdate
+        graph = store.graphs.get(ctx.outputs_list['id']['index'])
+        if graph is None:
+            raise PreventUpdate
+        name, series = graph
+        return get_webgl_figure(name, series, get_relayout_range(relayout_data))
+
+
+def register_table_callback(app, store):
+    """
+    Serve a datatable's current page from its DataFrame
+
+    :param app: Dash
+    :param store: ChartStore
+    :return:
+    """
+    @app.callback(
+        Output({'type': TABLE_TYPE, 'index': MATCH}, 'data'),
+        Output({'type': TABLE_TYPE, 'index': MATCH}, 'page_count'),
+        Input({'type': TABLE_TYPE, 'index': MATCH}, 'page_current'),
+        Input({'type': TABLE_TYPE, 'index': MATCH}, 'page_size'),
+        Input({'type': TABLE_TYPE, 'index': MATCH}, 'sort_by'),
+        Input({'type': TABLE_TYPE, 'index': MATCH}, 'filter_query'))
+    def update_table(page_current, page_size, sort_by, filter_query):
+        table_df = store.tables.get(ctx.outputs_list[0]['id']['index'])
+        if table_df is None:
+            raise PreventUpdate
+        return query_table(table_df, page_current, page_size, sort_by, filter_query)
+
+
+def register_reload_callback(app, store, reloader):
+    """
+    Poll for forecast changes, and send new charts to clients that have an older version
+
+    :param app: Dash
+    :param store: ChartStore
+    :param reloader: ChartReloader
+    :return:
+    """
+    @app.callback(
+        Output('charts', 'children'),
+        Output('charts-version', 'data'),
+        Input('reload-interval', 'n_intervals'),
+        State('charts-version', 'data'),
+        prevent_initial_call=True)
+    def reload_charts(n_intervals, version):
+        reloader.poll(store.set_charts)
+        if version == store.version:
+            raise PreventUpdate
+        return store.children, store.version
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Get the indices of points to plot when reducing a series to about max_points
+
+    Points are split into max_points // 2 equal buckets, and the minimum and maximum of each bucket are kept, along
+    with the first and last points. Unlike averaging or LTTB, this always keeps the extremes, so a brief overdraft
+    still shows up at any zoom level.
+
+    :param y: np.ndarray
+    :param max_points: int
+    :return: np.ndarray sorted indices into y
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    n_buckets = max(max_points // 2, 1)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    # sorting by bucket then value puts each bucket's min (or max) at the bucket's first position
+    mins = np.lexsort((y, bucket))[edges[:-1]]
+    maxs = np.lexsort((-y, bucket))[edges[:-1]]
+    return np.unique(np.concatenate([mins, maxs, [0, n - 1]]))
+
+
+def downsample(df: pd.DataFrame, column: str, max_points: int, x_range=None) -> pd.DataFrame:
+    """
+    Downsample a date indexed DataFrame for plotting, keeping the extremes of column
+
+    :param df: pd.DataFrame indexed by date
+    :param column: str column to keep the extremes of
+    :param max_points: int
+    :param x_range: tuple (start, end) to only plot a zoomed in range, or None for everything
+    :return: pd.DataFrame
+    """
+    if x_range is not None:
+        start, end = pd.Timestamp(x_range[0]), pd.Timestamp(x_range[1])
+        # keep a point either side of the range, so the line runs to the edges of the plot
+        lo = max(df.index.searchsorted(start, side='left') - 1, 0)
+        hi = df.index.searchsorted(end, side='right') + 1
+        df = df.iloc[lo:hi]
+    return df.iloc[minmax_indices(df[column].to_numpy(), max_points)]
+
+
+def get_relayout_range(relayout_data):
+    """
+    Get the x axis range from a Graph's relayoutData
+
+    :param relayout_data: dict
+    :return: tuple (start, end), or None when zoomed out to the full range
+    """
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
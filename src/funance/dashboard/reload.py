@@ -0,0 +1,62 @@
+import os
+import threading
+
+from funance.common.logger import get_logger
+
+logger = get_logger('reload')
+
+
+class ChartReloader:
+    """
+    Rebuild charts when watched files change, without restarting the server
+
+    Polled from a dcc.Interval callback. Files are compared by modification time and size, which is a stat call
+    per file, so polling often is cheap.
+    """
+
+    def __init__(self, files, load_charts, interval: int = 500):
+        """
+        :param files: list of str paths to watch
+        :param load_charts: callable returning a list of Chart, called after a watched file changes
+        :param interval: int milliseconds between polls
+        """
+        self.files = files
+        self.load_charts = load_charts
+        self.interval = interval
+        self._stats = self.get_stats()
+        self._lock = threading.Lock()
+
+    def get_stats(self):
+        stats = dict()
+        for file in self.files:
+            try:
+                stat = os.stat(file)
+                stats[file] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                stats[file] = None
+        return stats
+
+    def poll(self, set_charts):
+        """
+        Rebuild the charts if a watched file changed since the last poll
+
+        A forecast that fails to load is logged and the current charts are kept, until the next change.
+
+        :param set_charts: callable taking the new list of Chart, called while the lock is held so charts from an
+            older change can not replace charts from a newer one
+        :return: bool True if the charts were replaced
+        """
+        # only one poll rebuilds, other clients' polls see the new stats
+        with self._lock:
+            stats = self.get_stats()
+            if stats == self._stats:
+                return False
+            self._stats = stats
+            try:
+                charts = self.load_charts()
+            except Exception as e:
+                logger.error(f'Failed to reload forecast: {e}')
+                return False
+            set_charts(charts)
+            logger.info('Reloaded forecast')
+            return True
@@ -0,0 +1,19 @@
+from plotly.io.json import to_json_plotly
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson is several times faster at serializing figures with large arrays
+JSON_ENGINE = 'orjson' if orjson is not None else 'json'
+
+
+def to_json(value) -> str:
+    """
+    Serialize a component or figure to JSON, the way Dash does
+
+    :param value:
+    :return: str
+    """
+    return to_json_plotly(value, engine=JSON_ENGINE)
@@ -0,0 +1,143 @@
+import pandas as pd
+
+from funance.forecast.datespec import DATE_FORMAT
+
+# DataTable filter operators, with their symbol aliases.
+# https://dash.plotly.com/datatable/filtering
+FILTER_OPERATORS = [
+    ('ge', ['ge ', '>=']),
+    ('le', ['le ', '<=']),
+    ('lt', ['lt ', '<']),
+    ('gt', ['gt ', '>']),
+    ('ne', ['ne ', '!=']),
+    ('eq', ['eq ', '=']),
+    ('contains', ['contains ']),
+    ('datestartswith', ['datestartswith ']),
+]
+
+
+def get_table_df(transactions_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the rows of an account's transaction table
+
+    :param transactions_df: pd.DataFrame indexed by date, with amount, balance and amt_desc columns
+    :return: pd.DataFrame with columns Date, Description, Amount, Balance
+    """
+    return pd.DataFrame({
+        'Date':        transactions_df.index.strftime(DATE_FORMAT),
+        # <br> works in tooltips, not datatable.
+        # Using \n combined with style_cell={'whiteSpace': 'pre-line'} accomplishes the goal.
+        # https://community.plotly.com/t/creating-new-line-within-datatable-cell/44145/3
+        'Description': transactions_df['amt_desc'].str.replace('<br>', '\n', regex=False).to_numpy(),
+        'Amount':      transactions_df['amount'].to_numpy(),
+        'Balance':     transactions_df['balance'].to_numpy(),
+    })
+
+
+def split_filter_part(filter_part):
+    """
+    Split one clause of a DataTable filter query, like '{Amount} > 100', into its parts
+
+    :param filter_part: str
+    :return: tuple (column, operator, value), or (None, None, None) if the clause is not understood
+    """
+    for operator, aliases in FILTER_OPERATORS:
+        for alias in aliases:
+            if alias not in filter_part:
+                continue
+            name_part, value_part = filter_part.split(alias, 1)
+            name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+            value_part = value_part.strip()
+            if not value_part:
+                return name, operator, ''
+            quote = value_part[0]
+            if quote == value_part[-1] and quote in ('"', "'", '`') and len(value_part) > 1:
+                value = value_part[1:-1].replace('\\' + quote, quote)
+            else:
+                try:
+                    value = float(value_part)
+                except ValueError:
+                    value = value_part
+            return name, operator, value
+    return None, None, None
+
+
+def filter_df(df: pd.DataFrame, filter_query: str) -> pd.DataFrame:
+    """
+    Apply a DataTable filter query to a DataFrame
+
+    Clauses are joined with ' && '. Clauses that are not understood, or name unknown columns, are ignored.
+
+    :param df: pd.DataFrame
+    :param filter_query: str
+    :return: pd.DataFrame
+    """
+    if not filter_query:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for filter_part in filter_query.split(' && '):
+        column, operator, value = split_filter_part(filter_part)
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if operator in ('contains', 'datestartswith'):
+            text = series.astype(str)
+            if operator == 'contains':
+                mask &= text.str.contains(str(value), case=False, regex=False)
+            else:
+                mask &= text.str.startswith(str(value))
+            continue
+        if pd.api.types.is_numeric_dtype(series) and not isinstance(value, float):
+            # a string compared against a numeric column matches nothing, like the native filter
+            mask &= False
+            continue
+        if not pd.api.types.is_numeric_dtype(series):
+            value = str(value)
+        if operator == 'eq':
+            mask &= series == value
+        elif operator == 'ne':
+            mask &= series != value
+        elif operator == 'lt':
+            mask &= series < value
+        elif operator == 'le':
+            mask &= series <= value
+        elif operator == 'gt':
+            mask &= series > value
+        elif operator == 'ge':
+            mask &= series >= value
+    return df[mask]
+
+
+def sort_df(df: pd.DataFrame, sort_by) -> pd.DataFrame:
+    """
+    Apply DataTable sort_by to a DataFrame
+
+    :param df: pd.DataFrame
+    :param sort_by: list of dicts with column_id and direction
+    :return: pd.DataFrame
+    """
+    sort_by = [s for s in (sort_by or []) if s['column_id'] in df.columns]
+    if not sort_by:
+        return df
+    return df.sort_values(
+        [s['column_id'] for s in sort_by],
+        ascending=[s['direction'] == 'asc' for s in sort_by],
+        kind='stable'
+    )
+
+
+def query_table(df: pd.DataFrame, page_current: int, page_size: int, sort_by=None, filter_query: str = ''):
+    """
+    Filter, sort and page table rows on the server, so only the visible page is sent to the browser
+
+    :param df: pd.DataFrame from get_table_df()
+    :param page_current: int zero based page
+    :param page_size: int rows per page
+    :param sort_by: list of dicts with column_id and direction
+    :param filter_query: str
+    :return: tuple (list of row dicts, page count)
+    """
+    df = sort_df(filter_df(df, filter_query), sort_by)
+    page_count = max(-(-len(df) // page_size), 1)
+    start = (page_current or 0) * page_size
+    return df.iloc[start:start + page_size].to_dict('records'), page_count
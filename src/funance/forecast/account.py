@@ -1,11 +1,14 @@
+from datetime import datetime
 from typing import Union
 
 import attr
-import dateutil.parser as dp
 import pandas as pd
 
+from .datespec import parse_date
 from .exceptions import InvalidAccountType, AccountNotFoundException, OutOfBoundsException
-from .transaction import ScheduledTransactions
+from .ledger import Ledger
+from .scheduler import DynamicScheduler
+from .transaction import ScheduledTransactions, TransactionBatch
 
 pd.options.mode.chained_assignment = None  # no warning message and no exception is raised
 
@@ -14,15 +17,20 @@ pd.options.mode.chained_assignment = None  # no warning message and no exception
 class Account:
     account_id: str = attr.ib()
     name: str = attr.ib()
-    start_date: str = attr.ib()
+    start_date: Union[datetime, str] = attr.ib()
     balance: float = attr.ib()
-    transactions: list = attr.ib(factory=list)
+    batches: list = attr.ib(factory=list)
     transactions_df: Union[pd.DataFrame, None] = attr.ib()
+    ledger: Ledger = attr.ib(init=False)
 
     @transactions_df.default
     def _default_transactions_df(self):
         return None
 
+    @ledger.default
+    def _default_ledger(self):
+        return Ledger(start_date=parse_date(self.start_date))
+
     def add_transactions(self, transactions):
         for t in transactions:
             self.add_transaction(t)
@@ -37,7 +45,22 @@ class Account:
         if transaction.account_id != self.account_id:
             raise ValueError(f'Expected account id: {self.account_id} Received: {transaction.account_id}')
         self.transactions_df = None  # flip to None so it gets rebuilt on the next request
-        self.transactions.append(transaction)
+        self.batches.append(TransactionBatch.from_transactions([transaction]))
+        self.ledger.add(transaction.date, transaction.amount)
+
+    def add_batch(self, batch: TransactionBatch):
+        """
+        Add a batch of transactions to the Account
+
+        :param batch: TransactionBatch
+        :return:
+        """
+        account_ids = batch.get_account_ids()
+        if any(a != self.account_id for a in account_ids):
+            raise ValueError(f'Expected account id: {self.account_id} Received: {account_ids}')
+        self.transactions_df = None  # flip to None so it gets rebuilt on the next request
+        self.batches.append(batch)
+        self.ledger.add_many(batch.date, batch.amount)
 
     def get_transactions_df(self):
         """
@@ -46,8 +69,7 @@ class Account:
         :return: pd.DataFrame
         """
         if self.transactions_df is None:
-            data = list(map(attr.asdict, self.transactions))
-            df = pd.DataFrame(data, columns=['account_id', 'date', 'amount', 'name'])
+            df = TransactionBatch.concat(self.batches).to_df()
             # round amount
             df['amount'].round(decimals=2)
             df = df.sort_values(by=['date', 'name'],
@@ -60,22 +82,21 @@ class Account:
         """
         Get balance for a date
 
-        :param date: str
+        :param date: str|datetime.date|datetime.datetime
         :return: float
         """
-        target_date = dp.parse(date)
-        account_start = dp.parse(self.start_date)
-        df = self.get_running_balance_grouped()
-        if target_date < account_start:
-            raise OutOfBoundsException(f'date {target_date} before start_date of the account: {account_start}')
-        if len(df.index) == 0:
-            return self.balance
-        sub_df = df[df.index.to_pydatetime() <= target_date]
-        if len(sub_df.index) == 0:
-            return self.balance
-        last_row_df = sub_df.iloc[-1:]
-        balance = last_row_df.iloc[0]['balance']
-        return balance
+        target_date = parse_date(date)
+        if target_date.toordinal() < self.ledger.start_ordinal:
+            raise OutOfBoundsException(f'date {target_date} before start_date of the account: {self.start_date}')
+        return self.balance + self.ledger.get_total(target_date)
+
+    def get_balance_series(self):
+        """
+        Get numeric running balance indexed by transaction date
+
+        :return: pd.Series
+        """
+        return self.get_running_balance_grouped()['balance']
 
     def get_running_balance(self):
         """
@@ -90,20 +111,26 @@ class Account:
         """
         Get running balance df with transactions grouped and indexed by date
 
-        :return: pd.DataFrame
+        Numeric only. See get_descriptions for the matching hover text.
+
+        :return: pd.DataFrame with columns amount, balance
         """
-        trans_df = self.get_running_balance()
-        # create new column with "transaction: amount" string
-        trans_df['amt_desc'] = trans_df['amount']
-        trans_df['amt_desc'] = trans_df['amt_desc'].apply(lambda x: f'${x:.2f}')
-        trans_df['amt_desc'] = trans_df['amt_desc'].str.cat(trans_df['name'], sep=': ')
-        # group by date
-        df_date_group = trans_df.groupby('date').agg({
-            'amt_desc': '<br>'.join,
-            'amount':   'sum'
-        })
+        trans_df = self.get_transactions_df()
+        df_date_group = trans_df.groupby('date')[['amount']].sum()
         return self.apply_running_balance(self.balance, df_date_group)
 
+    def get_descriptions(self):
+        """
+        Get "$amount: name" descriptions of transactions, joined with <br> and indexed by date
+
+        Only needed for rendering, so it is built on demand and kept out of the balance calculations.
+
+        :return: pd.Series
+        """
+        trans_df = self.get_transactions_df()
+        amt_desc = '$' + trans_df['amount'].map('{:.2f}'.format) + ': ' + trans_df['name']
+        return amt_desc.groupby(trans_df['date']).agg('<br>'.join).rename('amt_desc')
+
     @classmethod
     def apply_running_balance(cls, starting_balance, trans_df):
         trans_df['balance'] = starting_balance + trans_df['amount'].cumsum()
@@ -157,13 +184,13 @@ class Accounts:
             account = self.get_account(t.account_id)
             account.add_transaction(t)
 
+    def add_batch(self, batch: TransactionBatch) -> None:
+        for account_id, account_batch in batch.partition().items():
+            self.get_account(account_id).add_batch(account_batch)
+
     def apply_scheduled_transactions(self, st: ScheduledTransactions):
         # apply plain transactions
-        self.add_transactions(st.plain)
-        # Apply dynamic transactions: By sorting these by date and adding them sequentially,
-        # the dynamic balance will be calculated correctly as each DynamicTransaction is
-        # exchanged, and subsequent transactions are added to the account.
-        dynamic = sorted(st.dynamic, key=lambda d: d.date)
-        for dt in dynamic:
-            transactions = dt.exchange(self)
-            self.add_transactions(transactions)
+        self.add_batch(st.plain)
+        # Apply dynamic transactions: The scheduler resolves each DynamicTransaction only after every
+        # transaction it depends on has been added, so the dynamic balance is calculated correctly.
+        DynamicScheduler(self, st.dynamic).apply()
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from funance.common.files import atomic_write
+from funance.common.paths import CACHE_DIR
+from .account import Accounts
+from .datespec import parse_date
+from .projector import Projector
+from .transaction import TransactionBatch
+
+# Bump when a change to the forecast code changes projected transactions, to invalidate existing cache files.
+CACHE_VERSION = 1
+
+# keys added to account specs by Accounts.from_spec, which are not part of the user's spec
+_DERIVED_KEYS = ('account_id', 'start_date')
+
+
+class ProjectionCache:
+    """
+    On-disk cache of projected transactions, one .npz file per account
+
+    Each account is keyed by a hash of the start and end dates plus every part of the spec that can change its
+    transactions: the scheduled transactions that post to it (including transfers from other accounts), and the
+    accounts that dynamic payments into it read balances from. A balance depends on the account's own transactions,
+    so read accounts bring in their dependencies, transitively.
+
+    Accounts whose key is cached are loaded from disk. The rest are projected from a reduced spec that only holds
+    the scheduled transactions they depend on.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = os.path.join(cache_dir, 'projection')
+        # account ids projected (not loaded) by the last call to project(), for introspection
+        self.dirty = []
+
+    def project(self, spec, start_date, end_date) -> Projector:
+        """
+        Get a Projector for spec, loading unchanged accounts from the cache
+
+        :param spec: dict
+        :param start_date:
+        :param end_date:
+        :return: Projector
+        """
+        start_date = parse_date(start_date)
+        end_date = parse_date(end_date)
+        posts, reads = self.get_dependencies(spec)
+        closures = {account_id: self._get_closure(account_id, posts, reads) for account_id in spec['accounts']}
+
+        keys = dict()
+        batches = dict()
+        for account_id, (items, balances) in closures.items():
+            keys[account_id] = self.get_key(spec, start_date, end_date, account_id, items, balances)
+            batch = self._load(account_id, keys[account_id])
+            if batch is not None:
+                batches[account_id] = batch
+        self.dirty = [account_id for account_id in spec['accounts'] if account_id not in batches]
+
+        if self.dirty:
+            required = set().union(*(closures[account_id][0] for account_id in self.dirty))
+            projector = Projector.from_spec(self._get_reduced_spec(spec, required), start_date, end_date)
+            # every account whose scheduled transactions were all projected is correct, and can be cached
+            for account_id, (items, balances) in closures.items():
+                if items <= required:
+                    batch = TransactionBatch.concat(projector.get_account(account_id).batches)
+                    self._save(account_id, keys[account_id], batch)
+                    batches[account_id] = batch
+
+        accounts = Accounts.from_spec(spec, start_date, end_date)
+        for account_id, batch in batches.items():
+            if len(batch):
+                accounts.get_account(account_id).add_batch(batch)
+        return Projector(spec=spec, start_date=start_date, end_date=end_date, accounts=accounts)
+
+    @classmethod
+    def get_dependencies(cls, spec) -> tuple:
+        """
+        Get the direct dependencies of each account's transactions
+
+        :param spec: dict
+        :return: tuple (posts, reads). posts maps account_id to the (account_id, transaction_id) of scheduled
+                 transactions posting to it. reads maps account_id to the accounts whose balances dynamic amounts
+                 posting to it read.
+        """
+        posts = {account_id: set() for account_id in spec['accounts']}
+        reads = {account_id: set() for account_id in spec['accounts']}
+        for account_id, account_spec in spec['accounts'].items():
+            for trans_id, trans in (account_spec['scheduled_transactions'] or {}).items():
+                posts_to = {account_id}
+                if trans['transfer'] is not None:
+                    posts_to.add(trans['transfer']['account_id'])
+                balances = set()
+                amount = trans['amount']
+                if isinstance(amount, dict) and 'cc_balance' in amount:
+                    card_id = amount['cc_balance']['account_id']
+                    balances.add(card_id)
+                    pmt_plan = spec['accounts'].get(card_id, {}).get('pmt_plan')
+                    if pmt_plan is not None:
+                        balances.add(pmt_plan['ref_account_id'])
+                for a in posts_to:
+                    posts.setdefault(a, set()).add((account_id, trans_id))
+                    reads.setdefault(a, set()).update(balances)
+        return posts, reads
+
+    @classmethod
+    def get_key(cls, spec, start_date, end_date, account_id, items, balances) -> str:
+        accounts = spec['accounts']
+        payload = json.dumps([
+            CACHE_VERSION,
+            start_date.isoformat(),
+            end_date.isoformat(),
+            account_id,
+            [[a, t, accounts[a]['scheduled_transactions'][t]] for a, t in sorted(items)],
+            [[a, {k: v for k, v in accounts[a].items() if k not in _DERIVED_KEYS + ('scheduled_transactions',)}]
+             for a in sorted(balances) if a in accounts]
+        ], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _get_closure(cls, account_id, posts, reads) -> tuple:
+        """
+        Get every scheduled transaction and account balance the transactions of account_id depend on
+
+        :return: tuple (set of (account_id, transaction_id), set of account ids)
+        """
+        items = set()
+        balances = set()
+        visited = set()
+        stack = [account_id]
+        while stack:
+            a = stack.pop()
+            if a in visited:
+                continue
+            visited.add(a)
+            items.update(posts.get(a, ()))
+            for r in reads.get(a, ()):
+                balances.add(r)
+                stack.append(r)
+        return items, balances
+
+    @classmethod
+    def _get_reduced_spec(cls, spec, required) -> dict:
+        """
+        Spec with only the required scheduled transactions. Every account is kept, so transfers still have
+        somewhere to post.
+        """
+        accounts = dict()
+        for account_id, account_spec in spec['accounts'].items():
+            scheduled = {trans_id: trans for trans_id, trans in (account_spec['scheduled_transactions'] or {}).items()
+                         if (account_id, trans_id) in required}
+            accounts[account_id] = dict(account_spec, scheduled_transactions=scheduled or None)
+        return dict(spec, accounts=accounts)
+
+    def _get_path(self, account_id, key):
+        return os.path.join(self.cache_dir, f'{account_id}.{key}.npz')
+
+    def _load(self, account_id, key):
+        path = self._get_path(account_id, key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return TransactionBatch(account_ids=[account_id], names=data['names'].tolist(),
+                                    types=data['types'].tolist(), date=data['date'], amount=data['amount'],
+                                    account=np.zeros(len(data['date']), dtype=np.int32), name=data['name'],
+                                    type=data['type'])
+
+    def _save(self, account_id, key, batch: TransactionBatch):
+        with atomic_write(self._get_path(account_id, key)) as fp:
+            np.savez(fp, date=batch.date, amount=batch.amount, name=batch.name, type=batch.type,
+                     names=np.array(batch.names, dtype=str), types=np.array(batch.types, dtype=str))
+        self._prune(account_id, key)
+
+    def _prune(self, account_id, key):
+        """
+        Delete the account's files for other keys, which every change to its spec or dates leaves behind
+        """
+        # the key is a sha256 hex digest, so account 'a' does not match account 'a.b'
+        pattern = re.compile(rf'{re.escape(account_id)}\.[0-9a-f]{{64}}\.npz')
+        current = os.path.basename(self._get_path(account_id, key))
+        for file_name in os.listdir(self.cache_dir):
+            if file_name != current and pattern.fullmatch(file_name):
+                try:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                except FileNotFoundError:
+                    # pruned by another process
+                    pass
@@ -1,7 +1,11 @@
+import datetime
+import functools
 from typing import Union
+
 import attr
 import dateutil.parser as dp
 import dateutil.rrule as dr
+import numpy as np
 
 DATE_FORMAT = '%Y-%m-%d'
 
@@ -21,11 +25,53 @@ weekday_map = {
     'sun': dr.SU
 }
 
+weekday_index_map = {
+    'mon': 0,
+    'tue': 1,
+    'wed': 2,
+    'thu': 3,
+    'fri': 4,
+    'sat': 5,
+    'sun': 6
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_str(value: str) -> datetime.datetime:
+    try:
+        # fast path for '%Y-%m-%d' and other ISO 8601 strings
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return dp.parse(value)
+
+
+def parse_date(value) -> Union[datetime.datetime, None]:
+    """
+    Normalize a date to a datetime
+
+    Strings are parsed once and cached. Dates, datetimes and datetime64 values are converted without parsing.
+
+    :param value: str|datetime.date|datetime.datetime|np.datetime64|None
+    :return: datetime.datetime|None
+    """
+    if value is None or type(value) is datetime.datetime:
+        return value
+    if isinstance(value, str):
+        return _parse_date_str(value)
+    if isinstance(value, datetime.datetime):
+        # e.g. pd.Timestamp
+        return datetime.datetime.combine(value.date(), value.time())
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+    if isinstance(value, np.datetime64):
+        return value.astype('datetime64[us]').item()
+    raise TypeError(f'Unsupported date: {value!r}')
+
 
 @attr.define(kw_only=True)
 class DateSpec:
-    start_date: str = attr.ib()
-    end_date: str = attr.ib()
+    start_date: datetime.datetime = attr.ib()
+    end_date: Union[datetime.datetime, None] = attr.ib()
     frequency: str = attr.ib()
     interval: int = attr.ib()
     day_of_week: Union[str, None] = attr.ib()
@@ -33,7 +79,7 @@ class DateSpec:
 
     @classmethod
     def from_spec(cls, spec):
-        return DateSpec(start_date=spec['start_date'], end_date=spec['end_date'],
+        return DateSpec(start_date=parse_date(spec['start_date']), end_date=parse_date(spec['end_date']),
                         frequency=spec['frequency'], interval=spec['interval'],
                         day_of_week=spec['day_of_week'], day_of_month=spec['day_of_month'])
 
@@ -43,22 +89,82 @@ class DateSpec:
 
         :param start_date:
         :param end_date:
-        :return:
+        :return: list
         """
-        start_date = dp.parse(start_date)
-        end_date = dp.parse(end_date)
-        rrule_start = dp.parse(self.start_date)
-        # Dates from spec could (more likely as time progresses) generate dates we don't care about.
-        # Here we set the max `until` argument for the rrule.
-        if self.end_date is None:
-            # self.end_date from the spec could be None to define infinite dates.
-            # There has to be a limit, so substitute None with end_date argument.
-            rrule_end = end_date
+        return self.generate_dates64(start_date, end_date).astype('datetime64[us]').tolist()
+
+    def generate_dates64(self, start_date, end_date):
+        """
+        Generate dates according to spec as a datetime64[D] array. Filtered by start_date, end_date
+
+        Daily, weekly and monthly specs are generated with datetime64 arithmetic, starting at the first occurrence
+        on or after start_date instead of expanding every occurrence since the spec's start_date. Anything else
+        falls back to the rrule generator.
+
+        :param start_date:
+        :param end_date:
+        :return: np.ndarray
+        """
+        start_date = parse_date(start_date)
+        end_date = parse_date(end_date)
+        spec_start = parse_date(self.start_date)
+        if not self._is_vectorizable(spec_start):
+            return np.array(self.generate_rrule_dates(start_date, end_date), dtype='datetime64[D]')
+
+        until = end_date if self.end_date is None else min(end_date, parse_date(self.end_date))
+        lo = np.datetime64(max(start_date, spec_start).date(), 'D')
+        hi = np.datetime64(until.date(), 'D')
+        first = np.datetime64(spec_start.date(), 'D')
+        if self.frequency == 'daily':
+            return self._arange_dates(first, self.interval, lo, hi)
+        if self.frequency == 'weekly':
+            weekday = spec_start.weekday() if self.day_of_week is None else weekday_index_map[self.day_of_week]
+            # rrule periods are weeks starting on Monday, so the first occurrence is in the same week as the
+            # spec's start_date, or `interval` weeks later when that day has already passed.
+            first = first + (weekday - spec_start.weekday())
+            if first < np.datetime64(spec_start.date(), 'D'):
+                first = first + 7 * self.interval
+            return self._arange_dates(first, 7 * self.interval, lo, hi)
+        # monthly
+        day_of_month = spec_start.day if self.day_of_month is None else self._get_day_of_month()
+        first_month = np.datetime64(spec_start.date(), 'M')
+        n0 = max((lo.astype('datetime64[M]') - first_month).astype(int) // self.interval, 0)
+        n1 = (hi.astype('datetime64[M]') - first_month).astype(int) // self.interval
+        months = first_month + np.arange(n0, n1 + 1) * self.interval
+        if day_of_month == -1:
+            dates = (months + 1).astype('datetime64[D]') - 1
         else:
-            # Substitute if spec_end_date > end_date
-            spec_end_date = dp.parse(self.end_date)
-            rrule_end = end_date if spec_end_date > end_date else spec_end_date
+            dates = months.astype('datetime64[D]') + (day_of_month - 1)
+        return dates[(dates >= lo) & (dates <= hi)]
+
+    def _is_vectorizable(self, spec_start):
+        if not isinstance(self.interval, int) or self.interval < 1:
+            return False
+        if self.frequency == 'daily':
+            return self.day_of_week is None and self.day_of_month is None
+        if self.frequency == 'weekly':
+            return self.day_of_month is None and (self.day_of_week is None or self.day_of_week in weekday_index_map)
+        if self.frequency == 'monthly':
+            if self.day_of_week is not None:
+                return False
+            if self.day_of_month is None:
+                # rrule skips months without the start_date's day, e.g. the 31st
+                return spec_start.day <= 28
+            return 1 <= self.day_of_month <= 31
+        return False
+
+    @classmethod
+    def _arange_dates(cls, first, step, lo, hi):
+        """
+        Dates `first + step * n` within [lo, hi]
+        """
+        n0 = max(-(-(lo - first).astype(int) // step), 0)
+        n1 = (hi - first).astype(int) // step
+        if n1 < n0:
+            return np.array([], dtype='datetime64[D]')
+        return first + np.arange(n0, n1 + 1) * step
 
+    def _get_day_of_month(self):
         """
         Specify "last day of month" when self.day_of_month would exclude certain months.
 
@@ -81,13 +187,37 @@ class DateSpec:
             More accurate would be 2021-10-29
             """
             day_of_month = -1
+        return day_of_month
+
+    def generate_rrule_dates(self, start_date, end_date):
+        """
+        Generate dates with dateutil's rrule. Slower, but handles any combination of spec options.
+
+        :param start_date:
+        :param end_date:
+        :return: list
+        """
+        start_date = parse_date(start_date)
+        end_date = parse_date(end_date)
+        rrule_start = parse_date(self.start_date)
+        # Dates from spec could (more likely as time progresses) generate dates we don't care about.
+        # Here we set the max `until` argument for the rrule.
+        if self.end_date is None:
+            # self.end_date from the spec could be None to define infinite dates.
+            # There has to be a limit, so substitute None with end_date argument.
+            rrule_end = end_date
+        else:
+            # Substitute if spec_end_date > end_date
+            spec_end_date = parse_date(self.end_date)
+            rrule_end = end_date if spec_end_date > end_date else spec_end_date
+
         rr = dr.rrule(
             frequency_map.get(self.frequency),
             dtstart=rrule_start,
             until=rrule_end,
             interval=self.interval,
             byweekday=weekday_map.get(self.day_of_week),
-            bymonthday=day_of_month
+            bymonthday=self._get_day_of_month()
         )
         dates = list(rr)
         # Filter start dates. End dates were limited in rrule
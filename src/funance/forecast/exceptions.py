@@ -8,3 +8,20 @@ class AccountNotFoundException(Exception):
 
 class OutOfBoundsException(Exception):
     pass
+
+
+class SpecValidationError(Exception):
+    """
+    The forecast spec is invalid. Lists every error, with the path to it in the spec.
+    """
+
+    def __init__(self, errors, scenario=None):
+        """
+        :param errors: list of tuples (path, message)
+        :param scenario: str name of the scenario whose patched spec is invalid
+        """
+        self.errors = errors
+        self.scenario = scenario
+        lines = [f'  {path}: {message}' for path, message in errors]
+        spec_name = 'forecast spec' if scenario is None else f'forecast spec for scenario {scenario}'
+        super().__init__(f'Invalid {spec_name}, {len(errors)} error(s):\n' + '\n'.join(lines))
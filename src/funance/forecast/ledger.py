@@ -0,0 +1,113 @@
+from datetime import date as date_type
+
+import numpy as np
+
+EPOCH_ORDINAL = date_type(1970, 1, 1).toordinal()
+
+
+class Ledger:
+    """
+    Running total of transaction amounts for a single account.
+
+    Amounts are bucketed by day offset from the account's start date and kept in a Fenwick (binary indexed) tree,
+    so adding a transaction and looking up the total through a date are both O(log n) in the number of days.
+    This replaces rebuilding and grouping the whole transactions DataFrame on every balance lookup.
+
+    https://en.wikipedia.org/wiki/Fenwick_tree
+    """
+
+    def __init__(self, start_date: date_type, capacity: int = 366):
+        self.start_ordinal = start_date.toordinal()
+        self._daily = [0.0] * capacity
+        self._tree = [0.0] * (capacity + 1)
+
+    def __len__(self):
+        return len(self._daily)
+
+    def get_offset(self, date) -> int:
+        """
+        Get the day offset of a date from the start date
+
+        Dates before the start date are clamped to the first day, so they are always included in the total.
+
+        :param date: datetime.date|datetime.datetime
+        :return: int
+        """
+        return max(date.toordinal() - self.start_ordinal, 0)
+
+    def add(self, date, amount: float) -> None:
+        """
+        Add an amount to the day of the given date
+
+        :param date: datetime.date|datetime.datetime
+        :param amount: float
+        :return:
+        """
+        self._add_offset(self.get_offset(date), amount)
+
+    def _add_offset(self, offset: int, amount: float) -> None:
+        if offset >= len(self._daily):
+            self._grow(offset + 1)
+        self._daily[offset] += amount
+        i = offset + 1
+        size = len(self._tree)
+        while i < size:
+            self._tree[i] += amount
+            i += i & -i
+
+    def add_many(self, dates: np.ndarray, amounts: np.ndarray) -> None:
+        """
+        Add amounts in bulk
+
+        Small batches are added one at a time. Large batches are scattered into the daily amounts and the tree is
+        rebuilt once, which is O(n) instead of O(k log n).
+
+        :param dates: np.ndarray datetime64[D]
+        :param amounts: np.ndarray float64
+        :return:
+        """
+        offsets = dates.astype('datetime64[D]').astype(np.int64) + (EPOCH_ORDINAL - self.start_ordinal)
+        offsets = np.maximum(offsets, 0)
+        if len(offsets) * 16 < len(self._daily):
+            for offset, amount in zip(offsets.tolist(), amounts.tolist()):
+                self._add_offset(offset, amount)
+            return
+        capacity = max(len(self._daily), int(offsets.max(initial=0)) + 1)
+        daily = np.zeros(capacity, dtype=np.float64)
+        daily[:len(self._daily)] = self._daily
+        np.add.at(daily, offsets, amounts)
+        self._daily = daily.tolist()
+        self._build()
+
+    def get_total(self, date) -> float:
+        """
+        Get the sum of all amounts on or before the given date
+
+        :param date: datetime.date|datetime.datetime
+        :return: float
+        """
+        i = min(date.toordinal() - self.start_ordinal + 1, len(self._daily))
+        total = 0.0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = max(len(self._daily), 1)
+        while capacity < min_capacity:
+            capacity *= 2
+        self._daily.extend([0.0] * (capacity - len(self._daily)))
+        self._build()
+
+    def _build(self) -> None:
+        """
+        Rebuild the tree from daily amounts in O(n)
+        """
+        size = len(self._daily) + 1
+        tree = [0.0] + self._daily
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                tree[parent] += tree[i]
+        self._tree = tree
@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import attr
+import numpy as np
+import pandas as pd
+
+from .account import Accounts
+from .datespec import parse_date
+from .transaction import ScheduledTransactions, CCBalanceAmount, DistributionAmount
+
+
+@attr.define(kw_only=True)
+class MonteCarloResult:
+    """
+    Simulated daily balances
+
+    balances maps account_id to a (paths x days) matrix, where column d is the balance at the end of dates[d].
+    """
+    dates: np.ndarray = attr.ib()
+    balances: dict = attr.ib(factory=dict)
+
+    def get_percentiles(self, account_id: str, percentiles=(5, 50, 95)) -> pd.DataFrame:
+        """
+        Get percentile bands of the balance for each day
+
+        :param account_id: str
+        :param percentiles: percentiles to compute, 0-100
+        :return: pd.DataFrame indexed by date, one column per percentile, e.g. p5, p50, p95
+        """
+        bands = np.percentile(self.balances[account_id], percentiles, axis=0)
+        return pd.DataFrame(bands.T, index=pd.DatetimeIndex(self.dates, name='date'),
+                            columns=[f'p{p:g}' for p in percentiles])
+
+    def get_overdraft_probability(self, account_id: str, threshold: float = 0.0) -> float:
+        """
+        Get the share of paths where the balance drops below threshold on any day
+
+        :param account_id: str
+        :param threshold: float
+        :return: float
+        """
+        return float(np.mean((self.balances[account_id] < threshold).any(axis=1)))
+
+
+@attr.define(kw_only=True)
+class MonteCarlo:
+    """
+    Vectorized Monte Carlo projection
+
+    All paths are simulated at once: transactions are scattered into a (paths x days) matrix of daily amounts per
+    account, and balances are the cumulative sum along the time axis. Amounts with a distribution are sampled per
+    path and occurrence, fixed amounts are the same on every path. Credit card payments are resolved per path from
+    the simulated balances, in date order.
+    """
+    accounts: Accounts = attr.ib()
+    scheduled: list = attr.ib(factory=list)
+    start_date: datetime = attr.ib()
+    end_date: datetime = attr.ib()
+
+    @classmethod
+    def from_spec(cls, spec, start_date, end_date):
+        start_date = parse_date(start_date)
+        end_date = parse_date(end_date)
+        return MonteCarlo(accounts=Accounts.from_spec(spec, start_date, end_date),
+                          scheduled=ScheduledTransactions.get_scheduled(spec), start_date=start_date,
+                          end_date=end_date)
+
+    def run(self, paths: int = 1000, seed=None) -> MonteCarloResult:
+        """
+        Simulate paths
+
+        :param paths: int number of paths
+        :param seed: seed for numpy's random Generator, for reproducible results
+        :return: MonteCarloResult
+        """
+        rng = np.random.default_rng(seed)
+        first_day = np.datetime64(self.start_date.date(), 'D')
+        dates = np.arange(first_day, np.datetime64(self.end_date.date(), 'D') + 1)
+        deltas = {account_id: np.zeros((paths, len(dates))) for account_id in self.accounts.accounts}
+
+        dynamic = []
+        for st in self.scheduled:
+            if st.is_dynamic():
+                for index, date in enumerate(st.date_spec.generate_dates(self.start_date, self.end_date)):
+                    dynamic.append((date, CCBalanceAmount.from_spec(st.amount, index), st))
+                continue
+            days = (st.date_spec.generate_dates64(self.start_date, self.end_date) - first_day).astype(np.int64)
+            size = (paths, len(days))
+            if isinstance(st.amount, DistributionAmount):
+                amounts = st.amount.sample(rng, size)
+                days = days + st.amount.sample_jitter(rng, size)
+            else:
+                amounts = np.full(size, abs(st.amount), dtype=np.float64)
+                days = np.broadcast_to(days, size)
+            for account_id, sign in st.get_legs():
+                self._scatter(deltas[account_id], days, sign * amounts)
+
+        def get_balance(account, date):
+            day = (date - self.start_date).days
+            if day < 0:
+                return np.full(paths, account.balance, dtype=np.float64)
+            return account.balance + deltas[account.account_id][:, :day + 1].sum(axis=1)
+
+        # Same as Accounts.apply_scheduled_transactions: resolve in date order, so each payment sees the
+        # payments before it.
+        for date, amount, st in sorted(dynamic, key=lambda d: d[0]):
+            resolved = np.abs(np.broadcast_to(amount.resolve(self.accounts, date, get_balance), (paths,)))
+            day = (date - self.start_date).days
+            for account_id, sign in st.get_legs():
+                deltas[account_id][:, day] += sign * resolved
+
+        balances = dict()
+        for account_id, delta in deltas.items():
+            np.cumsum(delta, axis=1, out=delta)
+            delta += self.accounts.get_account(account_id).balance
+            balances[account_id] = delta
+        return MonteCarloResult(dates=dates, balances=balances)
+
+    @classmethod
+    def _scatter(cls, delta: np.ndarray, days: np.ndarray, amounts: np.ndarray) -> None:
+        """
+        Add amounts to a (paths x days) matrix. Occurrences jittered outside the window are dropped.
+        """
+        in_window = (days >= 0) & (days < delta.shape[1])
+        rows = np.broadcast_to(np.arange(delta.shape[0])[:, None], days.shape)
+        np.add.at(delta, (rows[in_window], days[in_window]), amounts[in_window])
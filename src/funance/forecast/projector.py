@@ -1,8 +1,13 @@
+from datetime import datetime
+
 import attr
+import numpy as np
 import pandas as pd
 
 from .account import Accounts
-from .transaction import ScheduledTransactions
+from .datespec import parse_date
+from .montecarlo import MonteCarlo, MonteCarloResult
+from .transaction import ScheduledTransactions, TransactionBatch
 
 
 @attr.define(kw_only=True)
@@ -15,27 +20,71 @@ class Chart:
 @attr.define(kw_only=True)
 class Projector:
     spec: dict = attr.ib(factory=dict)
-    start_date: str = attr.ib(factory=str)
-    end_date: str = attr.ib(factory=str)
+    start_date: datetime = attr.ib(default=None)
+    end_date: datetime = attr.ib(default=None)
     accounts: Accounts = attr.ib()
 
     @classmethod
     def from_spec(cls, spec, start_date, end_date):
+        # Parse dates once, so the rest of the projection never has to parse strings.
+        start_date = parse_date(start_date)
+        end_date = parse_date(end_date)
         accounts = Accounts.from_spec(spec, start_date, end_date)
         accounts.apply_scheduled_transactions(ScheduledTransactions.from_spec(spec, start_date, end_date))
         return Projector(spec=spec, start_date=start_date, end_date=end_date, accounts=accounts)
 
+    @classmethod
+    def simulate(cls, spec, start_date, end_date, paths: int = 1000, seed=None) -> MonteCarloResult:
+        """
+        Simulate many paths of the forecast at once. See MonteCarlo.
+
+        :return: MonteCarloResult
+        """
+        return MonteCarlo.from_spec(spec, start_date, end_date).run(paths=paths, seed=seed)
+
     def get_account(self, account_id):
         return self.accounts.get_account(account_id)
 
+    def get_balance_matrix(self, freq: str = 'D') -> pd.DataFrame:
+        """
+        Get balances of every account, one row per day from start_date to end_date and one column per account
+
+        Built with a single scatter-add of every transaction into a (days x accounts) matrix, followed by a cumsum
+        down the time axis.
+
+        :param freq: str pandas offset alias. For anything other than 'D', rows are the balance at the end of each
+                     period.
+        :return: pd.DataFrame of float64
+        """
+        account_ids = list(self.accounts.accounts.keys())
+        batch = TransactionBatch.concat([b for a in self.accounts.accounts.values() for b in a.batches])
+        columns = np.array([account_ids.index(a) for a in batch.account_ids], dtype=np.int64)[batch.account]
+        first_day = np.datetime64(self.start_date.date(), 'D')
+        dates = np.arange(first_day, np.datetime64(self.end_date.date(), 'D') + 1)
+        # same as the ledger, transactions before the start date count on the first day
+        days = np.maximum((batch.date - first_day).astype(np.int64), 0)
+        in_window = days < len(dates)
+
+        matrix = np.zeros((len(dates), len(account_ids)), dtype=np.float64)
+        np.add.at(matrix, (days[in_window], columns[in_window]), batch.amount[in_window])
+        np.cumsum(matrix, axis=0, out=matrix)
+        matrix += np.array([self.get_account(a).balance for a in account_ids], dtype=np.float64)
+
+        df = pd.DataFrame(matrix, index=pd.DatetimeIndex(dates, name='date'), columns=account_ids)
+        if freq != 'D':
+            df = df.resample(freq).last()
+        return df
+
     def get_charts(self):
         charts = []
         for chart in self.spec['chart_spec']:
+            # descriptions is a callable, so hover text is only built when a chart is rendered
             accounts = list(
                 map(
                     lambda a: dict(
                         name=self.get_account(a).name,
-                        df=self.get_account(a).get_running_balance_grouped()), chart['account_ids']
+                        df=self.get_account(a).get_running_balance_grouped(),
+                        descriptions=self.get_account(a).get_descriptions), chart['account_ids']
                 )
             )
             charts.append(Chart(name=chart['name'], type=chart['type'], accounts=accounts))
@@ -0,0 +1,179 @@
+import copy
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+import attr
+import pandas as pd
+
+from .exceptions import SpecValidationError
+from .projector import Projector
+from .schema import validate_spec
+
+SCENARIO_COLUMNS = ['scenario', 'account_id', 'date', 'balance']
+
+
+@attr.define(kw_only=True)
+class Scenario:
+    """
+    A named variant of the forecast spec
+
+    The patch is deep-merged into the base spec: dicts are merged key by key, anything else replaces the base value.
+    """
+    name: str = attr.ib()
+    patch: dict = attr.ib(factory=dict)
+
+    @classmethod
+    def from_spec(cls, spec):
+        return Scenario(name=spec['name'], patch=spec.get('patch') or {})
+
+    @classmethod
+    def from_grid(cls, grid: dict) -> list:
+        """
+        Expand a parameter grid into one Scenario per combination
+
+        Keys are dotted paths into the spec, e.g. `accounts.checking.scheduled_transactions.rent.amount`,
+        and values are lists of values to try.
+
+        :param grid: dict
+        :return: list
+        """
+        paths = list(grid.keys())
+        scenarios = []
+        for values in itertools.product(*grid.values()):
+            patch = dict()
+            for path, value in zip(paths, values):
+                set_path(patch, path, value)
+            name = ','.join(f'{path}={value}' for path, value in zip(paths, values))
+            scenarios.append(Scenario(name=name, patch=patch))
+        return scenarios
+
+
+@attr.define(kw_only=True)
+class Scenarios:
+    scenarios: list = attr.ib(factory=list)
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        Create scenarios from a scenario spec
+
+        scenarios:
+          - name: rent_up_10
+            patch:
+              accounts:
+                checking:
+                  scheduled_transactions:
+                    rent:
+                      amount: 1650
+        grid:
+          accounts.checking.scheduled_transactions.paycheck.date_spec.end_date: ['2022-06-30', null]
+
+        :param spec: dict
+        :return: Scenarios
+        """
+        scenarios = [Scenario.from_spec(s) for s in spec.get('scenarios') or []]
+        if spec.get('grid'):
+            scenarios.extend(Scenario.from_grid(spec['grid']))
+        return Scenarios(scenarios=scenarios)
+
+    def run(self, spec: dict, start_date, end_date, max_workers: Union[int, None] = None) -> pd.DataFrame:
+        """
+        Project every scenario against the base spec
+
+        Projections fan out over a process pool. Each worker receives the base spec once, and then only the
+        scenario patches, so no DataFrames are pickled on the way in.
+
+        :param spec: dict base spec
+        :param start_date:
+        :param end_date:
+        :param max_workers: int|None Process count. 1 runs in-process.
+        :return: pd.DataFrame tidy table with columns scenario, account_id, date, balance
+        :raises SpecValidationError: a scenario's patched spec is invalid, nothing is projected
+        """
+        self.validate(spec)
+        names = [s.name for s in self.scenarios]
+        patches = [s.patch for s in self.scenarios]
+        if max_workers == 1:
+            _init_worker(spec, start_date, end_date)
+            results = list(map(_project_scenario, names, patches))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(spec, start_date, end_date)) as executor:
+                results = list(executor.map(_project_scenario, names, patches))
+        frames = [df for result in results for df in result]
+        if len(frames) == 0:
+            return pd.DataFrame(columns=SCENARIO_COLUMNS)
+        return pd.concat(frames, ignore_index=True)[SCENARIO_COLUMNS]
+
+    def validate(self, spec: dict) -> None:
+        """
+        Validate every scenario's patched spec, so a mistyped path or value fails here rather than in a worker
+
+        :param spec: dict base spec
+        :raises SpecValidationError: for the first invalid scenario
+        """
+        for scenario in self.scenarios:
+            try:
+                validate_spec(apply_patch(spec, scenario.patch))
+            except SpecValidationError as e:
+                raise SpecValidationError(e.errors, scenario=scenario.name) from e
+
+
+def set_path(data: dict, path: str, value) -> None:
+    """
+    Set a value in nested dicts by dotted path, creating intermediate dicts
+    """
+    keys = path.split('.')
+    for key in keys[:-1]:
+        data = data.setdefault(key, dict())
+    data[keys[-1]] = value
+
+
+def apply_patch(spec: dict, patch: dict) -> dict:
+    """
+    Deep-merge a patch into a copy of the spec
+
+    :param spec: dict
+    :param patch: dict
+    :return: dict
+    """
+    merged = copy.deepcopy(spec)
+    _merge(merged, patch)
+    return merged
+
+
+def _merge(target: dict, patch: dict) -> None:
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+_worker_state = dict()
+
+
+def _init_worker(spec, start_date, end_date):
+    _worker_state.update(spec=spec, start_date=start_date, end_date=end_date)
+
+
+def _project_scenario(name: str, patch: dict) -> list:
+    # normalize the patched spec, so keys the patch left out get their defaults. Scenarios.validate() already
+    # checked it in the parent.
+    spec = validate_spec(apply_patch(_worker_state['spec'], patch))
+    projector = Projector.from_spec(spec, _worker_state['start_date'], _worker_state['end_date'])
+    frames = []
+    for account_id, account in projector.accounts.accounts.items():
+        series = account.get_balance_series()
+        if len(series) == 0 or series.index[0] > projector.start_date:
+            # opening balance, so accounts without transactions on the first day still appear
+            opening = pd.Series([account.balance], index=pd.DatetimeIndex([projector.start_date], name='date'))
+            series = pd.concat([opening, series])
+        frames.append(pd.DataFrame({
+            'scenario':   name,
+            'account_id': account_id,
+            'date':       series.index,
+            'balance':    series.to_numpy()
+        }))
+    return frames
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from .transaction import TransactionBatch
+
+if TYPE_CHECKING:
+    from .account import Accounts
+
+
+class DynamicScheduler:
+    """
+    Resolve DynamicTransactions in dependency order
+
+    A dynamic transaction reads the balances of its card (and payment plan reference account) at the previous
+    statement close date, and writes to the accounts it transfers between. It only depends on earlier transactions
+    that write to one of the accounts it reads, on or before the date it reads them.
+
+    Transactions are resolved in waves: every pending transaction whose reads do not depend on another pending
+    transaction is resolved in the same wave, and the wave's transactions are then added in one batch. Cards that
+    do not share accounts never wait on each other, so the number of waves is the length of the longest chain of
+    payments, not the total number of payments.
+    """
+
+    def __init__(self, accounts: Accounts, dynamic: list):
+        self.accounts = accounts
+        self.pending = []
+        for dt in sorted(dynamic, key=lambda d: d.date):
+            reads, read_date = dt.amount.get_reads(accounts, dt.date)
+            self.pending.append((dt, reads, read_date, dt.get_writes()))
+
+    def get_wave(self) -> list:
+        """
+        Get the next wave of transactions that can be resolved together
+
+        :return: list of DynamicTransaction
+        """
+        # earliest pending write date per account, among transactions seen so far in date order
+        earliest_write = dict()
+        wave = []
+        for dt, reads, read_date, writes in self.pending:
+            if all(a not in earliest_write or earliest_write[a] > read_date for a in reads):
+                wave.append(dt)
+            for a in writes:
+                earliest_write.setdefault(a, dt.date)
+        return wave
+
+    def apply(self) -> int:
+        """
+        Resolve and add every pending transaction
+
+        :return: int number of waves
+        """
+        waves = 0
+        while self.pending:
+            wave = self.get_wave()
+            transactions = [t for dt in wave for t in dt.exchange(self.accounts)]
+            self.accounts.add_batch(TransactionBatch.from_transactions(transactions))
+            resolved = set(map(id, wave))
+            self.pending = [p for p in self.pending if id(p[0]) not in resolved]
+            waves += 1
+        return waves
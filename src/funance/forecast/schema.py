@@ -0,0 +1,254 @@
+import re
+
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError, INCLUDE, post_load
+
+from .datespec import frequency_map, weekday_index_map, parse_date
+from .exceptions import SpecValidationError
+from .transaction import DISTRIBUTIONS
+
+ACCOUNT_TYPES = ['checking', 'savings', 'cc', 'invest', 'loan']
+TRANSACTION_TYPES = ['income', 'expense', 'transfer']
+CHART_TYPES = ['line', 'datatable']
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+class SpecDate(fields.Field):
+    """
+    YYYY-MM-DD string, or a date PyYAML already parsed, normalized to a datetime
+    """
+
+    default_error_messages = {'invalid': 'Not a valid date. Use YYYY-MM-DD.'}
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        if isinstance(value, str) and not ISO_DATE.fullmatch(value):
+            # parse_date() also reads fuzzy dates like 'June 4', which are easy to get wrong in a spec
+            raise self.make_error('invalid')
+        try:
+            return parse_date(value)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise self.make_error('invalid') from e
+
+
+class CCBalanceSchema(Schema):
+    account_id = fields.Str(required=True)
+
+
+class DistributionSchema(Schema):
+    type = fields.Str(required=True, validate=validate.OneOf(DISTRIBUTIONS))
+    mean = fields.Float(required=True)
+    std = fields.Float(required=True, validate=validate.Range(min=0))
+    jitter_days = fields.Int(load_default=0, validate=validate.Range(min=0))
+
+
+class Amount(fields.Field):
+    """
+    A fixed amount, or a dict with one of the dynamic amount types
+    """
+
+    schemas = {
+        'cc_balance':   CCBalanceSchema,
+        'distribution': DistributionSchema,
+    }
+    default_error_messages = {
+        'invalid': f'Must be a number, or a dict with one of: {", ".join(schemas)}.'
+    }
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, dict) and len(value) == 1:
+            key, instructions = next(iter(value.items()))
+            if key in self.schemas:
+                try:
+                    return {key: self.schemas[key]().load(instructions)}
+                except ValidationError as e:
+                    raise ValidationError({key: e.messages}) from e
+        raise self.make_error('invalid')
+
+
+class DateSpecSchema(Schema):
+    start_date = SpecDate(required=True)
+    end_date = SpecDate(load_default=None, allow_none=True)
+    frequency = fields.Str(required=True, validate=validate.OneOf(list(frequency_map)))
+    interval = fields.Int(load_default=1, validate=validate.Range(min=1))
+    day_of_week = fields.Str(load_default=None, allow_none=True, validate=validate.OneOf(list(weekday_index_map)))
+    day_of_month = fields.Int(load_default=None, allow_none=True, validate=validate.Range(min=1, max=31))
+
+    @validates_schema
+    def validate_dates(self, data, **kwargs):
+        if data['end_date'] is not None and data['end_date'] < data['start_date']:
+            raise ValidationError('Must not be before start_date.', 'end_date')
+
+
+class TransferSchema(Schema):
+    direction = fields.Str(required=True, validate=validate.OneOf(['to', 'from']))
+    account_id = fields.Str(required=True)
+
+
+class ScheduledTransactionSchema(Schema):
+    name = fields.Str(required=True)
+    amount = Amount(required=True)
+    type = fields.Str(required=True, validate=validate.OneOf(TRANSACTION_TYPES))
+    date_spec = fields.Nested(DateSpecSchema, required=True)
+    transfer = fields.Nested(TransferSchema, load_default=None, allow_none=True)
+
+    @validates_schema(skip_on_field_errors=False)
+    def validate_transfer(self, data, **kwargs):
+        if 'type' not in data:
+            return
+        if data['type'] == 'transfer' and data.get('transfer') is None:
+            raise ValidationError('Required when type is transfer.', 'transfer')
+        if data['type'] != 'transfer' and data.get('transfer') is not None:
+            raise ValidationError('Must be null unless type is transfer.', 'transfer')
+
+
+class PmtPlanSchema(Schema):
+    interest_saving_balance = fields.Float(required=True)
+    ref_account_id = fields.Str(required=True)
+
+
+class AccountSchema(Schema):
+    type = fields.Str(required=True, validate=validate.OneOf(ACCOUNT_TYPES))
+    name = fields.Str(required=True)
+    balance = fields.Float(required=True)
+    scheduled_transactions = fields.Dict(keys=fields.Str(), values=fields.Nested(ScheduledTransactionSchema),
+                                         load_default=None, allow_none=True)
+    # cc only
+    stmt_balance = fields.Float()
+    stmt_close_dom = fields.Int(validate=validate.Range(min=1, max=31))
+    pmt_plan = fields.Nested(PmtPlanSchema, allow_none=True)
+
+    @validates_schema(skip_on_field_errors=False)
+    def validate_cc(self, data, **kwargs):
+        if data.get('type') != 'cc':
+            return
+        errors = {key: ['Required for cc accounts.'] for key in ['stmt_balance', 'stmt_close_dom']
+                  if key not in data}
+        if errors:
+            raise ValidationError(errors)
+
+    @post_load
+    def set_defaults(self, data, **kwargs):
+        if data['type'] == 'cc':
+            data.setdefault('pmt_plan', None)
+        return data
+
+
+class ChartSchema(Schema):
+    name = fields.Str(required=True)
+    type = fields.Str(required=True, validate=validate.OneOf(CHART_TYPES))
+    account_ids = fields.List(fields.Str(), required=True)
+
+
+class ForecastSpecSchema(Schema):
+    """
+    The forecast spec, see forecast.dist.yml
+
+    Validation collects every error in the document, including references to accounts that do not exist, before
+    anything is projected.
+    """
+
+    accounts = fields.Dict(keys=fields.Str(), values=fields.Nested(AccountSchema), required=True)
+    chart_spec = fields.List(fields.Nested(ChartSchema), load_default=list)
+
+    class Meta:
+        # unknown top level keys are left to other tools
+        unknown = INCLUDE
+
+    @validates_schema(skip_on_field_errors=False)
+    def validate_references(self, data, **kwargs):
+        # runs after field errors too, so anything that failed is missing and is skipped here
+        accounts = data.get('accounts') or {}
+        errors = {}
+
+        def add_error(path, message):
+            node = errors
+            for key in path[:-1]:
+                node = node.setdefault(key, {})
+            node.setdefault(path[-1], []).append(message)
+
+        for account_id, account in accounts.items():
+            ref_account_id = (account.get('pmt_plan') or {}).get('ref_account_id')
+            if ref_account_id is not None and ref_account_id not in accounts:
+                add_error(['accounts', account_id, 'pmt_plan', 'ref_account_id'], f'Unknown account: {ref_account_id}.')
+            for trans_id, trans in (account.get('scheduled_transactions') or {}).items():
+                path = ['accounts', account_id, 'scheduled_transactions', trans_id]
+                transfer_id = (trans.get('transfer') or {}).get('account_id')
+                if transfer_id is not None and transfer_id not in accounts:
+                    add_error(path + ['transfer', 'account_id'], f'Unknown account: {transfer_id}.')
+                amount = trans.get('amount')
+                card_id = (amount.get('cc_balance') or {}).get('account_id') if isinstance(amount, dict) else None
+                if card_id is None:
+                    continue
+                if card_id not in accounts:
+                    add_error(path + ['amount', 'cc_balance', 'account_id'], f'Unknown account: {card_id}.')
+                elif accounts[card_id].get('type', 'cc') != 'cc':
+                    # an account without a valid type already has an error
+                    add_error(path + ['amount', 'cc_balance', 'account_id'], f'Not a cc account: {card_id}.')
+
+        for i, chart in enumerate(data.get('chart_spec') or []):
+            for j, account_id in enumerate(chart.get('account_ids') or []):
+                if account_id not in accounts:
+                    add_error(['chart_spec', i, 'account_ids', j], f'Unknown account: {account_id}.')
+
+        if errors:
+            raise ValidationError(errors)
+
+
+def get_error_paths(messages, path=()) -> list:
+    """
+    Flatten marshmallow error messages into (path, message) tuples
+
+    Dict fields nest their errors under 'key' and 'value', which are left out of the path.
+
+    :param messages: dict|list|str
+    :param path: tuple
+    :return: list of tuples (str path, str message)
+    """
+    if isinstance(messages, str):
+        return [(format_path(path), messages)]
+    if isinstance(messages, list):
+        errors = []
+        for message in messages:
+            errors += get_error_paths(message, path)
+        return errors
+    errors = []
+    for key, value in messages.items():
+        if key in ('_schema', 'value'):
+            errors += get_error_paths(value, path)
+        elif key == 'key':
+            errors += get_error_paths(value, path[:-1] + (f'{path[-1]} (key)',) if path else path)
+        else:
+            errors += get_error_paths(value, path + (key,))
+    return errors
+
+
+def format_path(path) -> str:
+    """
+    Format a path like the YAML it points to, e.g. chart_spec[0].account_ids[2]
+    """
+    formatted = ''
+    for key in path:
+        if isinstance(key, int):
+            formatted += f'[{key}]'
+        else:
+            formatted += f'.{key}' if formatted else str(key)
+    return formatted or '(root)'
+
+
+def validate_spec(spec) -> dict:
+    """
+    Validate a forecast spec, and normalize it
+
+    Dates are parsed to datetimes, amounts to floats, and optional keys get their defaults.
+
+    :param spec: dict
+    :return: dict
+    :raises SpecValidationError: with every error in the spec
+    """
+    if not isinstance(spec, dict):
+        raise SpecValidationError([('(root)', 'The forecast spec must be a mapping.')])
+    try:
+        return ForecastSpecSchema().load(spec)
+    except ValidationError as e:
+        raise SpecValidationError(get_error_paths(e.messages)) from e
@@ -3,9 +3,11 @@ from __future__ import annotations
 from typing import Union, TYPE_CHECKING
 
 import attr
+import numpy as np
+import pandas as pd
 from dateutil.relativedelta import relativedelta as drel
 
-from .datespec import DateSpec, DATE_FORMAT
+from .datespec import DateSpec
 
 if TYPE_CHECKING:
     from .account import Accounts
@@ -16,6 +18,19 @@ class Transfer:
     direction: str = attr.ib()
     account_id: str = attr.ib()
 
+    def get_sending_receiving(self, account_id: str) -> tuple:
+        """
+        Determine the sending and receiving account of a transfer scheduled on account_id
+
+        :param account_id: str
+        :return: tuple
+        """
+        if self.direction == 'to':
+            return account_id, self.account_id
+        if self.direction == 'from':
+            return self.account_id, account_id
+        raise ValueError(f'Transfer direction must be one of "to", "from". Received: {self.direction}')
+
 
 @attr.define(kw_only=True)
 class Transaction:
@@ -27,6 +42,124 @@ class Transaction:
     type: str = attr.ib()
 
 
+def _empty_dates():
+    return np.array([], dtype='datetime64[D]')
+
+
+def _empty_codes():
+    return np.array([], dtype=np.int32)
+
+
+@attr.define(kw_only=True)
+class TransactionBatch:
+    """
+    Columnar block of transactions
+
+    Dates, amounts and the account, name and type of each row are stored as NumPy arrays. Account, name and type
+    are integer codes into the account_ids, names and types category lists, so a batch never holds one Python
+    object per transaction.
+    """
+    account_ids: list = attr.ib(factory=list)
+    names: list = attr.ib(factory=list)
+    types: list = attr.ib(factory=list)
+    date: np.ndarray = attr.ib(factory=_empty_dates)
+    amount: np.ndarray = attr.ib(factory=lambda: np.array([], dtype=np.float64))
+    account: np.ndarray = attr.ib(factory=_empty_codes)
+    name: np.ndarray = attr.ib(factory=_empty_codes)
+    type: np.ndarray = attr.ib(factory=_empty_codes)
+
+    def __len__(self):
+        return len(self.date)
+
+    @classmethod
+    def from_dates(cls, *, account_id: str, name: str, ttype: str, dates: np.ndarray, amount: float):
+        """
+        Create a batch of transactions that only differ by date
+        """
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        size = len(dates)
+        return TransactionBatch(account_ids=[account_id], names=[name], types=[ttype], date=dates,
+                                amount=np.full(size, amount, dtype=np.float64),
+                                account=np.zeros(size, dtype=np.int32), name=np.zeros(size, dtype=np.int32),
+                                type=np.zeros(size, dtype=np.int32))
+
+    @classmethod
+    def from_transactions(cls, transactions: list):
+        """
+        Create a batch from Transaction objects
+        """
+        account_ids, names, types = {}, {}, {}
+        return TransactionBatch(
+            date=np.array([t.date for t in transactions], dtype='datetime64[D]'),
+            amount=np.array([t.amount for t in transactions], dtype=np.float64),
+            account=np.array([account_ids.setdefault(t.account_id, len(account_ids)) for t in transactions],
+                             dtype=np.int32),
+            name=np.array([names.setdefault(t.name, len(names)) for t in transactions], dtype=np.int32),
+            type=np.array([types.setdefault(t.type, len(types)) for t in transactions], dtype=np.int32),
+            account_ids=list(account_ids), names=list(names), types=list(types))
+
+    @classmethod
+    def concat(cls, batches: list):
+        """
+        Concatenate batches, merging their categories
+        """
+        if len(batches) == 0:
+            return TransactionBatch()
+        if len(batches) == 1:
+            return batches[0]
+        account_ids, names, types = {}, {}, {}
+
+        def recode(categories, merged, codes):
+            lookup = np.array([merged.setdefault(c, len(merged)) for c in categories], dtype=np.int32)
+            return lookup[codes] if len(lookup) else codes
+
+        account = [recode(b.account_ids, account_ids, b.account) for b in batches]
+        name = [recode(b.names, names, b.name) for b in batches]
+        ttype = [recode(b.types, types, b.type) for b in batches]
+        return TransactionBatch(account_ids=list(account_ids), names=list(names), types=list(types),
+                                date=np.concatenate([b.date for b in batches]),
+                                amount=np.concatenate([b.amount for b in batches]),
+                                account=np.concatenate(account), name=np.concatenate(name),
+                                type=np.concatenate(ttype))
+
+    def take(self, indices: np.ndarray):
+        """
+        Select rows by position. Categories are shared with this batch.
+        """
+        return TransactionBatch(account_ids=self.account_ids, names=self.names, types=self.types,
+                                date=self.date[indices], amount=self.amount[indices], account=self.account[indices],
+                                name=self.name[indices], type=self.type[indices])
+
+    def partition(self) -> dict:
+        """
+        Split the batch by account
+
+        :return: dict account_id -> TransactionBatch
+        """
+        order = np.argsort(self.account, kind='stable')
+        bounds = np.searchsorted(self.account[order], np.arange(len(self.account_ids) + 1))
+        partitions = dict()
+        for code, account_id in enumerate(self.account_ids):
+            if bounds[code] < bounds[code + 1]:
+                partitions[account_id] = self.take(order[bounds[code]:bounds[code + 1]])
+        return partitions
+
+    def get_account_ids(self) -> list:
+        return [self.account_ids[code] for code in np.unique(self.account)]
+
+    def to_df(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'account_id': np.array(self.account_ids, dtype=object)[self.account],
+            'date':       self.date.astype('datetime64[s]'),
+            'amount':     self.amount,
+            'name':       np.array(self.names, dtype=object)[self.name]
+        }, columns=['account_id', 'date', 'amount', 'name'])
+
+
+def _get_account_balance(account, date):
+    return account.get_balance(date)
+
+
 @attr.define(kw_only=True)
 class CCBalanceAmount:
     account_id: str = attr.ib()
@@ -37,19 +170,44 @@ class CCBalanceAmount:
         instructions = spec['cc_balance']
         return CCBalanceAmount(account_id=instructions['account_id'], index=index)
 
+    @classmethod
+    def get_close_date(cls, account, date):
+        """
+        Get the statement close date of the month before date
+        """
+        last_month = date + drel(months=-1)
+        return last_month + drel(day=account.stmt_close_dom)
 
-@attr.define(kw_only=True)
-class DynamicTransaction(Transaction):
-    amount: CCBalanceAmount = attr.ib()
-    transfer: Union[Transfer, None] = attr.ib()
+    def get_reads(self, accounts: Accounts, date) -> tuple:
+        """
+        Get the accounts whose balances resolve() reads, and the date it reads them at
 
-    def exchange(self, accounts: Accounts):
-        amount = self.amount
-        account = accounts.get_account(amount.account_id)
-        last_month = self.date + drel(months=-1)
-        close_date = last_month + drel(day=account.stmt_close_dom)
+        :return: tuple (set of account ids, datetime|None)
+        """
+        if self.index == 0:
+            # the first payment uses balances from the spec
+            return set(), None
+        account = accounts.get_account(self.account_id)
+        reads = {self.account_id}
+        if account.pmt_plan is not None:
+            reads.add(account.pmt_plan['ref_account_id'])
+        return reads, self.get_close_date(account, date)
+
+    def resolve(self, accounts: Accounts, date, get_balance=None):
+        """
+        Resolve the credit card balance to pay on date
+
+        :param accounts: Accounts
+        :param date: datetime
+        :param get_balance: callable(account, date) used to look up balances. Defaults to Account.get_balance.
+        :return: float, or whatever get_balance returns
+        """
+        if get_balance is None:
+            get_balance = _get_account_balance
+        account = accounts.get_account(self.account_id)
+        close_date = self.get_close_date(account, date)
         is_pmt_plan = account.pmt_plan is not None
-        if amount.index == 0:
+        if self.index == 0:
             if is_pmt_plan:
                 balance = account.pmt_plan['interest_saving_balance']
             else:
@@ -57,13 +215,70 @@ class DynamicTransaction(Transaction):
         else:
             if is_pmt_plan:
                 # determine interest saving balance
-                main_balance = account.get_balance(close_date.strftime(DATE_FORMAT))
+                main_balance = get_balance(account, close_date)
                 ref_acct = accounts.get_account(account.pmt_plan['ref_account_id'])
-                ref_balance = ref_acct.get_balance(close_date.strftime(DATE_FORMAT))
+                ref_balance = get_balance(ref_acct, close_date)
                 balance = main_balance - ref_balance
             else:
-                balance = account.get_balance(close_date.strftime(DATE_FORMAT))
+                balance = get_balance(account, close_date)
+        return balance
+
+
+DISTRIBUTIONS = ['normal', 'lognormal']
+
+
+@attr.define(kw_only=True)
+class DistributionAmount:
+    """
+    Stochastic amount for Monte Carlo simulation
+
+    mean and std describe the amount itself, for both distributions. Samples are clipped at 0, since the sign of an
+    amount is determined by the transaction type. jitter_days moves each occurrence by up to that many days in
+    either direction. Deterministic projections use the mean on the scheduled date.
+    """
+    distribution: str = attr.ib()
+    mean: float = attr.ib()
+    std: float = attr.ib()
+    jitter_days: int = attr.ib(default=0)
+
+    @classmethod
+    def from_spec(cls, spec: dict):
+        instructions = spec['distribution']
+        if instructions['type'] not in DISTRIBUTIONS:
+            raise ValueError(f'Distribution must be one of {", ".join(DISTRIBUTIONS)}. Received: {instructions["type"]}')
+        return DistributionAmount(distribution=instructions['type'], mean=instructions['mean'],
+                                  std=instructions['std'], jitter_days=instructions.get('jitter_days') or 0)
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        if self.distribution == 'lognormal':
+            # convert mean/std of the amount to the parameters of the underlying normal distribution
+            sigma2 = np.log1p((self.std / self.mean) ** 2)
+            samples = rng.lognormal(np.log(self.mean) - sigma2 / 2, np.sqrt(sigma2), size)
+        else:
+            samples = rng.normal(self.mean, self.std, size)
+        return np.maximum(samples, 0.0)
+
+    def sample_jitter(self, rng: np.random.Generator, size) -> np.ndarray:
+        if self.jitter_days == 0:
+            return np.zeros(size, dtype=np.int64)
+        return rng.integers(-self.jitter_days, self.jitter_days + 1, size)
+
+
+@attr.define(kw_only=True)
+class DynamicTransaction(Transaction):
+    amount: CCBalanceAmount = attr.ib()
+    transfer: Union[Transfer, None] = attr.ib()
+
+    def get_writes(self) -> set:
+        """
+        Get the accounts the exchanged transaction posts to
+        """
+        if self.type == 'transfer':
+            return set(self.transfer.get_sending_receiving(self.account_id))
+        return {self.account_id}
 
+    def exchange(self, accounts: Accounts):
+        balance = self.amount.resolve(accounts, self.date)
         t = ScheduledTransaction.create_plain_transaction(transaction_id=self.transaction_id,
                                                           account_id=self.account_id,
                                                           name=self.name, ttype=self.type, date=self.date,
@@ -74,20 +289,34 @@ class DynamicTransaction(Transaction):
 
 @attr.define(kw_only=True)
 class ScheduledTransactions:
-    plain: list = attr.ib(factory=list)
+    plain: TransactionBatch = attr.ib(factory=TransactionBatch)
     dynamic: list = attr.ib(factory=list)
 
     @classmethod
     def from_spec(cls, spec, start_date, end_date):
-        transactions = []
+        batches = []
+        dynamic = []
+        for st in cls.get_scheduled(spec):
+            if st.is_dynamic():
+                dynamic.extend(st.generate_transactions(start_date, end_date))
+            else:
+                batches.append(st.generate_batch(start_date, end_date))
+        return ScheduledTransactions(plain=TransactionBatch.concat(batches), dynamic=dynamic)
+
+    @classmethod
+    def get_scheduled(cls, spec) -> list:
+        """
+        Get every ScheduledTransaction in the spec
+
+        :param spec: dict
+        :return: list
+        """
+        scheduled = []
         for account_id, account_spec in spec['accounts'].items():
             if account_spec['scheduled_transactions']:
                 for trans_id, trans in account_spec['scheduled_transactions'].items():
-                    st = ScheduledTransaction.from_spec(account_id, trans_id, trans)
-                    transactions.extend(st.generate_transactions(start_date, end_date))
-        plain = [t for t in transactions if type(t).__name__ == 'Transaction']
-        dynamic = [t for t in transactions if type(t).__name__ == 'DynamicTransaction']
-        return ScheduledTransactions(plain=plain, dynamic=dynamic)
+                    scheduled.append(ScheduledTransaction.from_spec(account_id, trans_id, trans))
+        return scheduled
 
 
 @attr.define(kw_only=True)
@@ -95,7 +324,7 @@ class ScheduledTransaction:
     transaction_id: str = attr.ib()
     account_id: str = attr.ib()
     name: str = attr.ib()
-    amount: Union[float, dict] = attr.ib()
+    amount: Union[float, dict, DistributionAmount] = attr.ib()
     type: str = attr.ib()
     date_spec: DateSpec = attr.ib()
     transfer: Union[Transfer, None] = attr.ib()
@@ -104,19 +333,64 @@ class ScheduledTransaction:
     def from_spec(cls, account_id: str, transaction_id: str, spec: dict):
         transfer = None if spec['transfer'] is None else Transfer(direction=spec['transfer']['direction'],
                                                                   account_id=spec['transfer']['account_id'])
+        amount = spec['amount']
+        if isinstance(amount, dict) and 'distribution' in amount:
+            amount = DistributionAmount.from_spec(amount)
         st = ScheduledTransaction(transaction_id=transaction_id, account_id=account_id,
-                                  name=spec['name'], amount=spec['amount'], type=spec['type'],
+                                  name=spec['name'], amount=amount, type=spec['type'],
                                   date_spec=DateSpec.from_spec(spec['date_spec']), transfer=transfer)
         return st
 
+    def is_dynamic(self) -> bool:
+        return type(self.amount) == dict
+
+    def get_expected_amount(self) -> float:
+        if isinstance(self.amount, DistributionAmount):
+            return self.amount.mean
+        return self.amount
+
+    def get_legs(self) -> list:
+        """
+        Get the accounts this transaction posts to, with the sign of the amount for each
+
+        :return: list of (account_id, sign) tuples
+        """
+        if self.type == 'transfer':
+            sending_account_id, receiving_account_id = self.transfer.get_sending_receiving(self.account_id)
+            # debit sending account, credit receiving account
+            return [(sending_account_id, -1.0), (receiving_account_id, 1.0)]
+        if self.type == 'income':
+            return [(self.account_id, 1.0)]
+        if self.type == 'expense':
+            return [(self.account_id, -1.0)]
+        raise ValueError(f'Transaction type must be one of "income", "expense", "transfer". Received: {self.type}')
+
+    def generate_batch(self, start_date, end_date) -> TransactionBatch:
+        """
+        Generate plain transactions in bulk
+
+        This process may generate transactions for any other account. Amounts with a distribution use their mean.
+
+        :param start_date: str|datetime
+        :param end_date: str|datetime
+        :return: TransactionBatch
+        """
+        dates = self.date_spec.generate_dates64(start_date, end_date)
+        amount = abs(self.get_expected_amount())
+        return TransactionBatch.concat([
+            TransactionBatch.from_dates(account_id=account_id, name=self.name, ttype=self.type, dates=dates,
+                                        amount=sign * amount)
+            for account_id, sign in self.get_legs()
+        ])
+
     def generate_transactions(self, start_date, end_date):
         """
         Generate transactions
 
         This process may generate transactions for any other account
 
-        :param start_date: str
-        :param end_date: str
+        :param start_date: str|datetime
+        :param end_date: str|datetime
         :return: list
         """
         transactions = []
@@ -162,14 +436,7 @@ class ScheduledTransaction:
                               transfer: Transfer) -> list:
         transactions = []
         # determine sending and receiving account
-        if transfer.direction == 'to':
-            sending_account_id = account_id
-            receiving_account_id = transfer.account_id
-        elif transfer.direction == 'from':
-            sending_account_id = transfer.account_id
-            receiving_account_id = account_id
-        else:
-            raise ValueError(f'Transfer direction must be one of "to", "from". Received: {transfer.direction}')
+        sending_account_id, receiving_account_id = transfer.get_sending_receiving(account_id)
         # debit sending account
         transactions.append(
             Transaction(transaction_id=transaction_id, type=ttype, account_id=sending_account_id, date=date,
@@ -0,0 +1,185 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from funance.common.logger import get_logger
+from funance.scrape.driver.storage import supports_cdp
+
+logger = get_logger('api')
+
+# JSON numbers
+NUMBER = (int, float)
+
+
+class ApiError(ValueError):
+    """
+    A response that is not the JSON the client expects, raised by get_json() and the clients' parsers
+    """
+    pass
+
+
+# exceptions that mean the data is not available over HTTP, and the provider should scrape the pages instead. Anything
+# else is a bug in the client, and is raised.
+FALLBACK_EXCEPTIONS = (requests.RequestException, ApiError)
+
+
+def get_field(data, key: str, types=None):
+    """
+    Get a field from a JSON object, checking the response has the shape the client expects
+
+    :param data: dict from a JSON response
+    :param key: str
+    :param types: type or tuple of types the value must be, e.g. NUMBER
+    :return: the value
+    :raises ApiError: if data is not an object, the key is missing, or the value has another type
+    """
+    if not isinstance(data, dict):
+        raise ApiError(f'Expected an object with {key}, received {type(data).__name__}')
+    if key not in data:
+        raise ApiError(f'Missing {key}, received {", ".join(data) or "an empty object"}')
+    value = data[key]
+    if types is not None and not isinstance(value, types):
+        names = [t.__name__ for t in (types if isinstance(types, tuple) else (types,))]
+        raise ApiError(f'Expected {key} to be {" or ".join(names)}, received {type(value).__name__}')
+    return value
+
+
+def get_date(data, key: str, date_format: str) -> str:
+    """
+    :param data: dict from a JSON response
+    :param key: str
+    :param date_format: str format the response uses
+    :return: str YYYY-MM-DD
+    :raises ApiError: if the date is missing or in another format
+    """
+    value = get_field(data, key, str)
+    try:
+        return datetime.strptime(value, date_format).strftime('%Y-%m-%d')
+    except ValueError as e:
+        raise ApiError(f'Expected {key} like {date_format}, received {value}') from e
+
+
+def session_from_driver(driver, pool_size: int = 8) -> requests.Session:
+    """
+    Create a requests Session with the browser's cookies, after logging in with Selenium
+
+    :param driver: WebDriver
+    :param pool_size: int connections kept open per host, one for each concurrent request
+    :return: requests.Session
+    """
+    if supports_cdp(driver):
+        # every domain, including cookies for the provider's other hosts
+        cookies = driver.execute_cdp_cmd('Network.getAllCookies', {})['cookies']
+    else:
+        cookies = driver.get_cookies()
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # some providers reject requests that do not look like they come from the logged in browser
+    session.headers['User-Agent'] = driver.execute_script('return navigator.userAgent')
+    session.headers['Accept'] = 'application/json'
+    for cookie in cookies:
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''),
+                            path=cookie.get('path', '/'), secure=cookie.get('secure', False))
+    return session
+
+
+def write_account(writer, account: dict):
+    """
+    Write an account fetched over HTTP, like the page scrapers do
+
+    :param writer: BrokerageWriter
+    :param account: dict with account_name, cash, and tickers, a list of dicts with ticker, company_name,
+                    total_shares and lots
+    :return:
+    """
+    account_name = account['account_name']
+    cash = account['cash']
+    writer.set_account(dict(account_name=account_name))
+    writer.set_cash(account_name, cash)
+    writer.set_ticker(account_name, dict(
+        ticker='X_CASH',
+        company_name='CASH',
+        total_shares=cash,
+    ))
+    writer.add_cost_basis(account_name, 'X_CASH', dict(
+        date_acquired=datetime.today().strftime('%Y-%m-%d'),
+        num_shares=cash,
+        cost_per_share='1.00',
+        total_cost=cash,
+        term='long'
+    ))
+    for ticker in account['tickers']:
+        writer.set_ticker(account_name, dict(
+            ticker=ticker['ticker'],
+            company_name=ticker['company_name'],
+            total_shares=ticker['total_shares'],
+        ))
+        for lot in ticker['lots']:
+            writer.add_cost_basis(account_name, ticker['ticker'], lot)
+
+
+class ApiClient(ABC):
+    """
+    Fetch a provider's data from the JSON endpoints its pages load, instead of walking the rendered pages
+
+    Accounts are fetched concurrently. Subclasses set base_url and implement get_accounts() and get_account().
+    """
+
+    base_url = None
+
+    def __init__(self, session: requests.Session, base_url: str = None, max_workers: int = 8, timeout: float = 30):
+        """
+        :param session: requests.Session from session_from_driver()
+        :param base_url: str defaults to the provider's site
+        :param max_workers: int accounts fetched at once
+        :param timeout: float seconds per request
+        """
+        self.session = session
+        self.base_url = (base_url or self.base_url).rstrip('/')
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def get_json(self, path: str, params: dict = None):
+        response = self.session.get(f'{self.base_url}{path}', params=params, timeout=self.timeout)
+        response.raise_for_status()
+        try:
+            return response.json()
+        except ValueError as e:
+            # usually the log in page, when the session expired
+            raise ApiError(f'Expected JSON from {path}, received {response.headers.get("Content-Type")}') from e
+
+    @abstractmethod
+    def get_accounts(self) -> list:
+        """
+        :return: list of account dicts, passed to get_account()
+        """
+
+    @abstractmethod
+    def get_account(self, account: dict) -> dict:
+        """
+        :param account: dict from get_accounts()
+        :return: dict, see write_account()
+        """
+
+    def scrape(self, writer):
+        """
+        Fetch every account and write it
+
+        Nothing is written unless every account was fetched, so a failure leaves the writer untouched for the page
+        scraper to fill.
+
+        :param writer: BrokerageWriter
+        :return:
+        """
+        accounts = self.get_accounts()
+        with ThreadPoolExecutor(max_workers=max(min(self.max_workers, len(accounts)), 1)) as executor:
+            results = list(executor.map(self.get_account, accounts))
+        for account in results:
+            logger.info(f"Fetched account: {account['account_name']}")
+            write_account(writer, account)
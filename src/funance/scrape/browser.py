@@ -0,0 +1,109 @@
+import attr
+
+# Third party trackers the providers load on every page. Nothing scraped depends on them.
+ANALYTICS_HOSTS = [
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'facebook.net',
+    'omtrdc.net',
+    'demdex.net',
+    'nr-data.net',
+    'hotjar.com',
+    'quantserve.com',
+    'scorecardresearch.com',
+]
+FONT_URL_PATTERNS = ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot']
+
+# Chrome features that use memory and network in the background, and that a scraper never needs
+TRIMMED_ARGUMENTS = [
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-features=Translate,MediaRouter,OptimizationHints',
+    '--no-first-run',
+    '--mute-audio',
+    # /dev/shm is small on shared boxes, and Chrome crashes when it fills up
+    '--disable-dev-shm-usage',
+]
+HEADLESS_WINDOW_SIZE = '1920,1080'
+
+
+@attr.define(kw_only=True)
+class BrowserMode:
+    """
+    How Chrome is launched for scraping
+
+    Headless mode only works with a profile that is already logged in, since nobody can type the password. Log in
+    once with a visible browser, then the profile's cookies are reused.
+    """
+
+    headless: bool = attr.ib(default=False)
+    block_images: bool = attr.ib(default=True)
+    block_fonts: bool = attr.ib(default=True)
+    blocked_hosts: list = attr.ib(factory=lambda: list(ANALYTICS_HOSTS))
+    disable_extensions: bool = attr.ib(default=True)
+    trim: bool = attr.ib(default=True)
+    # return from driver.get() at DOMContentLoaded instead of waiting for every image and script. The providers
+    # wait for the elements they need.
+    page_load_strategy: str = attr.ib(default='eager', validator=attr.validators.in_(['normal', 'eager']))
+
+    def get_chrome_options(self, detached=False, profile_dir=None):
+        """
+        :param detached: bool keep the browser open when the script ends
+        :param profile_dir: str Chrome user data dir, None for a temporary profile
+        :return: ChromeOptions
+        """
+        from selenium import webdriver
+
+        chrome_options = webdriver.ChromeOptions()
+        # Detach from script so browser does not automatically close when execution ends
+        chrome_options.add_experimental_option('detach', detached)
+        if profile_dir is not None:
+            chrome_options.add_argument(f'--user-data-dir={profile_dir}')
+        if self.headless:
+            chrome_options.add_argument('--headless=new')
+            # the providers' layouts, and so ActionChains, depend on the window size
+            chrome_options.add_argument(f'--window-size={HEADLESS_WINDOW_SIZE}')
+        if self.disable_extensions:
+            chrome_options.add_argument('--disable-extensions')
+        if self.trim:
+            for argument in TRIMMED_ARGUMENTS:
+                chrome_options.add_argument(argument)
+        if self.blocked_hosts:
+            # fail DNS lookups, so trackers are never requested, in every tab
+            rules = ', '.join(f'MAP {pattern} ~NOTFOUND' for host in self.blocked_hosts
+                              for pattern in (host, f'*.{host}'))
+            chrome_options.add_argument(f'--host-resolver-rules={rules}')
+        if self.block_images:
+            chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        if self.page_load_strategy != 'normal':
+            chrome_options.set_capability('pageLoadStrategy', self.page_load_strategy)
+        return chrome_options
+
+    def get_blocked_urls(self) -> list:
+        return list(FONT_URL_PATTERNS) if self.block_fonts else []
+
+    def apply(self, driver):
+        """
+        Block URLs in the driver's current tab. Chrome has no option for fonts, so they are blocked over the
+        DevTools protocol, which works per tab.
+
+        :param driver: WebDriver
+        :return:
+        """
+        blocked_urls = self.get_blocked_urls()
+        if blocked_urls:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls})
+
+
+BROWSER_MODES = {
+    # a regular browser, for interactive and MFA logins that may need everything the page loads
+    'full':     BrowserMode(block_images=False, block_fonts=False, blocked_hosts=[], disable_extensions=False,
+                            trim=False, page_load_strategy='normal'),
+    'lite':     BrowserMode(),
+    'headless': BrowserMode(headless=True),
+}
+DEFAULT_BROWSER_MODE = 'full'
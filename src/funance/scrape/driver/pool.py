@@ -0,0 +1,100 @@
+import os
+import threading
+from pathlib import Path
+
+from funance.common.logger import get_logger
+from funance.common.paths import PROFILES_DIR
+
+logger = get_logger('pool')
+
+
+class DriverPool:
+    """
+    Chrome drivers for scraping providers concurrently
+
+    Each driver gets its own chromedriver port and its own Chrome profile, named after the provider. Chrome locks
+    a profile while it is in use, so concurrent browsers can not share one, and a named profile keeps the
+    provider's cookies between runs.
+    """
+
+    def __init__(self, detached=False, profiles_dir=PROFILES_DIR, create_driver=None, mode=None):
+        """
+        :param detached: bool keep browsers open when the script ends
+        :param profiles_dir: str
+        :param mode: BrowserMode, see funance.scrape.browser
+        :param create_driver: callable, defaults to funance.scrape.driver.create_driver
+        """
+        if create_driver is None:
+            from funance.scrape.driver import create_driver
+        self.detached = detached
+        self.profiles_dir = profiles_dir
+        self.create_driver = create_driver
+        self.mode = mode
+        self._drivers = dict()
+        self._ports = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_free_port(self) -> int:
+        from selenium.webdriver.common.utils import free_port
+
+        with self._lock:
+            port = free_port()
+            while port in self._ports:
+                port = free_port()
+            self._ports.add(port)
+            return port
+
+    def acquire(self, name):
+        """
+        Start a driver for the named scraper
+
+        :param name: str profile name, usually the provider name
+        :return: WebDriver
+        """
+        with self._lock:
+            if name in self._drivers:
+                raise ValueError(f'A driver is already running for {name}')
+            # reserve the name while the driver starts, outside the lock
+            self._drivers[name] = None
+        profile_dir = os.path.join(self.profiles_dir, name)
+        Path(profile_dir).mkdir(parents=True, exist_ok=True)
+        port = self.get_free_port()
+        logger.info(f'Starting driver for {name} on port {port}')
+        try:
+            driver = self.create_driver(detached=self.detached, port=port, profile_dir=profile_dir,
+                                        save_session=False, mode=self.mode)
+        except Exception:
+            with self._lock:
+                del self._drivers[name]
+                self._ports.discard(port)
+            raise
+        with self._lock:
+            self._drivers[name] = (driver, port)
+        return driver
+
+    def release(self, name):
+        """
+        Quit the named scraper's driver, unless the pool is detached
+
+        :param name: str
+        :return:
+        """
+        with self._lock:
+            entry = self._drivers.pop(name, None)
+        if entry is None:
+            return
+        driver, port = entry
+        with self._lock:
+            self._ports.discard(port)
+        if not self.detached:
+            driver.quit()
+
+    def close(self):
+        for name in list(self._drivers):
+            self.release(name)
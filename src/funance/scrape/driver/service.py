@@ -1,6 +1,7 @@
 import os
 
 from funance.common.paths import CHROMEDRIVER_DIR
+from funance.scrape.browser import BROWSER_MODES
 from funance.scrape.driver.session import Session
 from selenium import webdriver
 from selenium.common.exceptions import SessionNotCreatedException
@@ -53,7 +54,18 @@ def attach_driver_session(session_id, executor_url):
     return new_driver
 
 
-def create_driver(session=False, detached=False):
+def create_driver(session=False, detached=False, port=4444, profile_dir=None, save_session=True, mode=None):
+    """
+    Create a Chrome driver, or attach to the session started by `funance chromedriver service start`
+
+    :param session: bool attach to the existing session
+    :param detached: bool keep the browser open when the script ends
+    :param port: int chromedriver port, 0 for any free port
+    :param profile_dir: str Chrome user data dir, None for a temporary profile
+    :param save_session: bool save the new session, so it can be attached to later
+    :param mode: BrowserMode defaults to a full browser
+    :return: WebDriver
+    """
     sess = Session.from_file()
 
     if session:
@@ -61,11 +73,11 @@ def create_driver(session=False, detached=False):
         driver = attach_driver_session(sess.session_id, sess.executor_url)
     else:
         # Without an existing session we manually create the driver
-        chrome_options = webdriver.ChromeOptions()
-        # Detach from script so browser does not automatically close when execution ends
-        chrome_options.add_experimental_option("detach", detached)
+        mode = mode or BROWSER_MODES['full']
+        chrome_options = mode.get_chrome_options(detached=detached, profile_dir=profile_dir)
         try:
-            driver = webdriver.Chrome(get_chromedriver_executable(sess.chromedriver_version), port=4444, chrome_options=chrome_options)
+            driver = webdriver.Chrome(get_chromedriver_executable(sess.chromedriver_version), port=port,
+                                      chrome_options=chrome_options)
         except SessionNotCreatedException as e:
             """
             TODO throw custom exception, additionally handling this message on Chrome/Chromedriver version mismatch
@@ -74,10 +86,12 @@ def create_driver(session=False, detached=False):
             Current browser version is 101.0.4951.64 with binary path /Applications/Google Chrome.app/Contents/MacOS/Google Chrome
             """
             raise e
+        mode.apply(driver)
 
-        sess.executor_url = driver.command_executor._url
-        sess.session_id = driver.session_id
-        sess.close()
+        if save_session:
+            sess.executor_url = driver.command_executor._url
+            sess.session_id = driver.session_id
+            sess.close()
 
     return driver
 
@@ -0,0 +1,228 @@
+import base64
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import attr
+
+from funance.common.files import atomic_write
+from funance.common.logger import get_logger
+from funance.common.paths import SESSIONS_DIR, SESSION_KEY_FILE
+
+logger = get_logger('storage')
+
+# env var with a Fernet key, instead of the key file
+SESSION_KEY_ENV = 'FUNANCE_SESSION_KEY'
+
+# CDP cookie fields, see https://chromedevtools.github.io/devtools-protocol/tot/Network/#type-CookieParam
+COOKIE_PARAMS = ['name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite', 'expires']
+
+# seed localStorage before the page's own scripts run, without overwriting anything the site has set since
+LOCAL_STORAGE_SCRIPT = """
+(function (items) {
+    const origin = %s;
+    if (location.origin !== origin) {
+        return;
+    }
+    for (const [key, value] of Object.entries(items)) {
+        if (localStorage.getItem(key) === null) {
+            localStorage.setItem(key, value);
+        }
+    }
+})(%s);
+"""
+
+
+@attr.define(kw_only=True)
+class StorageState:
+    """
+    A logged in browser's cookies and localStorage
+    """
+
+    cookies: list = attr.ib(factory=list)
+    # origin to dict of localStorage items
+    local_storage: dict = attr.ib(factory=dict)
+    saved_at: float = attr.ib(default=0.0)
+
+    @classmethod
+    def from_spec(cls, spec):
+        return StorageState(cookies=spec['cookies'], local_storage=spec['local_storage'], saved_at=spec['saved_at'])
+
+    def get_valid_cookies(self, now: float = None) -> list:
+        """
+        :param now: float unix time, defaults to the current time
+        :return: list of cookies that have not expired. Session cookies (without an expiry) are kept.
+        """
+        now = time.time() if now is None else now
+        cookies = []
+        for cookie in self.cookies:
+            expires = cookie.get('expires', -1)
+            if expires < 0:
+                # a session cookie, CDP wants expires left out
+                cookies.append({k: v for k, v in cookie.items() if k != 'expires'})
+            elif expires > now:
+                cookies.append(cookie)
+        return cookies
+
+
+class StorageStateStore:
+    """
+    Save a provider's logged in session, encrypted, and restore it into new drivers
+
+    Cookies are read and written over the DevTools protocol, so every domain the provider logs in to is kept, and
+    restored without first navigating to each domain. Files are encrypted with Fernet, using a key from
+    FUNANCE_SESSION_KEY or a key file that is created on first use, readable only by the user.
+    """
+
+    def __init__(self, provider_name, sessions_dir=SESSIONS_DIR, key_file=SESSION_KEY_FILE, cipher=None):
+        """
+        :param provider_name: str
+        :param sessions_dir: str
+        :param key_file: str
+        :param cipher: object with encrypt() and decrypt() of bytes, defaults to Fernet with the session key
+        """
+        self.provider_name = provider_name
+        self.path = os.path.join(sessions_dir, f'{provider_name}.session')
+        self.key_file = key_file
+        self._cipher = cipher
+        self._enabled = None
+
+    @property
+    def cipher(self):
+        if self._cipher is None:
+            self._cipher = get_fernet(self.key_file)
+        return self._cipher
+
+    @property
+    def enabled(self) -> bool:
+        if self._enabled is None:
+            try:
+                self._enabled = self.cipher is not None
+            except ImportError:
+                logger.warning('Install cryptography to save logged in sessions')
+                self._enabled = False
+            except ValueError as e:
+                logger.warning(f'Not saving logged in sessions, the session key is invalid: {e}')
+                self._enabled = False
+        return self._enabled
+
+    def load(self):
+        """
+        :return: StorageState, or None if there is no saved session or it can not be decrypted
+        """
+        if not self.enabled or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as fp:
+                return StorageState.from_spec(json.loads(self.cipher.decrypt(fp.read())))
+        except Exception as e:
+            # a changed key or a corrupt file, the user logs in again
+            logger.warning(f'Ignoring saved session for {self.provider_name}: {e!r}')
+            return None
+
+    def save(self, driver):
+        """
+        Save the driver's cookies and the current origin's localStorage
+
+        :param driver: WebDriver
+        :return:
+        """
+        if not self.enabled or not supports_cdp(driver):
+            return
+        cookies = driver.execute_cdp_cmd('Network.getAllCookies', {})['cookies']
+        origin = driver.execute_script('return window.location.origin')
+        local_storage = driver.execute_script('return Object.assign({}, window.localStorage)') or {}
+
+        state = self.load() or StorageState()
+        state.cookies = [{k: c[k] for k in COOKIE_PARAMS if k in c} for c in cookies]
+        if origin and origin != 'null':
+            state.local_storage[origin] = local_storage
+        state.saved_at = time.time()
+
+        # only the user can read the session
+        with atomic_write(self.path, permissions=0o600) as fp:
+            fp.write(self.cipher.encrypt(json.dumps(attr.asdict(state)).encode()))
+        logger.info(f'Saved session for {self.provider_name}')
+
+    def restore(self, driver) -> bool:
+        """
+        Restore the saved session into a driver, before it navigates to the provider
+
+        :param driver: WebDriver
+        :return: bool whether there was a session to restore
+        """
+        if not supports_cdp(driver):
+            return False
+        state = self.load()
+        if state is None:
+            return False
+        cookies = state.get_valid_cookies()
+        if not cookies:
+            return False
+        driver.execute_cdp_cmd('Network.setCookies', {'cookies': cookies})
+        for origin, items in state.local_storage.items():
+            driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+                'source': LOCAL_STORAGE_SCRIPT % (json.dumps(origin), json.dumps(items))
+            })
+        logger.info(f'Restored session for {self.provider_name}')
+        return True
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def supports_cdp(driver) -> bool:
+    # drivers attached to a `funance chromedriver service` session are Remote drivers, without the DevTools protocol
+    return hasattr(driver, 'execute_cdp_cmd')
+
+
+def get_fernet(key_file=SESSION_KEY_FILE):
+    """
+    :param key_file: str created with a new key if it does not exist
+    :return: Fernet
+    :raises ImportError: if cryptography is not installed
+    :raises ValueError: if the key is not a valid Fernet key
+    """
+    from cryptography.fernet import Fernet
+
+    key = os.environ.get(SESSION_KEY_ENV)
+    if key:
+        return Fernet(key.encode())
+    return Fernet(get_session_key(key_file))
+
+
+def get_session_key(key_file=SESSION_KEY_FILE) -> bytes:
+    """
+    Read the session key, creating it on first use
+
+    The key is written to a temporary file, then linked into place, so concurrent scrapers never read a partly written
+    key, and the first one to link its key wins.
+
+    :param key_file: str
+    :return: bytes url-safe base64 encoded 32-byte key, like Fernet.generate_key()
+    """
+    try:
+        with open(key_file, 'rb') as fp:
+            return fp.read().strip()
+    except FileNotFoundError:
+        pass
+    Path(key_file).parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = f'{key_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+    # only the user can read the key
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as fp:
+        fp.write(base64.urlsafe_b64encode(os.urandom(32)))
+    try:
+        # unlike os.replace(), fails if another scraper already created the key
+        os.link(tmp_file, key_file)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_file)
+    with open(key_file, 'rb') as fp:
+        return fp.read().strip()
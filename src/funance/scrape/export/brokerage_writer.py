@@ -2,6 +2,7 @@ import json
 
 from marshmallow import Schema, fields, validate, ValidationError
 
+from funance.common.files import atomic_write
 from funance.common.paths import EXPORT_DIR
 
 PREFIX = 'brokerage'
@@ -89,5 +90,7 @@ class BrokerageWriter:
         return JsonSchema().dump(result)
 
     def write(self):
-        with open(f"{EXPORT_DIR}/{PREFIX}.{self.brokerage}.json", 'w') as fp:
+        path = f"{EXPORT_DIR}/{PREFIX}.{self.brokerage}.json"
+        # a failed or concurrent scrape never leaves a partial export
+        with atomic_write(path, 'w') as fp:
             json.dump(self.dump_schema(), fp, indent=4)
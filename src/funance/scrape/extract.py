@@ -0,0 +1,78 @@
+"""
+Extract table data from the page in a single WebDriver call
+
+Every find_element and .text on a WebElement is an HTTP round trip to chromedriver, so reading a table cell by cell
+costs O(cells) round trips. These helpers run one script that walks the rows in the browser and returns their text
+as JSON, which is O(1) round trips per table.
+"""
+
+EXTRACT_SCRIPT = """
+const [root, groups, cells, exists, attributes, linkTexts, textProperty, includeElement] = arguments;
+const scope = root || document;
+const result = {};
+for (const [key, rowSelector] of Object.entries(groups)) {
+    result[key] = Array.from(scope.querySelectorAll(rowSelector)).map(row => {
+        const data = {};
+        for (const [name, selector] of Object.entries(cells)) {
+            const cell = row.querySelector(selector);
+            data[name] = cell === null ? null : cell[textProperty];
+        }
+        for (const [name, selector] of Object.entries(exists)) {
+            data[name] = row.querySelector(selector) !== null;
+        }
+        for (const name of attributes) {
+            data[name] = row.getAttribute(name);
+        }
+        for (const [name, text] of Object.entries(linkTexts)) {
+            data[name] = Array.from(row.querySelectorAll('a')).some(a => a.innerText.trim() === text);
+        }
+        if (includeElement) {
+            data.element = row;
+        }
+        return data;
+    });
+}
+return result;
+"""
+
+# innerText is the rendered text, like WebElement.text. textContent includes hidden elements.
+TEXT_PROPERTIES = ['innerText', 'textContent']
+
+
+def extract_groups(driver, groups: dict, cells: dict, root=None, exists: dict = None, attributes=(),
+                   link_texts: dict = None, text_property='innerText', include_element=False) -> dict:
+    """
+    Extract several groups of rows in one call
+
+    :param driver: WebDriver
+    :param groups: dict of group name to CSS selector for its rows
+    :param cells: dict of field name to CSS selector, relative to the row. The cell's text is extracted, or None if
+                  there is no such cell.
+    :param root: WebElement to select rows within, defaults to the document
+    :param exists: dict of field name to CSS selector, relative to the row. True if the row has a matching element.
+    :param attributes: list of row attributes to extract
+    :param link_texts: dict of field name to link text. True if the row has a link with that text, like
+                       find_element_by_link_text().
+    :param text_property: str innerText for rendered text, or textContent to include hidden elements
+    :param include_element: bool include the row's WebElement as 'element', to interact with it
+    :return: dict of group name to a list of row dicts. Text is stripped of leading and trailing whitespace.
+    """
+    if text_property not in TEXT_PROPERTIES:
+        raise ValueError(f'text_property must be one of {", ".join(TEXT_PROPERTIES)}. Received: {text_property}')
+    result = driver.execute_script(EXTRACT_SCRIPT, root, groups, cells, exists or {}, list(attributes),
+                                   link_texts or {}, text_property, include_element)
+    for rows in result.values():
+        for row in rows:
+            for name in cells:
+                if row[name] is not None:
+                    row[name] = row[name].strip()
+    return result
+
+
+def extract_rows(driver, row_selector: str, cells: dict, root=None, **kwargs) -> list:
+    """
+    Extract the rows matching row_selector in one call. See extract_groups()
+
+    :return: list of row dicts
+    """
+    return extract_groups(driver, {'rows': row_selector}, cells, root=root, **kwargs)['rows']
@@ -1,6 +1,4 @@
-from funance.scrape.driver import create_driver
-from .vanguard import Vanguard
-from .tda import Tda
+import importlib
 
 
 class UnsupportedProviderException(Exception):
@@ -8,21 +6,42 @@ class UnsupportedProviderException(Exception):
 
 
 class ProviderFactory:
+    # import paths, so listing providers does not import selenium
     providers = {
-        'vanguard': Vanguard,
-        'tda': Tda
+        'vanguard': 'funance.scrape.provider.vanguard.Vanguard',
+        'tda':      'funance.scrape.provider.tda.Tda'
     }
 
     def get_supported_providers(self):
         return self.providers.keys()
 
-    def get_provider(self, provider_name, existing_session=False):
-        provider_class = self.providers.get(provider_name)
-        if provider_class is None:
+    def get_provider_class(self, provider_name):
+        provider_path = self.providers.get(provider_name)
+        if provider_path is None:
             supported_providers = ', '.join(self.get_supported_providers())
             raise UnsupportedProviderException(f"provider must be one of {supported_providers}")
-
-        detached = not existing_session
-        driver = create_driver(session=existing_session, detached=detached)
-
-        return provider_class(driver)
+        module_name, class_name = provider_path.rsplit('.', 1)
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def get_provider(self, provider_name, existing_session=False, driver=None, mode=None, **options):
+        """
+        :param provider_name: str
+        :param existing_session: bool attach to the `funance chromedriver service` session
+        :param driver: WebDriver use this driver, instead of creating one
+        :param mode: BrowserMode the driver was, or is, created with. See funance.scrape.browser
+        :param options: passed to the provider, e.g. use_api
+        :return:
+        """
+        provider_class = self.get_provider_class(provider_name)
+
+        if driver is None:
+            from funance.scrape.driver import create_driver
+
+            detached = not existing_session
+            driver = create_driver(session=existing_session, detached=detached, mode=mode)
+
+        from funance.scrape.trace import instrument_driver
+
+        # nobody can log in to a headless browser. An attached session is whatever browser the service started.
+        interactive = existing_session or mode is None or not mode.headless
+        return provider_class(instrument_driver(driver), interactive=interactive, **options)
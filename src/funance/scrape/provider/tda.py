@@ -1,28 +1,153 @@
 import json
 from datetime import datetime
 
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, \
-    NoSuchWindowException
+from selenium.common.exceptions import NoSuchWindowException
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 from funance.common.logger import get_logger
+from funance.scrape.api import (ApiClient, FALLBACK_EXCEPTIONS, NUMBER, get_date, get_field,
+                                 session_from_driver)
+from funance.scrape.driver.storage import StorageStateStore
 from funance.scrape.export import BrokerageWriter
+from funance.scrape.extract import extract_groups, extract_rows
+from funance.scrape.trace import traced
+from funance.scrape.wait import SmartWait, any_of
 
 logger = get_logger('tda')
 
+# TdaApi sends amounts as text, e.g. $2,000.00
+TEXT_OR_NUMBER = (str,) + NUMBER
+
+TICKER_CELLS = {
+    'ticker':       'td.Symbol',
+    'company_name': 'td.Security',
+}
+LOT_CELLS = {
+    'date_acquired':  'td.OpenDate',
+    'num_shares':     'td.Quantity',
+    'cost_per_share': 'td.AmountPerShare',
+    'total_cost':     'td.Amount',
+    'term':           'td.Term',
+}
+
+
+def get_lot(row: dict) -> dict:
+    """
+    Get a cost basis lot from a row of the cost basis table
+
+    :param row: dict of LOT_CELLS text
+    :return: dict
+    """
+    return dict(
+        date_acquired=datetime.strptime(row['date_acquired'], "%m/%d/%y").date().strftime('%Y-%m-%d'),
+        num_shares=row['num_shares'],
+        cost_per_share=row['cost_per_share'],
+        total_cost=row['total_cost'],
+        term=row['term'].lower()
+    )
+
+
+class TdaApi(ApiClient):
+    """
+    The JSON the balances and cost basis pages load, for every account without switching accounts in the browser
+
+    UNVERIFIED: the endpoint paths and field names are placeholders, not taken from recorded traffic, and so are the
+    fixtures in test/fixtures/api/tda. Check them against the network log of a logged in browser before exposing
+    use_api in the CLI. Until then a mismatch raises ApiError, and the pages are scraped instead.
+    """
+
+    base_url = 'https://invest.ameritrade.com'
+    BALANCES_PATH = '/grid/m/balances/json'
+    COST_BASIS_PATH = '/grid/m/costbasis/unrealized/json'
+
+    def __init__(self, session, accounts: list, **kwargs):
+        """
+        :param session: requests.Session from session_from_driver()
+        :param accounts: list of account dicts from the account switcher, see Tda._get_account_switcher_data()
+        :param kwargs: see ApiClient
+        """
+        super().__init__(session, **kwargs)
+        self.accounts = accounts
+
+    def get_accounts(self) -> list:
+        return self.accounts
+
+    def get_account(self, account: dict) -> dict:
+        params = {'accountId': account['account_id']}
+        balances = self.get_json(self.BALANCES_PATH, params)
+        cost_basis = self.get_json(self.COST_BASIS_PATH, params)
+        return dict(
+            account_name=account['account_name'],
+            cash=str(get_field(balances, 'cashBalance', TEXT_OR_NUMBER)).replace('$', '').replace(',', ''),
+            tickers=[dict(
+                ticker=get_field(position, 'symbol', str),
+                company_name=get_field(position, 'description', str),
+                total_shares=str(get_field(position, 'quantity', TEXT_OR_NUMBER)),
+                lots=[get_api_lot(lot) for lot in get_field(position, 'lots', list)],
+            ) for position in get_field(cost_basis, 'positions', list)]
+        )
+
+
+def get_api_lot(lot: dict) -> dict:
+    """
+    Get a cost basis lot from TdaApi
+
+    :param lot: dict
+    :return: dict
+    :raises ApiError:
+    """
+    return dict(
+        date_acquired=get_date(lot, 'openDate', '%m/%d/%y'),
+        num_shares=str(get_field(lot, 'quantity', TEXT_OR_NUMBER)),
+        cost_per_share=str(get_field(lot, 'costPerShare', TEXT_OR_NUMBER)),
+        total_cost=str(get_field(lot, 'amount', TEXT_OR_NUMBER)),
+        term=get_field(lot, 'term', str).lower()
+    )
+
 
 class Tda:
-    def __init__(self, driver):
+    def __init__(self, driver, session_store=None, use_api=False, interactive=True):
+        """
+        :param driver: WebDriver
+        :param session_store: StorageStateStore
+        :param use_api: bool fetch data over HTTP after logging in, scraping the pages if that fails
+        :param interactive: bool False when the browser is headless, so the user can not log in
+        """
         self.driver = driver
-        self.wait = WebDriverWait(self.driver, 10)
+        self.wait = SmartWait(self.driver)
         self.writer = BrokerageWriter('tda')
+        self.session_store = session_store or StorageStateStore('tda')
+        self.use_api = use_api
+        self.interactive = interactive
 
     def scrape(self):
         self._wait_for_login()
+        if not (self.use_api and self._scrape_api()):
+            self._scrape_pages()
+        self._write_export()
+        # keep cookies the site refreshed while scraping
+        self.session_store.save(self.driver)
+        self.wait.log_timings()
+
+    def _get_api(self):
+        return TdaApi(session_from_driver(self.driver), accounts=self._get_account_switcher_data())
 
+    @traced
+    def _scrape_api(self) -> bool:
+        """
+        :return: bool False if the pages need to be scraped instead
+        """
+        try:
+            self._get_api().scrape(self.writer)
+            return True
+        except FALLBACK_EXCEPTIONS as e:
+            logger.warning(f'Scraping pages, failed to fetch data: {e!r}')
+            self.writer = BrokerageWriter('tda')
+            return False
+
+    def _scrape_pages(self):
         self._get_cash()
         self._get_cost_basis()
         for account in self._get_account_switcher_data():
@@ -32,21 +157,24 @@ class Tda:
                 self._switch_account(account['account_name'])
                 self._get_cash()
                 self._get_cost_basis()
-        self._write_export()
 
+    @traced
     def _wait_for_login(self):
+        restored = self.session_store.restore(self.driver)
         self.driver.get('https://invest.ameritrade.com/')
         # Wait for the account switcher to appear. This is the hint that the user has logged in
-        try:
+        logged_in = EC.presence_of_element_located((By.ID, 'accountSwitcherContainer'))
+        if restored and self.wait.probe(logged_in, step='restore_session'):
             is_authenticated = True
-            account_switcher = WebDriverWait(self.driver, 300).until(
-                EC.presence_of_element_located((By.ID, 'accountSwitcherContainer'))
-            )
-        except TimeoutException:
-            is_authenticated = False
+        else:
+            # the site redirected to the log in page
+            is_authenticated = self.wait.wait_for_login(logged_in, interactive=self.interactive)
+        if is_authenticated:
+            self.session_store.save(self.driver)
 
         logger.info(f"Logged On: {is_authenticated}")
 
+    @traced
     def _switch_account(self, account_name):
         account_switcher_select = self.driver.find_element_by_id('accountSwitcherSelectBox')
         actions = ActionChains(self.driver)
@@ -55,7 +183,9 @@ class Tda:
         actions.perform()
 
         # there is no unique identifier to get only trs with accounts, so we grab them all and slice the list
-        account_switcher_trs = self.driver.find_elements_by_css_selector('#accountSwitcherSelect_menu tr')
+        account_switcher_trs = extract_rows(self.driver, '#accountSwitcherSelect_menu tr', {
+            'account_nickname': 'td.dijitMenuItemLabel span.accountNickname'
+        }, include_element=True)
         """
         Slice away unneeded trs
         
@@ -68,15 +198,24 @@ class Tda:
         - Edit Nickname     Throw away
         """
         account_switcher_trs = account_switcher_trs[1:len(account_switcher_trs) - 3]
-        for tr in account_switcher_trs:
-            account_nickname_cell = tr.find_element_by_css_selector('td.dijitMenuItemLabel span.accountNickname')
-            account_nickname = account_nickname_cell.text
-            if account_name == account_nickname:
+        for row in account_switcher_trs:
+            if account_name == row['account_nickname']:
+                tr = row['element']
                 actions = ActionChains(self.driver)
                 actions.move_to_element(tr)
                 actions.click(tr)
                 actions.perform()
                 break
+        # the page reloads for the new account. Wait for the old page to go, rather than for the next link to become
+        # clickable on it, then for the new page's account switcher.
+        self.wait.until_stale(account_switcher_select, step='switch_account_unload')
+        self.wait.until(self._account_is_active(account_name), step='switch_account')
+
+    def _account_is_active(self, account_name):
+        def account_is_active(driver):
+            return any(a['is_active'] and a['account_name'] == account_name
+                       for a in self._get_account_switcher_data())
+        return account_is_active
 
     def _get_account_switcher_data(self):
         account_switcher_select = self.driver.find_element_by_id('accountSwitcherSelectBox')
@@ -139,6 +278,7 @@ class Tda:
         logger.info(f"Current Account: {current_account['account_name']}")
         return current_account
 
+    @traced
     def _get_cash(self):
         self._visit_balances()
         self._get_cash_for_current_account()
@@ -146,7 +286,7 @@ class Tda:
     def _visit_balances(self):
         # Move to "My Account" element and click it
         my_account_link = self.wait.until(
-            EC.element_to_be_clickable((By.LINK_TEXT, 'My Account'))
+            EC.element_to_be_clickable((By.LINK_TEXT, 'My Account')), step='my_account_link'
         )
         actions = ActionChains(self.driver)
         actions.move_to_element(my_account_link)
@@ -155,7 +295,7 @@ class Tda:
 
         # Move to "Balances" link and click it
         balances_link = self.wait.until(
-            EC.element_to_be_clickable((By.LINK_TEXT, 'Balances'))
+            EC.element_to_be_clickable((By.LINK_TEXT, 'Balances')), step='balances_link'
         )
         actions = ActionChains(self.driver)
         actions.move_to_element(balances_link)
@@ -166,7 +306,8 @@ class Tda:
         # Move to "Summary" element and click it
         summary_button = self.wait.until(
             EC.presence_of_element_located(
-                (By.CSS_SELECTOR, 'div.balancesSubPageTabs span[data-clicked="SUMMARY"]'))
+                (By.CSS_SELECTOR, 'div.balancesSubPageTabs span[data-clicked="SUMMARY"]')),
+            step='summary_button'
         )
         actions = ActionChains(self.driver)
         actions.move_to_element(summary_button)
@@ -175,11 +316,12 @@ class Tda:
 
         summary_table = self.wait.until(
             EC.presence_of_element_located(
-                (By.CSS_SELECTOR, '.summaryTabTable'))
+                (By.CSS_SELECTOR, '.summaryTabTable')),
+            step='summary_table'
         )
-        summary_rows = summary_table.find_elements_by_css_selector('tbody tr')
+        summary_rows = extract_rows(self.driver, 'tbody tr', {'value': 'td:nth-of-type(2)'}, root=summary_table)
         cash_row = summary_rows[1]
-        cash = cash_row.find_elements_by_css_selector('td')[1].text \
+        cash = cash_row['value'] \
             .replace('$', '') \
             .replace(',', '')
 
@@ -203,7 +345,7 @@ class Tda:
     def _visit_stock_lots(self):
         # Move to "My Account" element and click it
         my_account_link = self.wait.until(
-            EC.element_to_be_clickable((By.LINK_TEXT, 'My Account'))
+            EC.element_to_be_clickable((By.LINK_TEXT, 'My Account')), step='my_account_link'
         )
         actions = ActionChains(self.driver)
         actions.move_to_element(my_account_link)
@@ -212,13 +354,14 @@ class Tda:
 
         # Move to "Cost Basis" link and click it
         cost_basis_link = self.wait.until(
-            EC.element_to_be_clickable((By.LINK_TEXT, 'Cost Basis'))
+            EC.element_to_be_clickable((By.LINK_TEXT, 'Cost Basis')), step='cost_basis_link'
         )
         actions = ActionChains(self.driver)
         actions.move_to_element(cost_basis_link)
         actions.click(cost_basis_link)
         actions.perform()
 
+    @traced
     def _get_cost_basis(self):
         self._visit_stock_lots()
         self._get_cost_basis_for_current_account()
@@ -226,27 +369,27 @@ class Tda:
     def _switch_to_main_frame(self):
         # Switch to the "main" frame where cost basis tables are located
         main_frame = self.wait.until(
-            EC.frame_to_be_available_and_switch_to_it((By.ID, 'main'))
+            EC.frame_to_be_available_and_switch_to_it((By.ID, 'main')), step='main_frame'
         )
         return main_frame
 
     def _click_and_wait_for_cost_basis(self):
         # Move to "Cost Basis" link and click it. This assumes the driver has been switched to the "main" frame.
-        try:
-            # unrealized_link = self.driver.find_element_by_link_text('Unrealized Gain/Loss')
-            unrealized_link = self.wait.until(
-                EC.presence_of_element_located((By.LINK_TEXT, 'Unrealized Gain/Loss'))
-            )
+        cost_basis_table_locator = (By.XPATH, '//div[@id="sectionL01"]/table')
+        # The clicked tab is no longer a link since it is the active tab, so wait for either the link or the table,
+        # rather than timing out on a link that will never appear.
+        element = self.wait.until(any_of(
+            EC.presence_of_element_located((By.LINK_TEXT, 'Unrealized Gain/Loss')),
+            EC.presence_of_element_located(cost_basis_table_locator),
+        ), step='unrealized_link')
+        if element.tag_name == 'a':
             actions = ActionChains(self.driver)
-            actions.move_to_element(unrealized_link)
-            actions.click(unrealized_link)
+            actions.move_to_element(element)
+            actions.click(element)
             actions.perform()
-        except NoSuchElementException:
-            # the clicked tab is no longer a link or clickable since it is the active tab.
-            pass
 
         cost_basis_table = self.wait.until(
-            EC.presence_of_element_located((By.XPATH, '//div[@id="sectionL01"]/table'))
+            EC.presence_of_element_located(cost_basis_table_locator), step='cost_basis_table'
         )
         return cost_basis_table
 
@@ -267,69 +410,33 @@ class Tda:
                 logger.warn('NoSuchWindowException while getting cost basis')
                 continue
 
-        cost_basis_rows = cost_basis_table.find_elements_by_css_selector('tr.headerrows')
-        for row in cost_basis_rows:
-            # get summary data from the main row
-            ticker = row.find_element_by_css_selector('td.Symbol').text
-            company_name = row.find_element_by_css_selector('td.Security').text
-
-            date_acquired = row.find_element_by_css_selector('td.OpenDate').text
-            # print(date_acquired)
-            # date_acquired = datetime.strptime(date_acquired, "%m/%d/%y").date().strftime('%Y-%m-%d')
-
-            num_shares = row.find_element_by_css_selector('td.Quantity').text
-            cost_per_share = row.find_element_by_css_selector('td.AmountPerShare').text
-            total_cost = row.find_element_by_css_selector('td.Amount').text
-            term = row.find_element_by_css_selector('td.Term').text.lower()
-
-            logger.info(f"Getting cost basis for ticker: {ticker}")
+        # Read the whole table in two calls, one for the ticker rows and one for every ticker's lots, rather than a
+        # round trip to the driver per cell.
+        header_rows = extract_rows(
+            self.driver, 'tr.headerrows', dict(TICKER_CELLS, **LOT_CELLS), root=cost_basis_table,
+            # if the .showCell column has a link "opener" in it, then there are multiple lots
+            exists={'has_lots': 'td.showCell a'}, attributes=['id']
+        )
+        # lots rows are hidden so innerText is empty. Use textContent to get text content of hidden elements.
+        lots_groups = extract_groups(self.driver, {
+            row['id']: f"#{row['id'].replace('SUM_', 'L_')} tr" for row in header_rows if row['has_lots']
+        }, LOT_CELLS, text_property='textContent')
 
+        for row in header_rows:
+            logger.info(f"Getting cost basis for ticker: {row['ticker']}")
             ticker_data = dict(
-                company_name=company_name,
-                ticker=ticker,
-                total_shares=num_shares,
+                company_name=row['company_name'],
+                ticker=row['ticker'],
+                total_shares=row['num_shares'],
             )
             self.writer.set_ticker(current_account, ticker_data)
 
-            # if the .showCell column has a link "opener" in it, then there are multiple lots
-            try:
-                is_single_lot = False
-                show_cell_link = row.find_element_by_css_selector('td.showCell a')
-            except NoSuchElementException:
-                is_single_lot = True
-
-            if is_single_lot:
-                single_lot_dict = dict(
-                    date_acquired=datetime.strptime(date_acquired, "%m/%d/%y").date().strftime('%Y-%m-%d'),
-                    num_shares=num_shares,
-                    cost_per_share=cost_per_share,
-                    total_cost=total_cost,
-                    term=term
-                )
-                self.writer.add_cost_basis(current_account, ticker_data['ticker'], single_lot_dict)
-            else:
-                header_row_id = row.get_attribute('id')
-                lots_row_id = header_row_id.replace('SUM_', 'L_')
-                lots_rows = self.driver.find_elements_by_css_selector(f"#{lots_row_id} tr")
-                for lots_row in lots_rows:
-                    # lots rows are hidden so the .text attribute is empty. Use .get_attribute('textContent')
-                    # to get text content of hidden elements.
-                    date_acquired = lots_row.find_element_by_css_selector('td.OpenDate').get_attribute('textContent')
-                    num_shares = lots_row.find_element_by_css_selector('td.Quantity').get_attribute('textContent')
-                    cost_per_share = lots_row.find_element_by_css_selector('td.AmountPerShare').get_attribute(
-                        'textContent')
-                    total_cost = lots_row.find_element_by_css_selector('td.Amount').get_attribute('textContent')
-                    term = lots_row.find_element_by_css_selector('td.Term').get_attribute('textContent').lower()
-                    lots_dict = dict(
-                        date_acquired=datetime.strptime(date_acquired, "%m/%d/%y").date().strftime('%Y-%m-%d'),
-                        num_shares=num_shares,
-                        cost_per_share=cost_per_share,
-                        total_cost=total_cost,
-                        term=term
-                    )
-                    self.writer.add_cost_basis(current_account, ticker_data['ticker'], lots_dict)
+            lots_rows = lots_groups[row['id']] if row['has_lots'] else [row]
+            for lots_row in lots_rows:
+                self.writer.add_cost_basis(current_account, ticker_data['ticker'], get_lot(lots_row))
         # switch driver back to default content
         self.driver.switch_to.default_content()
 
+    @traced
     def _write_export(self):
         self.writer.write()
@@ -1,19 +1,108 @@
 from datetime import datetime
 
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 from funance.common.logger import get_logger
+from funance.scrape.api import (ApiClient, ApiError, FALLBACK_EXCEPTIONS, NUMBER, get_date, get_field,
+                                 session_from_driver)
+from funance.scrape.driver.storage import StorageStateStore
 from funance.scrape.export import BrokerageWriter
+from funance.scrape.extract import extract_rows
+from funance.scrape.trace import traced
+from funance.scrape.wait import SmartWait
 
 logger = get_logger('vanguard')
 
 
 date_foramt = '%m/%d/%Y'
 
+LOG_ON_URL = 'https://investor.vanguard.com/my-account/log-on'
+BALANCES_URL = 'https://personal.vanguard.com/us/myaccounts/balancesholdings'
+
+TICKER_CELLS = {
+    'ticker':       'td:nth-child(1)',
+    'company_name': 'td:nth-child(2)',
+    'total_shares': 'td:nth-child(3)',
+}
+LOT_CELLS = {
+    'date_acquired':  'td:nth-child(1)',
+    'num_shares':     'td:nth-child(2)',
+    'cost_per_share': 'td:nth-child(3)',
+    'total_cost':     'td:nth-child(4)',
+    'short_term':     'td:nth-child(6)',
+    'long_term':      'td:nth-child(7)',
+}
+
+
+def get_lot(row: dict):
+    """
+    Get a cost basis lot from a row of a ticker's lots table
+
+    :param row: dict of LOT_CELLS text
+    :return: dict, or None if the row has no cost basis data
+    """
+    date_acquired = row['date_acquired']
+    logger.debug(f"date_acquired:{date_acquired}")
+
+    # The table has a header (most cases).
+    if date_acquired is None or date_acquired == 'Date acquired (noncovered shares)':
+        # Discard this row since it doesn't contain cost-basis data.
+        return None
+
+    """
+    The table does not have a header.
+
+    This appears to be the case for Mutual Funds only, but may have something to do 
+    with "Noncovered shares" rather than Mutual Funds vs. other securities, since that is what is 
+    actually checked for the edge case.
+
+    The page popup says:
+
+        Noncovered shares include shares acquired before the effective date for cost basis 
+        reporting requirements or shares acquired in an account that isn't subject to Form 1099-B 
+        reporting, such as an IRA or C-corporation account. In these cases, Vanguard doesn't 
+        report cost basis information to the IRS.
+
+    TLDR; Noncovered shares don't have a date_acquired value. This makes sense from a cost-basis 
+    perspective but the schema must still be satisfied with a date.
+    """
+    if date_acquired == 'Noncovered shares':
+        """
+        Use today's date to satisfy the schema, although this is not technically accurate as
+        stated above.
+
+        Use Vanguard native date format, since conversion to the schema format happens below.
+        """
+        date_acquired = datetime.today().strftime(date_foramt)
+
+    # determine short/long term basis
+    short_term = row['short_term']
+    logger.debug(f"short_term:{short_term}")
+    long_term = row['long_term']
+    logger.debug(f"long_term:{long_term}")
+
+    if '$' in short_term and '$' in long_term:
+        # this seems to be the case when shares have passed the date for cost-basis reporting;
+        # AKA non-covered shares. See comments above.
+        term = 'long'
+    elif '—' == short_term and '$' in long_term:
+        term = 'long'
+    elif '$' in short_term and '—' == long_term:
+        term = 'short'
+    else:
+        raise ValueError('"term" not found')
+
+    return dict(
+        date_acquired=datetime.strptime(date_acquired, date_foramt).date().strftime('%Y-%m-%d'),
+        num_shares=row['num_shares'],
+        cost_per_share=row['cost_per_share'].replace('$', '').replace(',', '').strip(),
+        total_cost=row['total_cost'].replace('$', '').replace(',', '').strip(),
+        term=term
+    )
+
 
 def clean_account_name(account_name: str):
     """
@@ -42,38 +131,130 @@ def clean_account_name(account_name: str):
     return clean_string.strip()
 
 
+class VanguardApi(ApiClient):
+    """
+    The JSON the balances and cost basis pages load
+
+    UNVERIFIED: the endpoint paths and field names are placeholders, not taken from recorded traffic, and so are the
+    fixtures in test/fixtures/api/vanguard. Check them against the network log of a logged in browser before exposing
+    use_api in the CLI. Until then a mismatch raises ApiError, and the pages are scraped instead.
+    """
+
+    base_url = 'https://personal.vanguard.com'
+    ACCOUNTS_PATH = '/us/api/accounts/balances'
+    COST_BASIS_PATH = '/us/api/costbasis/unrealized'
+
+    def get_accounts(self) -> list:
+        return get_field(self.get_json(self.ACCOUNTS_PATH), 'accounts', list)
+
+    def get_account(self, account: dict) -> dict:
+        cost_basis = self.get_json(self.COST_BASIS_PATH, {'accountId': get_field(account, 'accountId', (str, int))})
+        return dict(
+            account_name=clean_account_name(get_field(account, 'accountName', str)),
+            cash=f"{get_field(account, 'cashBalance', NUMBER):.2f}",
+            tickers=[dict(
+                ticker=get_field(holding, 'ticker', str),
+                company_name=get_field(holding, 'securityName', str),
+                total_shares=f"{get_field(holding, 'quantity', NUMBER):.4f}",
+                lots=[get_api_lot(lot) for lot in get_field(holding, 'lots', list)],
+            ) for holding in get_field(cost_basis, 'holdings', list)]
+        )
+
+
+def get_api_lot(lot: dict) -> dict:
+    """
+    Get a cost basis lot from VanguardApi
+
+    :param lot: dict
+    :return: dict
+    :raises ApiError:
+    """
+    terms = {'SHORT_TERM': 'short', 'LONG_TERM': 'long'}
+    holding_period = get_field(lot, 'holdingPeriod', str)
+    if holding_period not in terms:
+        raise ApiError(f'Unknown holding period: {holding_period}')
+    # noncovered shares have no date acquired, see get_lot()
+    if get_field(lot, 'acquiredDate', (str, type(None))) is None:
+        date_acquired = datetime.today().strftime('%Y-%m-%d')
+    else:
+        date_acquired = get_date(lot, 'acquiredDate', '%Y-%m-%d')
+    return dict(
+        date_acquired=date_acquired,
+        num_shares=f"{get_field(lot, 'quantity', NUMBER):.4f}",
+        cost_per_share=f"{get_field(lot, 'costPerShare', NUMBER):.2f}",
+        total_cost=f"{get_field(lot, 'totalCost', NUMBER):.2f}",
+        term=terms[holding_period]
+    )
+
+
 class Vanguard:
-    def __init__(self, driver):
+    def __init__(self, driver, session_store=None, use_api=False, interactive=True):
+        """
+        :param driver: WebDriver
+        :param session_store: StorageStateStore
+        :param use_api: bool fetch data over HTTP after logging in, scraping the pages if that fails
+        :param interactive: bool False when the browser is headless, so the user can not log in
+        """
         self.driver = driver
-        self.wait = WebDriverWait(self.driver, 10)
+        self.wait = SmartWait(self.driver)
         self.writer = BrokerageWriter('vanguard')
+        self.session_store = session_store or StorageStateStore('vanguard')
+        self.use_api = use_api
+        self.interactive = interactive
 
     def scrape(self):
         self._wait_for_login()
-        self._get_cash()
-        self._get_cost_basis()
+        if not (self.use_api and self._scrape_api()):
+            self._get_cash()
+            self._get_cost_basis()
         self._write_export()
+        # keep cookies the site refreshed while scraping
+        self.session_store.save(self.driver)
+        self.wait.log_timings()
+
+    def _get_api(self):
+        return VanguardApi(session_from_driver(self.driver))
 
+    @traced
+    def _scrape_api(self) -> bool:
+        """
+        :return: bool False if the pages need to be scraped instead
+        """
+        try:
+            self._get_api().scrape(self.writer)
+            return True
+        except FALLBACK_EXCEPTIONS as e:
+            logger.warning(f'Scraping pages, failed to fetch data: {e!r}')
+            self.writer = BrokerageWriter('vanguard')
+            return False
+
+    @traced
     def _wait_for_login(self):
-        self.driver.get('https://investor.vanguard.com/my-account/log-on')
         # Wait for the "Log out" link to appear. This is the hint that the user has logged in.
-        try:
-            is_authenticated = True
-            log_off_link = WebDriverWait(self.driver, 300).until(
-                # NOTE: By.LINK_TEXT appears to take into account case-sensitivity as well as CSS text transformations.
-                EC.presence_of_element_located((By.LINK_TEXT, 'Log out'))
-            )
-        except TimeoutException:
-            is_authenticated = False
+        # NOTE: By.LINK_TEXT appears to take into account case-sensitivity as well as CSS text transformations.
+        logged_in = EC.presence_of_element_located((By.LINK_TEXT, 'Log out'))
+        is_authenticated = False
+        if self.session_store.restore(self.driver):
+            # the balances page is the first page scraped, and redirects to log on when the session expired
+            self.driver.get(BALANCES_URL)
+            is_authenticated = self.wait.probe(logged_in, step='restore_session')
+        if not is_authenticated:
+            self.driver.get(LOG_ON_URL)
+            is_authenticated = self.wait.wait_for_login(logged_in, interactive=self.interactive)
+        if is_authenticated:
+            self.session_store.save(self.driver)
 
         logger.info(f"Logged On: {is_authenticated}")
 
+    @traced
     def _get_cash(self):
-        self.driver.get('https://personal.vanguard.com/us/myaccounts/balancesholdings')
+        # a restored session already landed on the balances page
+        if not self.driver.current_url.startswith(BALANCES_URL):
+            self.driver.get(BALANCES_URL)
 
         # wait
         el = self.wait.until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'div.t-unit'))
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'div.t-unit')), step='account_tables'
         )
 
         # account tables
@@ -122,10 +303,11 @@ class Vanguard:
         """
         xpath = '//div[@id="unrealizedTabForm"]'
         cost_basis_tables = self.wait.until(
-            EC.presence_of_element_located((By.XPATH, xpath))
+            EC.presence_of_element_located((By.XPATH, xpath)), step='cost_basis_tables'
         )
         return cost_basis_tables
 
+    @traced
     def _get_cost_basis(self):
         self.driver.get('https://personal.vanguard.com/us/XHTML/com/vanguard/costbasisnew/xhtml/CostBasisSummary.xhtml')
         self._wait_for_cost_basis_tables()
@@ -137,19 +319,16 @@ class Vanguard:
             account_name = clean_account_name(account_name)
             logger.info(f"Getting cost basis for account: {account_name}")
 
-            # get all rows that have a .linkBarWrapper
-            rows = account_table.find_elements_by_tag_name('tr')
+            # read every row's cells in one call, rather than a round trip to the driver per cell
+            rows = extract_rows(self.driver, 'tr', TICKER_CELLS, root=account_table,
+                                # only rows with a Buy link have ticker data
+                                link_texts={'is_ticker_row': 'Buy'}, include_element=True)
             for row in rows:
-                try:
-                    # Check if this row has a Buy link. This row has our ticker data.
-                    row.find_element_by_link_text('Buy')
-                except NoSuchElementException:
+                if not row['is_ticker_row']:
                     # skip this row
                     continue
 
-                # ticker
-                ticker_cell = row.find_element_by_css_selector('td:nth-child(1)')
-                ticker = ticker_cell.text
+                ticker = row['ticker']
                 logger.info(f"Getting cost basis for ticker: {ticker}")
 
                 """
@@ -163,17 +342,12 @@ class Vanguard:
 
                 So we split on a \n newline to get the company name.
                 """
-                company_cell = row.find_element_by_css_selector('td:nth-child(2)')
-                company_name = company_cell.text.partition('\n')[0]
-
-                # populate total shares
-                total_shares_cell = row.find_element_by_css_selector('td:nth-child(3)')
-                total_shares = total_shares_cell.text
+                company_name = row['company_name'].partition('\n')[0]
 
                 stock_ticker = dict(
                     ticker=ticker,
                     company_name=company_name,
-                    total_shares=total_shares
+                    total_shares=row['total_shares']
                 )
 
                 self.writer.set_ticker(account_name, stock_ticker)
@@ -181,7 +355,7 @@ class Vanguard:
                 # Populate stock lots
                 try:
                     # Lots are shown in the tr adjacent to the Ticker (current) tr
-                    lots_row = row.find_element_by_xpath('./following-sibling::tr')
+                    lots_row = row['element'].find_element_by_xpath('./following-sibling::tr')
 
                     lots_container = lots_row.find_element_by_css_selector('.vg-Navbox.vg-NavboxClosed')
                     lots_container_id = lots_container.get_attribute('id')
@@ -200,75 +374,14 @@ class Vanguard:
                     css_path_lots_table = f"[id='{lots_container_id}'] .vg-NavboxBody .dataTable"
                     # TODO handle selenium.common.exceptions.TimeoutException
                     lots_table = self.wait.until(
-                        lambda x: x.find_element_by_css_selector(css_path_lots_table)
+                        EC.presence_of_element_located((By.CSS_SELECTOR, css_path_lots_table)), step='lots_table'
                     )
 
                     # parse lots
-                    lots_table_rows = lots_table.find_elements_by_tag_name('tr')
-                    for lots_table_row in lots_table_rows:
-                        date_acquired = lots_table_row.find_element_by_css_selector('td:nth-child(1)').text
-                        logger.debug(f"date_acquired:{date_acquired}")
-
-                        # The table has a header (most cases).
-                        if date_acquired == 'Date acquired (noncovered shares)':
-                            # Discard this row since it doesn't contain cost-basis data.
+                    for lots_table_row in extract_rows(self.driver, 'tr', LOT_CELLS, root=lots_table):
+                        stock_lot = get_lot(lots_table_row)
+                        if stock_lot is None:
                             continue
-
-                        """
-                        The table does not have a header.
-                        
-                        This appears to be the case for Mutual Funds only, but may have something to do 
-                        with "Noncovered shares" rather than Mutual Funds vs. other securities, since that is what is 
-                        actually checked for the edge case.
-                              
-                        The page popup says:
-                              
-                            Noncovered shares include shares acquired before the effective date for cost basis 
-                            reporting requirements or shares acquired in an account that isn't subject to Form 1099-B 
-                            reporting, such as an IRA or C-corporation account. In these cases, Vanguard doesn't 
-                            report cost basis information to the IRS.
-                              
-                        TLDR; Noncovered shares don't have a date_acquired value. This makes sense from a cost-basis 
-                        perspective but the schema must still be satisfied with a date.
-                        """
-                        if date_acquired == 'Noncovered shares':
-                            """
-                            Use today's date to satisfy the schema, although this is not technically accurate as
-                            stated above.
-                            
-                            Use Vanguard native date format, since conversion to the schema format happens below.
-                            """
-                            date_acquired = datetime.today().strftime(date_foramt)
-
-                        num_shares = lots_table_row.find_element_by_css_selector('td:nth-child(2)').text
-                        cost_per_share = lots_table_row.find_element_by_css_selector('td:nth-child(3)').text
-                        total_cost = lots_table_row.find_element_by_css_selector('td:nth-child(4)').text
-
-                        # determine short/long term basis
-                        short_term = lots_table_row.find_element_by_css_selector('td:nth-child(6)').text
-                        logger.debug(f"short_term:{short_term}")
-                        long_term = lots_table_row.find_element_by_css_selector('td:nth-child(7)').text
-                        logger.debug(f"long_term:{long_term}")
-
-                        if '$' in short_term and '$' in long_term:
-                            # this seems to be the case when shares have passed the date for cost-basis reporting;
-                            # AKA non-covered shares. See comments above.
-                            term = 'long'
-                        elif '—' == short_term and '$' in long_term:
-                            term = 'long'
-                        elif '$' in short_term and '—' == long_term:
-                            term = 'short'
-                        else:
-                            raise ValueError('"term" not found')
-
-                        stock_lot = dict(
-                            date_acquired=datetime.strptime(date_acquired, date_foramt).date().strftime('%Y-%m-%d'),
-                            num_shares=num_shares,
-                            cost_per_share=cost_per_share.replace('$', '').replace(',', '').strip(),
-                            total_cost=total_cost.replace('$', '').replace(',', '').strip(),
-                            term=term
-                        )
-
                         self.writer.add_cost_basis(account_name, stock_ticker['ticker'], stock_lot)
                         logger.info(f"stock lot {stock_lot}")
 
@@ -280,5 +393,6 @@ class Vanguard:
                     logger.warn('NoSuchElementException')
                     raise
 
+    @traced
     def _write_export(self):
         self.writer.write()
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from funance.common.logger import get_logger
+from funance.scrape.driver.pool import DriverPool
+from funance.scrape.provider import ProviderFactory
+from funance.scrape.trace import span
+
+logger = get_logger('runner')
+
+
+def scrape_provider(pool: DriverPool, provider_name: str, **options):
+    driver = pool.acquire(provider_name)
+    try:
+        with span(provider_name):
+            ProviderFactory().get_provider(provider_name, driver=driver, mode=pool.mode, **options).scrape()
+    finally:
+        pool.release(provider_name)
+
+
+def scrape_providers(provider_names, pool: DriverPool = None, max_workers: int = None, **options) -> dict:
+    """
+    Scrape providers concurrently, each in its own browser
+
+    Scraping is mostly waiting on the browser, so providers run in threads. Each provider writes its own export
+    file, so results do not need to be merged. One provider failing does not stop the others.
+
+    :param provider_names: list of str
+    :param pool: DriverPool defaults to a new pool, closed when done
+    :param max_workers: int defaults to one per provider
+    :param options: passed to each provider, e.g. use_api
+    :return: dict of provider name to the exception it raised, or None if it succeeded
+    """
+    own_pool = pool is None
+    pool = DriverPool() if own_pool else pool
+    results = dict()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers or len(provider_names) or 1) as executor:
+            futures = {name: executor.submit(scrape_provider, pool, name, **options) for name in provider_names}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                    results[name] = None
+                    logger.info(f'Scraped {name}')
+                except Exception as e:
+                    results[name] = e
+                    logger.error(f'Failed to scrape {name}: {e!r}')
+    finally:
+        if own_pool:
+            pool.close()
+    return results
@@ -0,0 +1,180 @@
+"""
+Time scrape steps, waits and WebDriver commands, and export them as a Chrome trace
+
+Tracing is off unless a Tracer is set with set_tracer(), e.g. by `funance scrape --profile`. Open the trace file in
+chrome://tracing or https://ui.perfetto.dev.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from funance.common.paths import TRACES_DIR
+
+# categories
+STEP = 'step'
+WAIT = 'wait'
+WEBDRIVER = 'webdriver'
+
+_tracer = None
+
+
+def get_tracer():
+    """
+    :return: Tracer, or None when tracing is off
+    """
+    return _tracer
+
+
+def set_tracer(tracer):
+    """
+    :param tracer: Tracer, or None to turn tracing off
+    """
+    global _tracer
+    _tracer = tracer
+
+
+class Tracer:
+    """
+    Collects complete ("X") events in the Chrome trace event format
+
+    https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+    """
+
+    def __init__(self):
+        self.events = []
+        self._start = time.perf_counter()
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, cat: str, start: float, end: float, **args):
+        """
+        Record an event
+
+        :param name: str
+        :param cat: str category, e.g. STEP
+        :param start: float time.perf_counter() when the event started
+        :param end: float time.perf_counter() when the event ended
+        :param args: shown with the event in the trace viewer
+        """
+        thread = threading.current_thread()
+        event = dict(name=name, cat=cat, ph='X', ts=(start - self._start) * 1e6, dur=(end - start) * 1e6,
+                     pid=os.getpid(), tid=thread.native_id)
+        if args:
+            event['args'] = args
+        with self._lock:
+            if thread.native_id not in self._threads:
+                # label the row, e.g. with the provider's worker thread
+                self._threads.add(thread.native_id)
+                self.events.append(dict(name='thread_name', ph='M', pid=os.getpid(), tid=thread.native_id,
+                                        args={'name': thread.name}))
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, cat: str = STEP, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, cat, start, time.perf_counter(), **args)
+
+    def get_summary(self, limit: int = None) -> list:
+        """
+        Total time by event, slowest first
+
+        :param limit: int
+        :return: list of dicts with name, cat, count, total, mean and max, in seconds
+        """
+        stats = dict()
+        with self._lock:
+            events = [e for e in self.events if e['ph'] == 'X']
+        for event in events:
+            key = (event['cat'], event['name'])
+            count, total, longest = stats.get(key, (0, 0.0, 0.0))
+            seconds = event['dur'] / 1e6
+            stats[key] = (count + 1, total + seconds, max(longest, seconds))
+        summary = [dict(name=name, cat=cat, count=count, total=total, mean=total / count, max=longest)
+                   for (cat, name), (count, total, longest) in stats.items()]
+        summary.sort(key=lambda row: row['total'], reverse=True)
+        return summary[:limit] if limit else summary
+
+    def write(self, path: str = None) -> str:
+        """
+        :param path: str defaults to a timestamped file in TRACES_DIR
+        :return: str path written
+        """
+        path = path or os.path.join(TRACES_DIR, f"scrape.{time.strftime('%Y%m%d-%H%M%S')}.json")
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            trace = dict(traceEvents=list(self.events), displayTimeUnit='ms')
+        with open(path, 'w') as fp:
+            json.dump(trace, fp)
+        return path
+
+
+@contextmanager
+def span(name: str, cat: str = STEP, **args):
+    """
+    Time a block, when tracing is on
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield
+        return
+    with tracer.span(name, cat, **args):
+        yield
+
+
+def traced(method):
+    """
+    Time a provider method, named like tda._get_cash
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if get_tracer() is None:
+            return method(self, *args, **kwargs)
+        with span(f'{type(self).__name__.lower()}.{method.__name__}'):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def instrument_driver(driver):
+    """
+    Time every WebDriver command, each of which is a round trip to chromedriver, when tracing is on
+
+    Elements send their commands through the driver, so find_element, click and .text on elements are included.
+
+    :param driver: WebDriver
+    :return: WebDriver
+    """
+    if get_tracer() is None or getattr(driver, '_funance_traced', False):
+        return driver
+    execute = driver.execute
+
+    @functools.wraps(execute)
+    def traced_execute(driver_command, params=None):
+        tracer = get_tracer()
+        if tracer is None:
+            return execute(driver_command, params)
+        with tracer.span(driver_command, WEBDRIVER):
+            return execute(driver_command, params)
+
+    driver.execute = traced_execute
+    driver._funance_traced = True
+    return driver
+
+
+def format_summary(summary: list) -> str:
+    """
+    :param summary: list from Tracer.get_summary()
+    :return: str table
+    """
+    name_width = max([len(f"{row['cat']}:{row['name']}") for row in summary] + [4])
+    lines = [f"{'Step':<{name_width}}  {'Calls':>6}  {'Total s':>8}  {'Mean ms':>8}  {'Max ms':>8}"]
+    for row in summary:
+        lines.append(f"{row['cat'] + ':' + row['name']:<{name_width}}  {row['count']:>6}  {row['total']:>8.2f}  "
+                     f"{row['mean'] * 1000:>8.1f}  {row['max'] * 1000:>8.1f}")
+    return '\n'.join(lines)
@@ -0,0 +1,148 @@
+import time
+from collections import defaultdict
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from funance.common.logger import get_logger
+from funance.scrape.trace import WAIT, get_tracer
+
+logger = get_logger('wait')
+
+# WebDriverWait polls every 0.5s by default, so a step that is ready in 50ms still takes up to half a second
+TIMEOUT = 10
+POLL_FREQUENCY = 0.05
+# waiting on the user to log in, so there is no hurry
+LOGIN_TIMEOUT = 300
+LOGIN_POLL_FREQUENCY = 0.5
+# how long a restored session gets to show it is still logged in
+PROBE_TIMEOUT = 10
+
+
+class LoginRequiredError(Exception):
+    """
+    The provider is not logged in, and the browser is headless, so the user can not log in
+    """
+    pass
+
+
+def any_of(*expected_conditions):
+    """
+    An expectation that any of the conditions is true, like expected_conditions.any_of in Selenium 4
+
+    :return: the first truthy result
+    """
+    def any_of_condition(driver):
+        for expected_condition in expected_conditions:
+            try:
+                result = expected_condition(driver)
+                if result:
+                    return result
+            except (NoSuchElementException, StaleElementReferenceException):
+                pass
+        return False
+    return any_of_condition
+
+
+class SmartWait:
+    """
+    Wait for conditions with a short poll interval, timing each step
+
+    Timings are kept by step name, so a scrape can log where its time went.
+    """
+
+    def __init__(self, driver, timeout: float = TIMEOUT, poll_frequency: float = POLL_FREQUENCY):
+        """
+        :param driver: WebDriver
+        :param timeout: float default seconds to wait
+        :param poll_frequency: float default seconds between checks
+        """
+        self.driver = driver
+        self.timeout = timeout
+        self.poll_frequency = poll_frequency
+        self.timings = defaultdict(list)
+
+    def until(self, condition, step: str = None, timeout: float = None, poll_frequency: float = None):
+        """
+        Wait until condition returns a truthy value
+
+        Stale elements are ignored while polling, along with missing elements, so a condition can read from a page
+        that is being replaced.
+
+        :param condition: callable taking the driver, like the expected_conditions
+        :param step: str name to time the wait under, defaults to the condition's name
+        :param timeout: float seconds, defaults to self.timeout
+        :param poll_frequency: float seconds, defaults to self.poll_frequency
+        :return: the condition's result
+        :raises TimeoutException:
+        """
+        step = step or getattr(condition, '__name__', type(condition).__name__)
+        wait = WebDriverWait(
+            self.driver,
+            self.timeout if timeout is None else timeout,
+            poll_frequency=self.poll_frequency if poll_frequency is None else poll_frequency,
+            ignored_exceptions=[StaleElementReferenceException],
+        )
+        start = time.perf_counter()
+        try:
+            return wait.until(condition)
+        finally:
+            end = time.perf_counter()
+            self.timings[step].append(end - start)
+            logger.debug(f'{step}: {end - start:.3f}s')
+            tracer = get_tracer()
+            if tracer is not None:
+                tracer.add(step, WAIT, start, end)
+
+    def until_stale(self, element, step: str = None, timeout: float = None):
+        """
+        Wait for element to leave the DOM, e.g. the old page after a navigation
+
+        :param element: WebElement
+        :return: bool True
+        """
+        return self.until(EC.staleness_of(element), step=step or 'staleness_of', timeout=timeout)
+
+    def wait_for_login(self, condition, step: str = 'login', interactive: bool = True) -> bool:
+        """
+        Wait for the user to log in
+
+        :param condition: callable that is truthy once logged in
+        :param interactive: bool False when nobody can see the browser, e.g. headless. Only checks the browser is
+                            already logged in, instead of waiting for the user.
+        :return: bool is authenticated
+        :raises LoginRequiredError: not interactive, and not logged in
+        """
+        if not interactive:
+            if not self.probe(condition, step=step):
+                raise LoginRequiredError('Not logged in, and a headless browser can not log in. '
+                                         'Scrape with --browser full or lite to log in first.')
+            return True
+        try:
+            self.until(condition, step=step, timeout=LOGIN_TIMEOUT, poll_frequency=LOGIN_POLL_FREQUENCY)
+            return True
+        except TimeoutException:
+            return False
+
+    def probe(self, condition, step: str = 'probe', timeout: float = None) -> bool:
+        """
+        Check a condition that may never become true, like a restored session still being logged in
+
+        :param condition: callable
+        :param timeout: float seconds, defaults to PROBE_TIMEOUT
+        :return: bool
+        """
+        try:
+            self.until(condition, step=step, timeout=PROBE_TIMEOUT if timeout is None else timeout)
+            return True
+        except TimeoutException:
+            return False
+
+    def log_timings(self):
+        """
+        Log the total time spent waiting in each step, slowest first
+        """
+        totals = sorted(((sum(t), len(t), step) for step, t in self.timings.items()), reverse=True)
+        for total, count, step in totals:
+            logger.info(f'Waited {total:.2f}s in {step} ({count}x)')
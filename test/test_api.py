@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from funance.scrape.api import ApiClient, ApiError, get_field, session_from_driver
+from funance.scrape.export import BrokerageWriter
+from funance.scrape.provider import tda, vanguard
+from funance.scrape.provider.tda import Tda, TdaApi
+from funance.scrape.provider.vanguard import Vanguard, VanguardApi
+from test.helpers import get_root_path
+
+# made up to match the clients, not recorded from the providers, see test/fixtures/api/README.md
+FIXTURES_DIR = os.path.join(get_root_path(), 'test', 'fixtures', 'api')
+# each account's cost basis takes this long, so fetching accounts one at a time is measurably slower
+DELAY = 0.3
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves recorded provider responses to requests with the logged in cookie
+
+    /<provider>/<endpoint>?accountId=<id> serves <provider>/<endpoint file>.<id>.json
+    """
+
+    routes = {
+        VanguardApi.ACCOUNTS_PATH:   'accounts',
+        VanguardApi.COST_BASIS_PATH: 'costbasis',
+        TdaApi.BALANCES_PATH:        'balances',
+        TdaApi.COST_BASIS_PATH:      'costbasis',
+    }
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        provider, _, path = url.path.lstrip('/').partition('/')
+        name = self.routes.get(f'/{path}')
+        account_id = parse_qs(url.query).get('accountId', [None])[0]
+        file = os.path.join(FIXTURES_DIR, provider, '.'.join(filter(None, [name, account_id, 'json'])))
+        if 'auth=ok' not in (self.headers.get('Cookie') or ''):
+            # an expired session gets the log in page
+            return self.respond(200, b'<html>Log on</html>', 'text/html')
+        if name is None or not os.path.exists(file):
+            return self.respond(404, b'{}')
+        if name == 'costbasis':
+            time.sleep(DELAY)
+        with open(file, 'rb') as fp:
+            self.respond(200, fp.read())
+
+    def respond(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Driver:
+    def __init__(self, cookie_value='ok'):
+        self.cookie_value = cookie_value
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        return {'cookies': [{'name': 'auth', 'value': self.cookie_value, 'domain': '127.0.0.1', 'path': '/'}]}
+
+    def execute_script(self, script):
+        return 'Mozilla/5.0 (funance test)'
+
+
+class StoreStub:
+    def save(self, driver):
+        pass
+
+
+class TestApi(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_session_from_driver(self):
+        session = session_from_driver(Driver())
+        self.assertEqual(session.headers['User-Agent'], 'Mozilla/5.0 (funance test)')
+        self.assertEqual(session.cookies.get('auth'), 'ok')
+
+    def test_vanguard(self):
+        api = VanguardApi(session_from_driver(Driver()), base_url=f'{self.base_url}/vanguard')
+        writer = BrokerageWriter('vanguard')
+        start = time.perf_counter()
+        api.scrape(writer)
+        # both accounts were fetched at once
+        self.assertLess(time.perf_counter() - start, DELAY * 2)
+
+        accounts = writer.dump_schema()['accounts']
+        self.assertEqual(list(accounts), ['Ralph D Malf Brokerage Account 111',
+                                          'Ralph D Malf Traditional IRA Brokerage Account 222'])
+        account = accounts['Ralph D Malf Brokerage Account 111']
+        self.assertEqual(account['cash'], '1234.50')
+        self.assertEqual(list(account['cost_basis']), ['X_CASH', 'VTI'])
+        self.assertEqual(account['cost_basis']['VTI']['total_shares'], '15.0000')
+        self.assertEqual(account['cost_basis']['VTI']['lots'], [
+            dict(date_acquired='2020-03-16', num_shares='10.0000', cost_per_share='120.50', total_cost='1205.00',
+                 term='long'),
+            dict(date_acquired='2023-01-03', num_shares='5.0000', cost_per_share='190.10', total_cost='950.50',
+                 term='short'),
+        ])
+
+    def test_tda(self):
+        api = TdaApi(session_from_driver(Driver()), base_url=f'{self.base_url}/tda', accounts=[
+            dict(account_id='123456789', account_name='Acct 1', is_active=False),
+            dict(account_id='987654321', account_name='Acct 2', is_active=True),
+        ])
+        writer = BrokerageWriter('tda')
+        api.scrape(writer)
+        accounts = writer.dump_schema()['accounts']
+        self.assertEqual(accounts['Acct 1']['cash'], '2000.00')
+        self.assertEqual(accounts['Acct 1']['cost_basis']['AAPL']['lots'], [
+            dict(date_acquired='2019-07-04', num_shares='4', cost_per_share='50.00', total_cost='200.00',
+                 term='long'),
+            dict(date_acquired='2023-01-02', num_shares='6', cost_per_share='125.00', total_cost='750.00',
+                 term='short'),
+        ])
+        self.assertEqual(list(accounts['Acct 2']['cost_basis']), ['X_CASH'])
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            ApiClient(session_from_driver(Driver()), base_url=self.base_url)
+
+    def test_unexpected_shape(self):
+        with self.assertRaisesRegex(ApiError, 'Missing accounts'):
+            get_field({'data': []}, 'accounts', list)
+        with self.assertRaisesRegex(ApiError, 'Expected lots to be list, received str'):
+            get_field({'lots': ''}, 'lots', list)
+        with self.assertRaisesRegex(ApiError, 'Expected an object'):
+            get_field([], 'lots')
+        with self.assertRaisesRegex(ApiError, 'Expected openDate like'):
+            tda.get_api_lot(dict(openDate='2019-07-04', quantity='4', costPerShare='50.00', amount='200.00',
+                                 term='Long'))
+        with self.assertRaisesRegex(ApiError, 'Expected quantity to be int or float, received str'):
+            vanguard.get_api_lot(dict(acquiredDate=None, quantity='10', costPerShare=1, totalCost=10,
+                                      holdingPeriod='LONG_TERM'))
+        with self.assertRaisesRegex(ApiError, 'Unknown holding period'):
+            vanguard.get_api_lot(dict(acquiredDate=None, quantity=10, costPerShare=1, totalCost=10,
+                                      holdingPeriod='UNKNOWN'))
+
+    def get_provider(self, provider_class, provider, cookie_value, **kwargs):
+        base_url = f'{self.base_url}/{provider}'
+
+        class Provider(provider_class):
+            pages_scraped = False
+
+            def _wait_for_login(self):
+                pass
+
+            def _get_api(self):
+                api = super()._get_api()
+                api.base_url = base_url
+                return api
+
+            def _get_account_switcher_data(self):
+                return [dict(account_id='123456789', account_name='Acct 1', is_active=True)]
+
+            def _scrape_pages(self):
+                self.pages_scraped = True
+
+            def _get_cash(self):
+                self.pages_scraped = True
+
+            def _get_cost_basis(self):
+                pass
+
+            def _write_export(self):
+                pass
+
+        return Provider(Driver(cookie_value), session_store=StoreStub(), **kwargs)
+
+    def test_provider_api(self):
+        for provider_class, provider in [(Tda, 'tda'), (Vanguard, 'vanguard')]:
+            with self.subTest(provider):
+                p = self.get_provider(provider_class, provider, 'ok', use_api=True)
+                p.scrape()
+                self.assertFalse(p.pages_scraped)
+                self.assertTrue(p.writer.accounts)
+
+    def test_provider_fallback(self):
+        for provider_class, provider in [(Tda, 'tda'), (Vanguard, 'vanguard')]:
+            with self.subTest(provider):
+                # the stand in serves the log in page instead of JSON
+                p = self.get_provider(provider_class, provider, 'expired', use_api=True)
+                p.scrape()
+                self.assertTrue(p.pages_scraped)
+                self.assertEqual(p.writer.accounts, {})
+
+    def test_provider_bug(self):
+        # only errors fetching the data fall back to the pages, bugs in the client are raised
+        p = self.get_provider(Vanguard, 'vanguard', 'ok', use_api=True)
+        with mock.patch.object(VanguardApi, 'get_account', side_effect=KeyError('missing')):
+            with self.assertRaises(KeyError):
+                p.scrape()
+        self.assertFalse(p.pages_scraped)
+
+    def test_provider_pages(self):
+        p = self.get_provider(Vanguard, 'vanguard', 'ok')
+        p.scrape()
+        self.assertTrue(p.pages_scraped)
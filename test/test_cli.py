@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+import click
+from click.testing import CliRunner
+from parameterized import parameterized
+
+from funance.cli.__main__ import cli
+from funance.cli.lazy import LazyGroup
+from test.helpers import FixtureHelper, get_root_path
+
+# microseconds, `python -X importtime` units. Importing the CLI should cost little more than importing click.
+IMPORT_TIME_BUDGET = 250000
+HEAVY_MODULES = ['dash', 'plotly', 'pandas', 'numpy', 'selenium', 'requests', 'yaml']
+
+
+def run_python(code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.join(get_root_path(), 'src'), env.get('PYTHONPATH')]))
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env, capture_output=True, text=True,
+                          check=True)
+
+
+def get_import_times(stderr):
+    """
+    Parse `python -X importtime` output
+
+    :return: dict of module name to cumulative import time in microseconds
+    """
+    times = dict()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestCli(unittest.TestCase):
+    def test_import_does_not_import_heavy_modules(self):
+        times = get_import_times(run_python('import funance.cli.__main__').stderr)
+        self.assertIn('funance.cli.__main__', times)
+        self.assertEqual([module for module in HEAVY_MODULES if module in times], [])
+
+    # wall clock time depends on the machine and its load, so the budget is only checked when asked for
+    @unittest.skipUnless(os.environ.get('FUNANCE_TIMING_TESTS'), 'set FUNANCE_TIMING_TESTS=1 to check import time')
+    def test_import_time(self):
+        times = get_import_times(run_python('import funance.cli.__main__').stderr)
+        self.assertLess(times['funance.cli.__main__'], IMPORT_TIME_BUDGET)
+
+    @parameterized.expand([
+        ('help', ['--help']),
+        ('format', ['format', '--help']),
+        ('forecast', ['forecast', '--help']),
+        ('scrape', ['scrape', '--help']),
+        ('chromedriver', ['chromedriver', '--help']),
+    ])
+    def test_help_does_not_import_heavy_modules(self, name, args):
+        code = (
+            'import sys\n'
+            'from funance.cli.__main__ import cli\n'
+            f'cli.main({args!r}, standalone_mode=False)\n'
+            f'print("imported:" + ",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n'
+        )
+        imported = run_python(code).stdout.strip().splitlines()[-1]
+        self.assertEqual(imported, 'imported:')
+
+    def test_lists_lazy_commands(self):
+        result = CliRunner().invoke(cli, ['--help'])
+        self.assertEqual(result.exit_code, 0)
+        for command in ['chromedriver', 'dashboard', 'forecast', 'format', 'init', 'scrape']:
+            self.assertIn(command, result.output)
+
+    def test_simulate_unknown_account(self):
+        with mock.patch('funance.common.spec.load_spec', FixtureHelper.get_spec_fixture):
+            result = CliRunner().invoke(cli, ['forecast', 'simulate', '--paths', '10', '--account', 'ghost'])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn('unknown account(s): ghost', result.output)
+        self.assertNotIsInstance(result.exception, KeyError)
+
+    def test_not_a_command(self):
+        group = LazyGroup(lazy_subcommands={'path': 'os.path.join'})
+        with self.assertRaises(ValueError):
+            group.get_command(click.Context(group), 'path')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,235 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import dash
+import numpy as np
+import pandas as pd
+import yaml
+from dash import dcc, html
+from parameterized import parameterized
+
+from funance.common.spec import get_yaml
+from funance.dashboard.dash_app import TABLE_TYPE, ChartStore, create_app, get_chart_data, get_webgl_figure
+from funance.dashboard.downsample import downsample, minmax_indices
+from funance.dashboard.reload import ChartReloader
+from funance.dashboard.serialize import to_json
+from funance.dashboard.table import get_table_df, query_table, split_filter_part
+from funance.forecast.projector import Projector
+from test.helpers import FixtureHelper, get_root_path
+
+
+class TestTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        projector = Projector.from_spec(FixtureHelper.get_spec_fixture(), '2022-01-01', '2022-12-31')
+        cls.charts = projector.get_charts()
+        table_chart = next(chart for chart in cls.charts if chart.type == 'datatable')
+        cls.df = get_table_df(get_chart_data(table_chart)[0][1])
+
+    @parameterized.expand([
+        ('{Amount} > 100', ('Amount', 'gt', 100.0)),
+        ('{Amount} ge -5.5', ('Amount', 'ge', -5.5)),
+        ('{Description} contains "rent"', ('Description', 'contains', 'rent')),
+        ('{Date} datestartswith 2022-03', ('Date', 'datestartswith', '2022-03')),
+        ('nonsense', (None, None, None)),
+    ])
+    def test_split_filter_part(self, filter_part, expected):
+        self.assertEqual(split_filter_part(filter_part), expected)
+
+    def test_page(self):
+        rows, page_count = query_table(self.df, 1, 10)
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(page_count, -(-len(self.df) // 10))
+        self.assertEqual(rows[0], self.df.iloc[10].to_dict())
+
+    def test_filter_and_sort(self):
+        rows, page_count = query_table(self.df, 0, 25, sort_by=[{'column_id': 'Amount', 'direction': 'asc'}],
+                                       filter_query='{Date} datestartswith 2022-03 && {Amount} < 0')
+        self.assertEqual(page_count, 1)
+        self.assertTrue(rows)
+        self.assertTrue(all(row['Date'].startswith('2022-03') and row['Amount'] < 0 for row in rows))
+        self.assertEqual([row['Amount'] for row in rows], sorted(row['Amount'] for row in rows))
+
+    def test_server_side_layout_has_no_rows(self):
+        app = create_app(*self.charts)
+        tables = [div.children[1] for div in app.chart_store.children if isinstance(div, html.Div)]
+        self.assertTrue(tables)
+        self.assertTrue(all(table.page_action == 'custom' and table.data == [] for table in tables))
+        self.assertEqual(list(app.chart_store.tables), list(range(len(tables))))
+
+    def test_table_callback(self):
+        app = create_app(*self.charts)
+        table_id = {'type': TABLE_TYPE, 'index': 0}
+        response = post_callback(app, [
+            dict(id=table_id, property='data'), dict(id=table_id, property='page_count')
+        ], [
+            dict(id=table_id, property='page_current', value=0),
+            dict(id=table_id, property='page_size', value=10),
+            dict(id=table_id, property='sort_by', value=[]),
+            dict(id=table_id, property='filter_query', value='{Amount} < 0'),
+        ])
+        table = response[stringify_id(table_id)]
+        self.assertEqual(len(table['data']), 10)
+        self.assertTrue(all(row['Amount'] < 0 for row in table['data']))
+
+    def test_webgl_layout(self):
+        app = create_app(*self.charts, webgl=True)
+        graphs = [c for c in app.chart_store.children if isinstance(c, dcc.Graph) and isinstance(c.id, dict)]
+        self.assertTrue(graphs)
+        self.assertEqual(graphs[0].figure.data[0].type, 'scattergl')
+
+    def test_layout_json(self):
+        app = create_app(*self.charts)
+        client = app.server.test_client()
+        response = client.get('/_dash-layout')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(json.loads(response.data), json.loads(to_json(app.chart_store.get_layout())))
+        compressed = client.get('/_dash-layout', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), response.data)
+
+    def test_layout_hooks(self):
+        app = create_app(*self.charts)
+        with mock.patch.dict(dash.hooks._ns, layout=[]):
+            dash.hooks.layout()(lambda layout: html.Div(children=[layout, html.P(id='hooked')]))
+            response = app.server.test_client().get('/_dash-layout')
+        self.assertIn('"hooked"', response.get_data(as_text=True))
+
+    def test_unchanged_charts_are_reused(self):
+        store = ChartStore()
+        store.set_charts(self.charts)
+        children = store.children
+        store.set_charts(Projector.from_spec(FixtureHelper.get_spec_fixture(), '2022-01-01', '2022-12-31')
+                         .get_charts())
+        self.assertEqual(store.version, 2)
+        self.assertTrue(all(a is b for a, b in zip(store.children, children)))
+        self.assertEqual(list(store.tables), list(range(len(store.tables))))
+
+
+class TestReload(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.spec_file = os.path.join(self.tmp_dir.name, 'forecast.yml')
+        shutil.copyfile(os.path.join(get_root_path(), 'forecast.dist.yml'), self.spec_file)
+        self.reloader = ChartReloader([self.spec_file], self.load_charts)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def load_charts(self):
+        spec = get_yaml(self.spec_file)
+        return Projector.from_spec(spec, '2022-01-01', '2022-12-31').get_charts()
+
+    def edit_spec(self, text):
+        with open(self.spec_file, 'w') as stream:
+            stream.write(text)
+        # make sure the modification time changes, on file systems with coarse times
+        stat = os.stat(self.spec_file)
+        os.utime(self.spec_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def reload(self, app, version):
+        return post_callback(app, [
+            dict(id='charts', property='children'), dict(id='charts-version', property='data')
+        ], [
+            dict(id='reload-interval', property='n_intervals', value=1)
+        ], [
+            dict(id='charts-version', property='data', value=version)
+        ])
+
+    def test_reload(self):
+        app = create_app(*self.load_charts(), reloader=self.reloader)
+        self.assertIsNone(self.reload(app, 1))
+
+        spec = get_yaml(self.spec_file)
+        spec['chart_spec'] = spec['chart_spec'][:1]
+        self.edit_spec(yaml.safe_dump(spec))
+        response = self.reload(app, 1)
+        self.assertEqual(response['charts-version']['data'], 2)
+        self.assertEqual(len(response['charts']['children']), 1)
+        # clients that already have the new charts are not sent them again
+        self.assertIsNone(self.reload(app, 2))
+
+    def test_keeps_charts_on_error(self):
+        app = create_app(*self.load_charts(), reloader=self.reloader)
+        self.edit_spec('accounts: [')
+        self.assertIsNone(self.reload(app, 1))
+        self.assertEqual(app.chart_store.version, 1)
+
+    def test_sets_charts_under_lock(self):
+        locked = []
+        with open(self.spec_file) as stream:
+            self.edit_spec(stream.read())
+        self.assertTrue(self.reloader.poll(lambda charts: locked.append(self.reloader._lock.locked())))
+        self.assertEqual(locked, [True])
+        self.assertFalse(self.reloader.poll(lambda charts: locked.append(True)))
+
+
+def post_callback(app, outputs, inputs, state=None):
+    """
+    Call a callback through the server, like the browser does
+
+    :return: dict response, or None when the callback prevented the update
+    """
+    client = app.server.test_client()
+    client.get('/')
+    # pattern matching callbacks are keyed by their wildcard ids
+    output = next(key for key in app.callback_map if all(
+        (o['id']['type'] if isinstance(o['id'], dict) else o['id']) in key and
+        f".{o['property']}" in key for o in outputs))
+    response = client.post('/_dash-update-component', json=dict(
+        output=output, outputs=outputs if len(outputs) > 1 else outputs[0], inputs=inputs, state=state or [],
+        changedPropIds=[f"{stringify_id(i['id'])}.{i['property']}" for i in inputs]
+    ))
+    if response.status_code == 204:
+        return None
+    return response.get_json()['response']
+
+
+def stringify_id(component_id):
+    if isinstance(component_id, dict):
+        return json.dumps(component_id, separators=(',', ':'), sort_keys=True)
+    return component_id
+
+
+class TestDownsample(unittest.TestCase):
+    def get_df(self):
+        rng = np.random.default_rng(1)
+        index = pd.date_range('2022-01-01', periods=10000, freq='D')
+        balance = 1000 + rng.normal(0, 10, len(index)).cumsum()
+        # a one day overdraft
+        balance[6543] = -500
+        return pd.DataFrame({'balance': balance, 'amt_desc': 'desc'}, index=index)
+
+    def test_short_series_unchanged(self):
+        np.testing.assert_array_equal(minmax_indices(np.arange(5.0), 10), np.arange(5))
+
+    def test_keeps_extremes(self):
+        df = self.get_df()
+        sampled = downsample(df, 'balance', 200)
+        self.assertLessEqual(len(sampled), 202)
+        self.assertEqual(sampled['balance'].min(), -500)
+        self.assertEqual(sampled['balance'].max(), df['balance'].max())
+        self.assertEqual(sampled.index[0], df.index[0])
+        self.assertEqual(sampled.index[-1], df.index[-1])
+        self.assertTrue(sampled.index.is_monotonic_increasing)
+
+    def test_range(self):
+        df = self.get_df()
+        sampled = downsample(df, 'balance', 200, ('2030-01-01', '2030-03-01'))
+        # the zoomed in range is small enough to plot every day, plus a point either side
+        self.assertEqual(len(sampled), 60 + 2)
+        self.assertEqual(sampled.index[0], pd.Timestamp('2029-12-31'))
+
+    def test_figure(self):
+        fig = get_webgl_figure('Balances', [('Checking', self.get_df())])
+        self.assertEqual(fig.data[0].type, 'scattergl')
+        self.assertLessEqual(len(fig.data[0].x), 2002)
+
+
+if __name__ == "__main__":
+    unittest.main()
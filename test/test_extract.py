@@ -0,0 +1,63 @@
+import unittest
+
+from funance.scrape.extract import EXTRACT_SCRIPT, extract_groups, extract_rows
+from funance.scrape.provider.tda import get_lot
+
+
+class FakeDriver:
+    """
+    Returns canned results from execute_script, and records the calls
+    """
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def execute_script(self, script, *args):
+        self.calls.append((script, args))
+        return self.result
+
+
+class TestExtract(unittest.TestCase):
+    def test_extract_groups(self):
+        driver = FakeDriver({
+            'SUM_1': [{'date': ' 01/02/20\n', 'id': 'L_1'}, {'date': None, 'id': 'L_2'}],
+        })
+        groups = extract_groups(driver, {'SUM_1': '#L_1 tr'}, {'date': 'td.OpenDate'}, attributes=['id'],
+                                text_property='textContent')
+        self.assertEqual(groups, {'SUM_1': [{'date': '01/02/20', 'id': 'L_1'}, {'date': None, 'id': 'L_2'}]})
+        # the whole table is read in one round trip
+        self.assertEqual(len(driver.calls), 1)
+        script, args = driver.calls[0]
+        self.assertEqual(script, EXTRACT_SCRIPT)
+        self.assertEqual(args, (None, {'SUM_1': '#L_1 tr'}, {'date': 'td.OpenDate'}, {}, ['id'], {},
+                                'textContent', False))
+
+    def test_extract_rows(self):
+        driver = FakeDriver({'rows': [{'ticker': 'VTI ', 'is_ticker_row': True}]})
+        rows = extract_rows(driver, 'tr', {'ticker': 'td:nth-child(1)'}, root='table',
+                            link_texts={'is_ticker_row': 'Buy'})
+        self.assertEqual(rows, [{'ticker': 'VTI', 'is_ticker_row': True}])
+        self.assertEqual(driver.calls[0][1][0], 'table')
+
+    def test_text_property(self):
+        with self.assertRaises(ValueError):
+            extract_rows(FakeDriver({'rows': []}), 'tr', {}, text_property='outerHTML')
+
+
+class TestTdaGetLot(unittest.TestCase):
+    def test_get_lot(self):
+        lot = get_lot({
+            'date_acquired':  '07/04/19',
+            'num_shares':     '5',
+            'cost_per_share': '200.00',
+            'total_cost':     '1,000.00',
+            'term':           'Long',
+        })
+        self.assertEqual(lot, dict(
+            date_acquired='2019-07-04',
+            num_shares='5',
+            cost_per_share='200.00',
+            total_cost='1,000.00',
+            term='long'
+        ))
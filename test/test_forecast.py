@@ -1,15 +1,23 @@
+import copy
 import datetime
+import os
+import tempfile
 import unittest
 
+import dateutil.parser as dp
 import numpy as np
 import pandas as pd
 from parameterized import parameterized
 
-from funance.forecast.account import Account
+from funance.forecast.account import Account, Accounts
+from funance.forecast.cache import ProjectionCache
 from funance.forecast.datespec import DateSpec
-from funance.forecast.exceptions import OutOfBoundsException
+from funance.forecast.exceptions import OutOfBoundsException, SpecValidationError
+from funance.forecast.ledger import Ledger
 from funance.forecast.projector import Projector
-from funance.forecast.transaction import Transaction
+from funance.forecast.scheduler import DynamicScheduler
+from funance.forecast.scenario import Scenario, Scenarios, apply_patch
+from funance.forecast.transaction import Transaction, TransactionBatch, ScheduledTransactions
 from test.helpers import FixtureHelper
 
 
@@ -78,6 +86,58 @@ class TestAccount(unittest.TestCase):
         self.assertEqual(account.get_balance('2022-01-28'), 6000)
         self.assertEqual(account.get_balance('2025-01-01'), 6000)
 
+    def test_grouped_balance_and_descriptions(self):
+        account = Account(account_id='checking', name='Checking', start_date='2022-01-01', balance=1000)
+        account.add_transactions([
+            Transaction(transaction_id='rent', account_id='checking',
+                        date=datetime.datetime(2022, 1, 14, 0, 0), amount=-500.0, name='Rent', type='expense'),
+            Transaction(transaction_id='paycheck', account_id='checking',
+                        date=datetime.datetime(2022, 1, 14, 0, 0), amount=250.5, name='Paycheck', type='income')
+        ])
+        df = account.get_running_balance_grouped()
+        self.assertEqual(list(df.columns), ['amount', 'balance'])
+        self.assertEqual(df['balance'].tolist(), [750.5])
+        self.assertEqual(account.get_descriptions().tolist(), ['$250.50: Paycheck<br>$-500.00: Rent'])
+
+
+class TestLedger(unittest.TestCase):
+    def test_total_through_date(self):
+        ledger = Ledger(start_date=datetime.date(2022, 1, 1), capacity=4)
+        ledger.add(datetime.datetime(2022, 1, 28), -250.0)
+        ledger.add(datetime.datetime(2022, 1, 14), -250.0)
+        # grows the tree past its initial capacity
+        ledger.add(datetime.datetime(2023, 6, 1), 1000.0)
+        self.assertEqual(ledger.get_total(datetime.datetime(2022, 1, 13)), 0)
+        self.assertEqual(ledger.get_total(datetime.datetime(2022, 1, 14)), -250)
+        self.assertEqual(ledger.get_total(datetime.datetime(2022, 1, 28)), -500)
+        self.assertEqual(ledger.get_total(datetime.datetime(2023, 5, 31)), -500)
+        self.assertEqual(ledger.get_total(datetime.datetime(2030, 1, 1)), 500)
+
+    def test_dates_before_start_date_count_on_first_day(self):
+        ledger = Ledger(start_date=datetime.date(2022, 1, 1))
+        ledger.add(datetime.datetime(2021, 12, 1), 100.0)
+        self.assertEqual(ledger.get_total(datetime.datetime(2022, 1, 1)), 100)
+
+
+class TestTransactionBatch(unittest.TestCase):
+    def test_concat_and_partition(self):
+        dates = np.array(['2022-01-14', '2022-01-28'], dtype='datetime64[D]')
+        batch = TransactionBatch.concat([
+            TransactionBatch.from_dates(account_id='checking', name='Savings', ttype='transfer', dates=dates,
+                                        amount=-250.0),
+            TransactionBatch.from_dates(account_id='savings', name='Savings', ttype='transfer', dates=dates,
+                                        amount=250.0),
+            TransactionBatch.from_dates(account_id='checking', name='Rent', ttype='expense', dates=dates[:1],
+                                        amount=-1500.0),
+        ])
+        self.assertEqual(batch.names, ['Savings', 'Rent'])
+        partitions = batch.partition()
+        self.assertEqual(list(partitions), ['checking', 'savings'])
+        checking_df = partitions['checking'].to_df()
+        self.assertEqual(checking_df['name'].tolist(), ['Savings', 'Savings', 'Rent'])
+        self.assertEqual(checking_df['amount'].tolist(), [-250.0, -250.0, -1500.0])
+        self.assertEqual(partitions['savings'].get_account_ids(), ['savings'])
+
 
 class TestDates(unittest.TestCase):
     @parameterized.expand([
@@ -266,6 +326,21 @@ class TestDates(unittest.TestCase):
         actual = datespec.generate_dates(start_date=date_filter['start_date'], end_date=date_filter['end_date'])
         self.assertEqual(actual, expected)
 
+    @parameterized.expand([
+        ("daily_interval_3", 'daily', 3, None, None),
+        ("weekly_start_after_weekday", 'weekly', 2, 'mon', None),
+        ("weekly_spec_start_weekday", 'weekly', 1, None, None),
+        ("monthly_every_other_29th", 'monthly', 2, None, 29),
+        ("monthly_spec_start_day", 'monthly', 1, None, None),
+        ("monthly_by_weekday_fallback", 'monthly', 1, 'fri', None),
+    ])
+    def test_vectorized_dates_match_rrule(self, name, frequency, interval, day_of_week, day_of_month):
+        datespec = DateSpec(start_date='2019-03-06', end_date=None, frequency=frequency, interval=interval,
+                            day_of_week=day_of_week, day_of_month=day_of_month)
+        expected = datespec.generate_rrule_dates(dp.parse('2022-01-01'), dp.parse('2022-12-31'))
+        actual = datespec.generate_dates(start_date='2022-01-01', end_date='2022-12-31')
+        self.assertEqual(actual, expected)
+
 
 class TestForecast(unittest.TestCase):
 
@@ -402,6 +477,191 @@ class TestForecast(unittest.TestCase):
 
         np.testing.assert_array_equal(actual, expected)
 
+    def test_balance_matrix(self):
+        spec = FixtureHelper.get_spec_fixture()
+        projector = Projector.from_spec(spec, '2022-01-01', '2022-12-31')
+        df = projector.get_balance_matrix()
+        self.assertEqual(len(df.index), 365)
+        self.assertEqual(list(df.columns), ['checking', 'savings', 'credit_card', 'cc_plans', '401k'])
+        for account_id in df.columns:
+            for date in ['2022-01-01', '2022-02-14', '2022-06-30', '2022-12-31']:
+                self.assertAlmostEqual(df.loc[date, account_id], projector.get_account(account_id).get_balance(date))
+
+        weekly = projector.get_balance_matrix(freq='W')
+        self.assertAlmostEqual(weekly.loc['2022-01-16', 'checking'], df.loc['2022-01-16', 'checking'])
+
+
+class TestDynamicScheduler(unittest.TestCase):
+    def get_two_card_spec(self):
+        spec = FixtureHelper.get_spec_fixture()
+        card = copy.deepcopy(spec['accounts']['credit_card'])
+        card['pmt_plan'] = None
+        spec['accounts']['credit_card_2'] = card
+        pmt = copy.deepcopy(spec['accounts']['checking']['scheduled_transactions']['cc_pmt'])
+        pmt['amount']['cc_balance']['account_id'] = 'credit_card_2'
+        pmt['transfer']['account_id'] = 'credit_card_2'
+        spec['accounts']['savings']['scheduled_transactions'] = {'cc_pmt_2': pmt}
+        return spec
+
+    def test_matches_sequential_resolution(self):
+        spec = self.get_two_card_spec()
+        st = ScheduledTransactions.from_spec(spec, '2022-01-01', '2022-12-31')
+
+        sequential = Accounts.from_spec(copy.deepcopy(spec), '2022-01-01', '2022-12-31')
+        sequential.add_batch(st.plain)
+        for dt in sorted(st.dynamic, key=lambda d: d.date):
+            sequential.add_transactions(dt.exchange(sequential))
+
+        scheduled = Accounts.from_spec(copy.deepcopy(spec), '2022-01-01', '2022-12-31')
+        scheduled.add_batch(st.plain)
+        waves = DynamicScheduler(scheduled, st.dynamic).apply()
+
+        # the two cards do not share accounts, so their payments resolve side by side
+        self.assertEqual(waves, 12)
+        for account_id in sequential.accounts:
+            for month in range(1, 13):
+                date = datetime.datetime(2022, month, 28)
+                self.assertAlmostEqual(scheduled.get_account(account_id).get_balance(date),
+                                       sequential.get_account(account_id).get_balance(date))
+
+
+class TestScenarios(unittest.TestCase):
+    def test_apply_patch_does_not_modify_spec(self):
+        spec = {'accounts': {'checking': {'balance': 100, 'name': 'Checking'}}}
+        patched = apply_patch(spec, {'accounts': {'checking': {'balance': 200}}})
+        self.assertEqual(patched, {'accounts': {'checking': {'balance': 200, 'name': 'Checking'}}})
+        self.assertEqual(spec['accounts']['checking']['balance'], 100)
+
+    def test_grid(self):
+        scenarios = Scenario.from_grid({'a.b': [1, 2], 'c': ['x']})
+        self.assertEqual([s.name for s in scenarios], ['a.b=1,c=x', 'a.b=2,c=x'])
+        self.assertEqual(scenarios[1].patch, {'a': {'b': 2}, 'c': 'x'})
+
+    def test_run(self):
+        spec = FixtureHelper.get_spec_fixture()
+        scenarios = Scenarios.from_spec({
+            'scenarios': [{'name': 'base'}],
+            'grid':      {'accounts.checking.scheduled_transactions.rent.amount': [1650]}
+        })
+        df = scenarios.run(spec, '2022-01-01', '2022-12-31', max_workers=1)
+        self.assertEqual(list(df.columns), ['scenario', 'account_id', 'date', 'balance'])
+        final = df[df['account_id'] == 'checking'].groupby('scenario')['balance'].last()
+        # rent starts on 2022-01-28, so it is paid 11 times in the window
+        self.assertAlmostEqual(final['base'] - final['accounts.checking.scheduled_transactions.rent.amount=1650'],
+                               150 * 11)
+        # accounts without a transaction on the first day get an opening balance row
+        savings = df[(df['scenario'] == 'base') & (df['account_id'] == 'savings')]
+        self.assertEqual(savings.iloc[0]['date'], pd.Timestamp('2022-01-01'))
+        self.assertEqual(savings.iloc[0]['balance'], 2000)
+
+    def test_patch_uses_defaults(self):
+        spec = FixtureHelper.get_spec_fixture()
+        # a new transaction without transfer, interval, day_of_week or end_date
+        scenarios = Scenarios.from_spec({'scenarios': [{'name': 'gym', 'patch': {'accounts': {'checking': {
+            'scheduled_transactions': {'gym': {
+                'name': 'Gym', 'amount': 50, 'type': 'expense',
+                'date_spec': {'start_date': '2022-01-15', 'frequency': 'monthly', 'day_of_month': 15},
+            }}
+        }}}}]})
+        df = scenarios.run(spec, '2022-01-01', '2022-12-31', max_workers=1)
+        base = Projector.from_spec(FixtureHelper.get_spec_fixture(), '2022-01-01', '2022-12-31')
+        final = df[df['account_id'] == 'checking']['balance'].iloc[-1]
+        self.assertAlmostEqual(base.get_account('checking').get_balance('2022-12-31') - final, 50 * 12)
+
+    def test_invalid_scenario(self):
+        spec = FixtureHelper.get_spec_fixture()
+        scenarios = Scenarios.from_spec({
+            'scenarios': [{'name': 'base'}],
+            # rnt is not a transaction, so the patch adds one with only an amount
+            'grid':      {'accounts.checking.scheduled_transactions.rnt.amount': [1650],
+                          'accounts.savings.balance': ['lots']}
+        })
+        with self.assertRaises(SpecValidationError) as cm:
+            scenarios.run(spec, '2022-01-01', '2022-12-31')
+        self.assertEqual(cm.exception.scenario,
+                         'accounts.checking.scheduled_transactions.rnt.amount=1650,accounts.savings.balance=lots')
+        self.assertIn('Invalid forecast spec for scenario accounts.checking', str(cm.exception))
+        self.assertIn(('accounts.savings.balance', 'Not a valid number.'), cm.exception.errors)
+        self.assertIn(('accounts.checking.scheduled_transactions.rnt.name', 'Missing data for required field.'),
+                      cm.exception.errors)
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def test_fixed_amounts_match_projection(self):
+        spec = FixtureHelper.get_spec_fixture()
+        projector = Projector.from_spec(FixtureHelper.get_spec_fixture(), '2022-01-01', '2022-12-31')
+        result = Projector.simulate(spec, '2022-01-01', '2022-12-31', paths=3, seed=1)
+        for account_id in ['checking', 'credit_card', 'cc_plans']:
+            expected = projector.get_account(account_id).get_balance('2022-12-31')
+            np.testing.assert_allclose(result.balances[account_id][:, -1], [expected] * 3)
+
+    def test_distribution(self):
+        spec = FixtureHelper.get_spec_fixture()
+        spec['accounts']['checking']['scheduled_transactions']['rent']['amount'] = {
+            'distribution': {'type': 'normal', 'mean': 1500, 'std': 300, 'jitter_days': 2}
+        }
+        result = Projector.simulate(spec, '2022-01-01', '2022-12-31', paths=500, seed=1)
+        bands = result.get_percentiles('checking')
+        self.assertEqual(list(bands.columns), ['p5', 'p50', 'p95'])
+        self.assertTrue((bands['p5'] <= bands['p95']).all())
+        self.assertGreater(bands['p95'].iloc[-1] - bands['p5'].iloc[-1], 0)
+        self.assertEqual(result.get_overdraft_probability('checking', threshold=1e9), 1.0)
+        # same seed, same paths
+        again = Projector.simulate(spec, '2022-01-01', '2022-12-31', paths=500, seed=1)
+        np.testing.assert_array_equal(result.balances['checking'], again.balances['checking'])
+
+
+class TestProjectionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ProjectionCache(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def project(self, spec):
+        projector = self.cache.project(copy.deepcopy(spec), '2022-01-01', '2022-12-31')
+        expected = Projector.from_spec(copy.deepcopy(spec), '2022-01-01', '2022-12-31')
+        pd.testing.assert_frame_equal(projector.get_balance_matrix(), expected.get_balance_matrix())
+        for account_id in expected.accounts.accounts:
+            pd.testing.assert_series_equal(projector.get_account(account_id).get_descriptions(),
+                                           expected.get_account(account_id).get_descriptions())
+        return self.cache.dirty
+
+    @parameterized.expand([
+        ('401k', '401k', 'dividends', 300, ['401k']),
+        ('rent', 'checking', 'rent', 1600, ['checking']),
+        ('transfer', 'checking', 'savings', 600, ['checking', 'savings']),
+        # the credit card payment depends on card charges
+        ('card', 'credit_card', 'groc', 800, ['checking', 'credit_card']),
+    ])
+    def test_recomputes_dirty_accounts(self, name, account_id, trans_id, amount, expected_dirty):
+        spec = FixtureHelper.get_spec_fixture()
+        self.assertEqual(self.project(spec), list(spec['accounts']))
+        self.assertEqual(self.project(spec), [])
+        spec['accounts'][account_id]['scheduled_transactions'][trans_id]['amount'] = amount
+        self.assertEqual(self.project(spec), expected_dirty)
+
+    def test_dates_change_key(self):
+        spec = FixtureHelper.get_spec_fixture()
+        self.project(spec)
+        self.cache.project(copy.deepcopy(spec), '2022-01-01', '2022-06-30')
+        self.assertEqual(self.cache.dirty, list(spec['accounts']))
+
+    def test_prunes_old_keys(self):
+        spec = FixtureHelper.get_spec_fixture()
+        self.project(spec)
+        files = sorted(os.listdir(self.cache.cache_dir))
+        self.assertEqual(len(files), len(spec['accounts']))
+        spec['accounts']['401k']['scheduled_transactions']['dividends']['amount'] = 300
+        self.project(spec)
+        self.cache.project(copy.deepcopy(spec), '2022-01-01', '2022-06-30')
+        # one file per account, for the last key written
+        self.assertEqual([f.split('.')[0] for f in sorted(os.listdir(self.cache.cache_dir))],
+                         [f.split('.')[0] for f in files])
+        self.cache.project(copy.deepcopy(spec), '2022-01-01', '2022-06-30')
+        self.assertEqual(self.cache.dirty, [])
+
 
 if __name__ == "__main__":
     unittest.main()
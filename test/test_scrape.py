@@ -0,0 +1,167 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+from funance.cli.scrape.commands import run_scrape, scrape
+from funance.scrape.browser import BROWSER_MODES
+from funance.scrape.driver.pool import DriverPool
+from funance.scrape.provider import ProviderFactory
+from funance.scrape.runner import scrape_providers
+
+
+class FakeDriver:
+    def __init__(self, port, profile_dir):
+        self.port = port
+        self.profile_dir = profile_dir
+        self.closed = False
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeProvider:
+    # both providers must be scraping at the same time to get past the barrier
+    barrier = None
+    drivers = []
+
+    def __init__(self, driver, interactive=True):
+        self.driver = driver
+        self.interactive = interactive
+        FakeProvider.drivers.append(driver)
+
+    def scrape(self):
+        FakeProvider.barrier.wait()
+
+
+class SoloProvider(FakeProvider):
+    last = None
+
+    def scrape(self):
+        SoloProvider.last = self
+
+
+class FailingProvider(FakeProvider):
+    def scrape(self):
+        super().scrape()
+        raise RuntimeError('logged out')
+
+
+class TestScrapeProviders(unittest.TestCase):
+    def setUp(self):
+        self.providers = ProviderFactory.providers
+        ProviderFactory.providers = {
+            'one':     'test.test_scrape.FakeProvider',
+            'two':     'test.test_scrape.FakeProvider',
+            'failing': 'test.test_scrape.FailingProvider',
+            'solo':    'test.test_scrape.SoloProvider',
+        }
+        FakeProvider.barrier = threading.Barrier(2, timeout=5)
+        FakeProvider.drivers = []
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        ProviderFactory.providers = self.providers
+        self.tmp_dir.cleanup()
+
+    def get_pool(self):
+        def create_driver(detached, port, profile_dir, save_session, mode):
+            self.assertFalse(save_session)
+            return FakeDriver(port, profile_dir)
+        return DriverPool(profiles_dir=self.tmp_dir.name, create_driver=create_driver)
+
+    def test_concurrent(self):
+        results = scrape_providers(['one', 'two'], pool=self.get_pool())
+        self.assertEqual(results, {'one': None, 'two': None})
+        drivers = FakeProvider.drivers
+        self.assertEqual(len({d.port for d in drivers}), 2)
+        self.assertCountEqual([d.profile_dir for d in drivers],
+                              [os.path.join(self.tmp_dir.name, 'one'), os.path.join(self.tmp_dir.name, 'two')])
+        self.assertTrue(all(d.closed for d in drivers))
+
+    def test_failure_does_not_stop_others(self):
+        results = scrape_providers(['one', 'failing'], pool=self.get_pool())
+        self.assertIsNone(results['one'])
+        self.assertIsInstance(results['failing'], RuntimeError)
+        self.assertTrue(all(d.closed for d in FakeProvider.drivers))
+
+    def test_single_provider(self):
+        # a single provider still gets a detached browser, saved as the session `--session` attaches to
+        calls = []
+
+        def create_driver(**kwargs):
+            calls.append(kwargs)
+            return FakeDriver(4444, None)
+
+        with mock.patch('funance.scrape.driver.create_driver', create_driver):
+            run_scrape(['solo'], False, 'headless')
+        self.assertEqual(calls, [dict(session=False, detached=True, mode=BROWSER_MODES['headless'])])
+        driver = FakeProvider.drivers[0]
+        self.assertFalse(driver.closed)
+
+    def test_headless_is_not_interactive(self):
+        with mock.patch('funance.scrape.driver.create_driver', lambda **kwargs: FakeDriver(4444, None)):
+            for browser_mode, interactive in [('full', True), ('lite', True), ('headless', False)]:
+                run_scrape(['solo'], False, browser_mode)
+                self.assertEqual(SoloProvider.last.interactive, interactive)
+
+    def test_one_driver_per_name(self):
+        pool = self.get_pool()
+        pool.acquire('one')
+        with self.assertRaises(ValueError):
+            pool.acquire('one')
+        pool.close()
+
+
+class CdpDriver:
+    def __init__(self):
+        self.commands = []
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        self.commands.append((cmd, cmd_args))
+
+
+class TestBrowserMode(unittest.TestCase):
+    def test_full(self):
+        mode = BROWSER_MODES['full']
+        options = mode.get_chrome_options(detached=True)
+        self.assertEqual(options.arguments, [])
+        self.assertEqual(options.experimental_options, {'detach': True})
+        self.assertNotIn('pageLoadStrategy', options.to_capabilities())
+        driver = CdpDriver()
+        mode.apply(driver)
+        self.assertEqual(driver.commands, [])
+
+    def test_headless(self):
+        mode = BROWSER_MODES['headless']
+        options = mode.get_chrome_options(profile_dir='/tmp/profile')
+        self.assertIn('--user-data-dir=/tmp/profile', options.arguments)
+        self.assertIn('--headless=new', options.arguments)
+        self.assertIn('--disable-extensions', options.arguments)
+        rules = next(a for a in options.arguments if a.startswith('--host-resolver-rules='))
+        self.assertIn('MAP *.google-analytics.com ~NOTFOUND', rules)
+        self.assertEqual(options.experimental_options['prefs'],
+                         {'profile.managed_default_content_settings.images': 2})
+        self.assertEqual(options.to_capabilities()['pageLoadStrategy'], 'eager')
+
+        driver = CdpDriver()
+        mode.apply(driver)
+        self.assertEqual(driver.commands[0], ('Network.enable', {}))
+        self.assertEqual(driver.commands[1][0], 'Network.setBlockedURLs')
+        self.assertIn('*.woff2', driver.commands[1][1]['urls'])
+
+    def test_default(self):
+        # trimming the browser is opt in, log in pages may need what it blocks
+        calls = []
+        with mock.patch('funance.cli.scrape.commands.run_scrape',
+                        lambda providers, session, browser_mode, **options: calls.append(browser_mode)):
+            result = CliRunner().invoke(scrape, ['tda'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(calls, ['full'])
+
+
+if __name__ == "__main__":
+    unittest.main()
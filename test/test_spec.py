@@ -0,0 +1,200 @@
+import copy
+import datetime
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from parameterized import parameterized
+
+from funance.common.spec import compile_spec, get_yaml, load_spec
+from funance.forecast.exceptions import SpecValidationError
+from funance.forecast.schema import validate_spec
+from funance.forecast.projector import Projector
+from test.helpers import FixtureHelper, get_root_path
+
+
+class TestSpec(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        self.spec_file = os.path.join(self.tmp_dir.name, 'forecast.yml')
+        shutil.copyfile(os.path.join(get_root_path(), 'forecast.dist.yml'), self.spec_file)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_compiled_file(self):
+        spec_dir = os.path.join(self.cache_dir, 'spec')
+        return os.path.join(spec_dir, os.listdir(spec_dir)[0])
+
+    def mark_compiled(self):
+        """Replace the compiled spec, to tell when it is used"""
+        with open(self.get_compiled_file(), 'rb') as stream:
+            compiled = pickle.load(stream)
+        compiled['spec'] = {'marker': True}
+        with open(self.get_compiled_file(), 'wb') as stream:
+            pickle.dump(compiled, stream)
+
+    def test_compile_spec(self):
+        spec = compile_spec(FixtureHelper.get_spec_fixture())
+        date_spec = spec['accounts']['checking']['scheduled_transactions']['rent']['date_spec']
+        self.assertEqual(date_spec['start_date'], datetime.datetime(2022, 1, 28))
+        self.assertIsNone(date_spec['end_date'])
+        expected = Projector.from_spec(FixtureHelper.get_spec_fixture(), '2022-01-01', '2022-12-31')
+        projector = Projector.from_spec(spec, '2022-01-01', '2022-12-31')
+        pd.testing.assert_frame_equal(projector.get_balance_matrix(), expected.get_balance_matrix())
+
+    def test_defaults(self):
+        spec = FixtureHelper.get_spec_fixture()
+        trans = spec['accounts']['checking']['scheduled_transactions']['rent']
+        del trans['transfer']
+        del trans['date_spec']['day_of_week']
+        del trans['date_spec']['interval']
+        trans = compile_spec(spec)['accounts']['checking']['scheduled_transactions']['rent']
+        self.assertIsNone(trans['transfer'])
+        self.assertIsNone(trans['date_spec']['day_of_week'])
+        self.assertEqual(trans['date_spec']['interval'], 1)
+
+    def test_load_spec(self):
+        spec = load_spec(self.spec_file, self.cache_dir)
+        self.assertEqual(spec, compile_spec(get_yaml(self.spec_file)))
+
+        # unchanged file, the compiled spec is used
+        self.mark_compiled()
+        self.assertEqual(load_spec(self.spec_file, self.cache_dir), {'marker': True})
+
+        # touched, but the same contents
+        stat = os.stat(self.spec_file)
+        os.utime(self.spec_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(load_spec(self.spec_file, self.cache_dir), {'marker': True})
+
+        # changed
+        with open(self.spec_file, 'a') as stream:
+            stream.write('\n# comment\n')
+        self.assertEqual(load_spec(self.spec_file, self.cache_dir), spec)
+
+    def test_corrupt_compiled_spec(self):
+        spec = load_spec(self.spec_file, self.cache_dir)
+        with open(self.get_compiled_file(), 'wb') as stream:
+            stream.write(b'not a pickle')
+        self.assertEqual(load_spec(self.spec_file, self.cache_dir), spec)
+
+    def test_returns_a_copy(self):
+        spec = load_spec(self.spec_file, self.cache_dir)
+        original = copy.deepcopy(spec)
+        spec['accounts'].clear()
+        self.assertEqual(load_spec(self.spec_file, self.cache_dir), original)
+
+
+class TestSpecSchema(unittest.TestCase):
+    def test_valid(self):
+        spec = validate_spec(FixtureHelper.get_spec_fixture())
+        self.assertEqual(spec['accounts']['checking']['scheduled_transactions']['rent']['amount'], 1500.0)
+        self.assertIsNone(spec['accounts']['credit_card']['scheduled_transactions']['groc']['transfer'])
+        # idempotent, so normalized specs can be validated again
+        self.assertEqual(validate_spec(copy.deepcopy(spec)), spec)
+
+    def test_reports_every_error(self):
+        spec = FixtureHelper.get_spec_fixture()
+        checking = spec['accounts']['checking']['scheduled_transactions']
+        checking['rent']['date_spec']['frequency'] = 'yearly'
+        checking['rent']['amount'] = 'lots'
+        del checking['savings']['transfer']
+        checking['retirement']['transfer']['account_id'] = 'nope'
+        checking['cc_pmt']['amount']['cc_balance']['account_id'] = 'savings'
+        del spec['accounts']['credit_card']['stmt_close_dom']
+        spec['accounts']['401k']['scheduled_transactions']['dividends']['date_spec']['start_date'] = '2021-13-45'
+        spec['chart_spec'][0]['account_ids'].append('ghost')
+
+        with self.assertRaises(SpecValidationError) as cm:
+            validate_spec(spec)
+        self.assertCountEqual(cm.exception.errors, [
+            ('accounts.checking.scheduled_transactions.rent.amount',
+             'Must be a number, or a dict with one of: cc_balance, distribution.'),
+            ('accounts.checking.scheduled_transactions.rent.date_spec.frequency',
+             'Must be one of: daily, weekly, monthly.'),
+            ('accounts.checking.scheduled_transactions.savings.transfer', 'Required when type is transfer.'),
+            ('accounts.checking.scheduled_transactions.retirement.transfer.account_id', 'Unknown account: nope.'),
+            ('accounts.checking.scheduled_transactions.cc_pmt.amount.cc_balance.account_id',
+             'Not a cc account: savings.'),
+            ('accounts.credit_card.stmt_close_dom', 'Required for cc accounts.'),
+            ('accounts.401k.scheduled_transactions.dividends.date_spec.start_date',
+             'Not a valid date. Use YYYY-MM-DD.'),
+            ('chart_spec[0].account_ids[5]', 'Unknown account: ghost.'),
+        ])
+
+    def test_distribution(self):
+        spec = FixtureHelper.get_spec_fixture()
+        rent = spec['accounts']['checking']['scheduled_transactions']['rent']
+        rent['amount'] = {'distribution': {'type': 'uniform', 'mean': 1500, 'std': -1}}
+        with self.assertRaises(SpecValidationError) as cm:
+            validate_spec(spec)
+        self.assertCountEqual([path for path, message in cm.exception.errors], [
+            'accounts.checking.scheduled_transactions.rent.amount.distribution.type',
+            'accounts.checking.scheduled_transactions.rent.amount.distribution.std',
+        ])
+
+    @parameterized.expand([
+        (
+                'chart_without_account_ids',
+                lambda spec: spec['chart_spec'][0].pop('account_ids'),
+                [('chart_spec[0].account_ids', 'Missing data for required field.')]
+        ),
+        (
+                'chart_account_ids_not_a_list',
+                lambda spec: spec['chart_spec'][0].update(account_ids='checking'),
+                [('chart_spec[0].account_ids', 'Not a valid list.')]
+        ),
+        (
+                'chart_not_a_mapping',
+                lambda spec: spec['chart_spec'].__setitem__(0, 'checking'),
+                [('chart_spec[0]', 'Invalid input type.')]
+        ),
+        (
+                'card_without_type',
+                lambda spec: spec['accounts']['credit_card'].pop('type'),
+                [('accounts.credit_card.type', 'Missing data for required field.')]
+        ),
+        (
+                'transfer_without_account_id',
+                lambda spec: spec['accounts']['checking']['scheduled_transactions']['savings']['transfer'].pop(
+                    'account_id'),
+                [('accounts.checking.scheduled_transactions.savings.transfer.account_id',
+                  'Missing data for required field.')]
+        ),
+        (
+                'pmt_plan_without_ref_account_id',
+                lambda spec: spec['accounts']['credit_card'].update(pmt_plan={'interest_saving_balance': 0}),
+                [('accounts.credit_card.pmt_plan.ref_account_id', 'Missing data for required field.')]
+        ),
+        (
+                'fuzzy_date',
+                lambda spec: spec['accounts']['401k']['scheduled_transactions']['dividends']['date_spec'].update(
+                    start_date='June 4 2022'),
+                [('accounts.401k.scheduled_transactions.dividends.date_spec.start_date',
+                  'Not a valid date. Use YYYY-MM-DD.')]
+        ),
+    ])
+    def test_field_errors(self, name, change, expected):
+        # references are checked after field errors, and skip whatever already failed
+        spec = FixtureHelper.get_spec_fixture()
+        change(spec)
+        with self.assertRaises(SpecValidationError) as cm:
+            validate_spec(spec)
+        self.assertCountEqual(cm.exception.errors, expected)
+
+    def test_invalid_spec_is_not_cached(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            spec_file = os.path.join(tmp_dir, 'forecast.yml')
+            with open(spec_file, 'w') as stream:
+                stream.write('accounts: []\n')
+            with self.assertRaises(SpecValidationError):
+                load_spec(spec_file, os.path.join(tmp_dir, 'cache'))
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, 'cache')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import base64
+import os
+import stat
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from funance.scrape.driver.storage import StorageState, StorageStateStore, get_fernet, get_session_key
+
+try:
+    import cryptography
+except ImportError:
+    cryptography = None
+
+
+class Base64Cipher:
+    """
+    Stands in for Fernet, so the store can be tested without the key
+    """
+
+    def encrypt(self, data):
+        return base64.b64encode(data)
+
+    def decrypt(self, token):
+        return base64.b64decode(token)
+
+
+class CdpDriver:
+    def __init__(self, cookies=None, origin='https://example.com', local_storage=None):
+        self.cookies = cookies or []
+        self.origin = origin
+        self.local_storage = local_storage or {}
+        self.commands = []
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        self.commands.append((cmd, cmd_args))
+        if cmd == 'Network.getAllCookies':
+            return {'cookies': self.cookies}
+        return {}
+
+    def execute_script(self, script):
+        return self.origin if 'origin' in script else self.local_storage
+
+
+class RemoteDriver:
+    pass
+
+
+class TestStorageStateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = StorageStateStore('tda', sessions_dir=self.tmp_dir.name, cipher=Base64Cipher())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        cookies = [
+            {'name': 'auth', 'value': 'abc', 'domain': '.example.com', 'path': '/', 'expires': 4102444800,
+             'secure': True, 'httpOnly': True, 'size': 6, 'session': False},
+            {'name': 'sid', 'value': 'def', 'domain': 'www.example.com', 'path': '/', 'expires': -1,
+             'session': True},
+            {'name': 'old', 'value': 'ghi', 'domain': 'example.com', 'path': '/', 'expires': 1},
+        ]
+        self.store.save(CdpDriver(cookies=cookies, local_storage={'token': 'xyz'}))
+        self.assertEqual(stat.S_IMODE(os.stat(self.store.path).st_mode), 0o600)
+
+        driver = CdpDriver()
+        self.assertTrue(self.store.restore(driver))
+        cmd, cmd_args = driver.commands[0]
+        self.assertEqual(cmd, 'Network.setCookies')
+        # expired cookies are dropped, session cookies lose their expiry, and fields CDP does not take are removed
+        self.assertEqual(cmd_args['cookies'], [
+            {'name': 'auth', 'value': 'abc', 'domain': '.example.com', 'path': '/', 'expires': 4102444800,
+             'secure': True, 'httpOnly': True},
+            {'name': 'sid', 'value': 'def', 'domain': 'www.example.com', 'path': '/'},
+        ])
+        cmd, cmd_args = driver.commands[1]
+        self.assertEqual(cmd, 'Page.addScriptToEvaluateOnNewDocument')
+        self.assertIn('"https://example.com"', cmd_args['source'])
+        self.assertIn('{"token": "xyz"}', cmd_args['source'])
+
+    def test_local_storage_by_origin(self):
+        self.store.save(CdpDriver(origin='https://a.example.com', local_storage={'a': '1'},
+                                  cookies=[{'name': 'n', 'value': 'v', 'domain': 'example.com', 'expires': -1}]))
+        self.store.save(CdpDriver(origin='https://b.example.com', local_storage={'b': '2'},
+                                  cookies=[{'name': 'n', 'value': 'v', 'domain': 'example.com', 'expires': -1}]))
+        self.assertEqual(self.store.load().local_storage, {
+            'https://a.example.com': {'a': '1'},
+            'https://b.example.com': {'b': '2'},
+        })
+
+    def test_nothing_to_restore(self):
+        driver = CdpDriver()
+        self.assertFalse(self.store.restore(driver))
+        self.assertEqual(driver.commands, [])
+
+    def test_corrupt(self):
+        with open(self.store.path, 'wb') as fp:
+            fp.write(b'not base64 json')
+        self.assertIsNone(self.store.load())
+        self.assertFalse(self.store.restore(CdpDriver()))
+
+    def test_remote_driver(self):
+        # attached sessions have no DevTools protocol, and are left alone
+        self.store.save(RemoteDriver())
+        self.assertFalse(os.path.exists(self.store.path))
+        self.assertFalse(self.store.restore(RemoteDriver()))
+
+    def test_valid_cookies(self):
+        state = StorageState(cookies=[{'name': 'a', 'expires': 100}, {'name': 'b', 'expires': 300}])
+        self.assertEqual(state.get_valid_cookies(now=200), [{'name': 'b', 'expires': 300}])
+
+
+class TestSessionKey(unittest.TestCase):
+    def test_concurrent_first_use(self):
+        # providers scraped in parallel all create the key on their first run
+        workers = 16
+        barrier = threading.Barrier(workers)
+
+        def get_key(key_file):
+            barrier.wait()
+            return get_session_key(key_file)
+
+        for _ in range(20):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                key_file = os.path.join(tmp_dir, 'keys', 'session.key')
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    keys = list(executor.map(get_key, [key_file] * workers))
+                self.assertEqual(len(set(keys)), 1)
+                self.assertEqual(len(base64.urlsafe_b64decode(keys[0])), 32)
+                self.assertEqual(stat.S_IMODE(os.stat(key_file).st_mode), 0o600)
+                self.assertEqual(os.listdir(os.path.dirname(key_file)), ['session.key'])
+
+    def test_invalid_key(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            key_file = os.path.join(tmp_dir, 'session.key')
+            with open(key_file, 'wb') as fp:
+                fp.write(b'not a key')
+            store = StorageStateStore('tda', sessions_dir=tmp_dir, key_file=key_file)
+            self.assertFalse(store.enabled)
+            store.save(CdpDriver(cookies=[{'name': 'auth', 'value': 'abc', 'domain': 'example.com'}]))
+            self.assertFalse(os.path.exists(store.path))
+
+
+@unittest.skipIf(cryptography is None, 'cryptography is not installed')
+class TestFernet(unittest.TestCase):
+    def test_key_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            key_file = os.path.join(tmp_dir, 'session.key')
+            token = get_fernet(key_file).encrypt(b'secret')
+            self.assertEqual(stat.S_IMODE(os.stat(key_file).st_mode), 0o600)
+            self.assertEqual(get_fernet(key_file).decrypt(token), b'secret')
+
+            store = StorageStateStore('tda', sessions_dir=tmp_dir, key_file=key_file)
+            store.save(CdpDriver(cookies=[{'name': 'auth', 'value': 'abc', 'domain': 'example.com'}]))
+            with open(store.path, 'rb') as fp:
+                self.assertNotIn(b'abc', fp.read())
+            self.assertEqual(store.load().cookies, [{'name': 'auth', 'value': 'abc', 'domain': 'example.com'}])
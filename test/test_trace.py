@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+from funance.cli.scrape.commands import scrape
+from funance.scrape.trace import STEP, WAIT, WEBDRIVER, Tracer, get_tracer, instrument_driver, set_tracer, span, \
+    traced
+from funance.scrape.wait import SmartWait
+
+
+class Driver:
+    def __init__(self):
+        self.commands = []
+
+    def execute(self, driver_command, params=None):
+        self.commands.append(driver_command)
+        return {'value': None}
+
+
+class Element:
+    # WebElement sends its commands through its driver
+    def __init__(self, parent):
+        self._parent = parent
+
+    def click(self):
+        self._parent.execute('clickElement', {'id': '1'})
+
+
+class Provider:
+    @traced
+    def _get_cash(self):
+        time.sleep(0.01)
+        return 'cash'
+
+
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        set_tracer(self.tracer)
+
+    def tearDown(self):
+        set_tracer(None)
+
+    def test_traced(self):
+        self.assertEqual(Provider()._get_cash(), 'cash')
+        summary = self.tracer.get_summary()
+        self.assertEqual([(row['cat'], row['name'], row['count']) for row in summary],
+                         [(STEP, 'provider._get_cash', 1)])
+        self.assertGreaterEqual(summary[0]['total'], 0.01)
+
+    def test_off(self):
+        set_tracer(None)
+        self.assertEqual(Provider()._get_cash(), 'cash')
+        with span('nothing'):
+            pass
+        driver = instrument_driver(Driver())
+        self.assertNotIn('execute', vars(driver))
+        self.assertEqual(self.tracer.events, [])
+
+    def test_instrument_driver(self):
+        driver = instrument_driver(Driver())
+        # instrumenting twice does not count commands twice
+        instrument_driver(driver)
+        driver.execute('get', {'url': 'https://example.com'})
+        Element(driver).click()
+        Element(driver).click()
+        self.assertEqual(driver.commands, ['get', 'clickElement', 'clickElement'])
+        counts = {row['name']: row['count'] for row in self.tracer.get_summary() if row['cat'] == WEBDRIVER}
+        self.assertEqual(counts, {'get': 1, 'clickElement': 2})
+
+    def test_wait(self):
+        SmartWait(driver=None).until(lambda driver: True, step='summary_table')
+        self.assertEqual([(row['cat'], row['name']) for row in self.tracer.get_summary()], [(WAIT, 'summary_table')])
+
+    def test_summary(self):
+        self.tracer.add('fast', STEP, 0, 0.1)
+        self.tracer.add('slow', STEP, 0, 0.3)
+        self.tracer.add('slow', STEP, 0, 0.5)
+        summary = self.tracer.get_summary()
+        self.assertEqual([row['name'] for row in summary], ['slow', 'fast'])
+        self.assertAlmostEqual(summary[0]['total'], 0.8)
+        self.assertAlmostEqual(summary[0]['mean'], 0.4)
+        self.assertAlmostEqual(summary[0]['max'], 0.5)
+        self.assertEqual(len(self.tracer.get_summary(limit=1)), 1)
+
+    def test_write(self):
+        with span('tda', step='outer'):
+            Provider()._get_cash()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with mock.patch('funance.scrape.trace.TRACES_DIR', tmp_dir):
+                path = self.tracer.write()
+            self.assertEqual(os.path.dirname(path), tmp_dir)
+            with open(path) as fp:
+                trace = json.load(fp)
+        events = trace['traceEvents']
+        self.assertEqual(events[0]['ph'], 'M')
+        self.assertEqual(events[0]['name'], 'thread_name')
+        inner, outer = events[1:]
+        self.assertEqual((inner['name'], outer['name']), ('provider._get_cash', 'tda'))
+        self.assertEqual(outer['args'], {'step': 'outer'})
+        # the step is drawn inside the provider's span
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['ts'] + outer['dur'], inner['ts'] + inner['dur'])
+
+
+class TestProfileOption(unittest.TestCase):
+    def test_profile(self):
+        def run_scrape(providers, session, browser_mode, **options):
+            self.assertIsNotNone(get_tracer())
+            Provider()._get_cash()
+            instrument_driver(Driver()).execute('get')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with mock.patch('funance.cli.scrape.commands.run_scrape', run_scrape), \
+                    mock.patch('funance.scrape.trace.TRACES_DIR', tmp_dir):
+                result = CliRunner().invoke(scrape, ['tda', '--profile'])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn('step:provider._get_cash', result.output)
+            self.assertIn('WebDriver round trips: 1', result.output)
+            self.assertEqual(len(os.listdir(tmp_dir)), 1)
+        self.assertIsNone(get_tracer())
@@ -1,7 +1,7 @@
 import json
 import unittest
 
-from funance.scrape.provider.vanguard import clean_account_name
+from funance.scrape.provider.vanguard import clean_account_name, get_lot
 
 
 class TestCleanAccountName(unittest.TestCase):
@@ -9,3 +9,37 @@ class TestCleanAccountName(unittest.TestCase):
         expected = 'Ralph D Malf Traditional IRA Brokerage Account 7777777'
         actual = clean_account_name('Ralph D. Malf—Traditional IRA Brokerage Account—7777777*')
         self.assertEqual(expected, actual)
+
+
+class TestGetLot(unittest.TestCase):
+    def get_row(self, **kwargs):
+        row = {
+            'date_acquired':  '03/15/2021',
+            'num_shares':     '10.0000',
+            'cost_per_share': '$1,234.50',
+            'total_cost':     '$12,345.00',
+            'short_term':     '—',
+            'long_term':      '$100.00',
+        }
+        row.update(kwargs)
+        return row
+
+    def test_long_term(self):
+        self.assertEqual(get_lot(self.get_row()), dict(
+            date_acquired='2021-03-15',
+            num_shares='10.0000',
+            cost_per_share='1234.50',
+            total_cost='12345.00',
+            term='long'
+        ))
+
+    def test_short_term(self):
+        self.assertEqual(get_lot(self.get_row(short_term='$5.00', long_term='—'))['term'], 'short')
+
+    def test_header_row(self):
+        self.assertIsNone(get_lot(self.get_row(date_acquired='Date acquired (noncovered shares)')))
+        self.assertIsNone(get_lot(dict.fromkeys(self.get_row())))
+
+    def test_unknown_term(self):
+        with self.assertRaises(ValueError):
+            get_lot(self.get_row(short_term='—', long_term='—'))
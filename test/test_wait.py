@@ -0,0 +1,91 @@
+import time
+import unittest
+from unittest import mock
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+
+from funance.scrape.wait import LoginRequiredError, SmartWait, any_of
+
+
+class Ready:
+    """
+    A condition that is ready after a delay, raising until then
+    """
+
+    def __init__(self, delay, result='ready', exception=NoSuchElementException):
+        self.ready_at = time.perf_counter() + delay
+        self.result = result
+        self.exception = exception
+
+    def __call__(self, driver):
+        if time.perf_counter() < self.ready_at:
+            raise self.exception()
+        return self.result
+
+
+class TestSmartWait(unittest.TestCase):
+    def test_short_poll(self):
+        wait = SmartWait(driver=None)
+        start = time.perf_counter()
+        self.assertEqual(wait.until(Ready(0.06), step='ready'), 'ready')
+        # the default 0.5s poll would not check again until 0.5s
+        self.assertLess(time.perf_counter() - start, 0.3)
+        self.assertEqual(len(wait.timings['ready']), 1)
+        self.assertGreaterEqual(wait.timings['ready'][0], 0.06)
+
+    def test_ignores_stale(self):
+        wait = SmartWait(driver=None)
+        self.assertEqual(wait.until(Ready(0.06, exception=StaleElementReferenceException)), 'ready')
+        # named after the condition when there is no step
+        self.assertIn('Ready', wait.timings)
+
+    def test_timeout(self):
+        wait = SmartWait(driver=None, timeout=0.1)
+        with self.assertRaises(TimeoutException):
+            wait.until(lambda driver: False, step='never')
+        self.assertEqual(len(wait.timings['never']), 1)
+
+    def test_any_of(self):
+        wait = SmartWait(driver=None)
+        self.assertEqual(wait.until(any_of(Ready(60, 'link'), Ready(0.06, 'table'))), 'table')
+        self.assertEqual(wait.until(any_of(Ready(0, 'link'), Ready(0, 'table'))), 'link')
+
+    def test_wait_for_login(self):
+        wait = SmartWait(driver=None)
+        with mock.patch('funance.scrape.wait.LOGIN_TIMEOUT', 0.1):
+            self.assertFalse(wait.wait_for_login(lambda driver: False))
+        self.assertTrue(wait.wait_for_login(Ready(0)))
+        self.assertEqual(len(wait.timings['login']), 2)
+
+    def test_until_stale(self):
+        class Element:
+            # the old page's element, removed from the DOM after a delay
+            removed_at = time.perf_counter() + 0.06
+
+            def is_enabled(self):
+                if time.perf_counter() >= self.removed_at:
+                    raise StaleElementReferenceException()
+                return True
+
+        wait = SmartWait(driver=None)
+        self.assertTrue(wait.until_stale(Element(), step='unload'))
+        self.assertGreaterEqual(wait.timings['unload'][0], 0.06)
+
+    def test_wait_for_login_headless(self):
+        # nobody can log in to a headless browser, so it only checks the browser already is
+        wait = SmartWait(driver=None)
+        self.assertTrue(wait.wait_for_login(Ready(0), interactive=False))
+        with mock.patch('funance.scrape.wait.PROBE_TIMEOUT', 0.1), \
+                mock.patch('funance.scrape.wait.LOGIN_TIMEOUT', 60):
+            start = time.perf_counter()
+            with self.assertRaisesRegex(LoginRequiredError, 'headless'):
+                wait.wait_for_login(lambda driver: False, interactive=False)
+            self.assertLess(time.perf_counter() - start, 1)
+
+
+class TestProbe(unittest.TestCase):
+    def test_probe(self):
+        wait = SmartWait(driver=None)
+        self.assertTrue(wait.probe(Ready(0)))
+        self.assertFalse(wait.probe(lambda driver: False, timeout=0.1))
+        self.assertEqual(len(wait.timings['probe']), 2)